@@ -7,12 +7,31 @@
 # allows adding and removing directories from its respective watch list
 # and shows the current count of watched entries.  The daemon control
 # buttons start and stop the associated background scripts.
+#
+# Double-clicking an entry opens its history: auto-backup commits for Git
+# entries, snapshots (see autogit_snapshot.py) for AutoSave entries.  Any
+# file or folder can be viewed, diffed or restored to a chosen point.
 
+import contextlib
+import difflib
 import os
+import tempfile
+import threading
+import time
 import tkinter as tk
 from tkinter import messagebox, filedialog, ttk
 import subprocess
-from datetime import datetime
+from datetime import datetime, timedelta
+
+try:
+    import fcntl
+except ImportError:  # Windows Python: fall back to unlocked writes
+    fcntl = None
+
+try:
+    import autogit_snapshot
+except ImportError:  # helper not next to this script: no AutoSave history
+    autogit_snapshot = None
 
 # --- CONFIGURATION -----------------------------------------------------------
 AUTOGIT_DIR = os.path.expanduser("~/.autogit")
@@ -23,6 +42,14 @@ MAIN_FILE = os.path.join(AUTOGIT_DIR, "dirs_main.txt")
 # optionally followed by a 16-digit hash.  The autosave_dirwatch.sh
 # script monitors this file for directory changes.
 AUTOSAVE_FILE = os.path.join(AUTOGIT_DIR, "autosave_dirs_main.txt")
+# systemd user units shown in the status labels, and how often to poll them.
+SERVICE_UNITS = ("autogit.service", "autosave.service")
+STATUS_POLL_MS = 5000
+# AutoSave snapshot store, history points loaded per page, and how much of
+# a file or diff the preview pane fetches.
+SNAPSHOT_DIR = os.path.join(AUTOGIT_DIR, "snapshots")
+HISTORY_PAGE = 200
+PREVIEW_BYTES = 256 * 1024
 
 # --- COLOUR PALETTE ----------------------------------------------------------
 BG_COLOR = "#0D0221"
@@ -88,11 +115,46 @@ def read_lines(file_path: str) -> list[str]:
     return lines
 
 def write_lines(file_path: str, lines: list[str]) -> None:
-    """Write header and list of lines to file."""
-    with open(file_path, "w", encoding="utf-8") as fh:
-        fh.write("# AutoGit watch list (managed by GUI)\n")
-        for line in lines:
-            fh.write(f"{line}\n")
+    """Atomically write header and list of lines to file."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(file_path), prefix=".gui.")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            fh.write("# AutoGit watch list (managed by GUI)\n")
+            for line in lines:
+                fh.write(f"{line}\n")
+        os.replace(tmp, file_path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
+
+@contextlib.contextmanager
+def watch_lock(file_path: str):
+    """Hold the flock the daemons take (<file>.lock) while editing a watch file."""
+    if fcntl is None:
+        yield
+        return
+    with open(f"{file_path}.lock", "a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        yield
+
+def update_lines(file_path: str, mutate) -> list[str]:
+    """Read-modify-write a watch file under its lock; write only on change.
+
+    `mutate` receives the current entries (re-read under the lock, so
+    hashes the daemon wrote in the meantime are kept) and returns the new
+    list.
+    """
+    with watch_lock(file_path):
+        lines = read_lines(file_path)
+        updated = mutate(list(lines))
+        if updated != lines:
+            write_lines(file_path, updated)
+    return updated
+
+def entry_dir(line: str) -> str:
+    """Return the directory of a watch entry, without ::tags or hash."""
+    return line.split(" - [")[0].split("::")[0].strip()
 
 def sanitize_autosave_entries(entries: list[str]) -> list[str]:
     """Ensure AutoSave entries are plain directories (strip any ::tags)."""
@@ -109,12 +171,17 @@ def add_dir() -> None:
     path = filedialog.askdirectory(title="Select directory to watch")
     if not path:
         return
-    dirs = read_lines(MAIN_FILE)
-    if path in dirs:
+    already = False
+
+    def mutate(dirs: list[str]) -> list[str]:
+        nonlocal already
+        already = any(entry_dir(d) == path for d in dirs)
+        return dirs if already else dirs + [path]
+
+    update_lines(MAIN_FILE, mutate)
+    if already:
         messagebox.showinfo("AutoGit", "That directory is already being watched.")
         return
-    dirs.append(path)
-    write_lines(MAIN_FILE, dirs)
     refresh_dir_list()
     messagebox.showinfo("AutoGit", f"Added:\n{path}")
 
@@ -123,20 +190,36 @@ def remove_selected_dir() -> None:
     selection = dir_listbox.curselection()
     if not selection:
         return
-    idx = selection[0]
-    dirs = read_lines(MAIN_FILE)
-    removed = dirs.pop(idx)
-    write_lines(MAIN_FILE, dirs)
+    removed = dir_listbox.get(selection[0])
+    update_lines(MAIN_FILE, lambda dirs: [d for d in dirs if entry_dir(d) != entry_dir(removed)])
     refresh_dir_list()
     messagebox.showinfo("AutoGit", f"Removed:\n{removed}")
 
+def sync_listbox(listbox: tk.Listbox, items: list[str]) -> None:
+    """Update a Listbox to show items, touching only the rows that changed.
+
+    The common prefix and suffix are kept as-is, so adding or removing one
+    entry in a list of thousands costs a single insert/delete.
+    """
+    current = listbox.get(0, tk.END)
+    start = 0
+    limit = min(len(current), len(items))
+    while start < limit and current[start] == items[start]:
+        start += 1
+    end_cur, end_new = len(current), len(items)
+    while end_cur > start and end_new > start and current[end_cur - 1] == items[end_new - 1]:
+        end_cur -= 1
+        end_new -= 1
+    if end_cur > start:
+        listbox.delete(start, end_cur - 1)
+    if end_new > start:
+        listbox.insert(start, *items[start:end_new])
+
 def refresh_dir_list() -> None:
     """Refresh the display of Git watch list."""
-    dir_listbox.delete(0, tk.END)
     dirs = read_lines(MAIN_FILE)
-    for d in dirs:
-        dir_listbox.insert(tk.END, d)
-    dir_status_var.set(f"Watching {len(dirs)} directories")
+    sync_listbox(dir_listbox, dirs)
+    dir_status_var.set(f"Watching {len(dirs)} directories (double-click for history)")
 
 # --- AutoSave Directory Functions -------------------------------------------
 def add_autosave_dir() -> None:
@@ -144,13 +227,18 @@ def add_autosave_dir() -> None:
     path = filedialog.askdirectory(title="Select directory to auto-save")
     if not path:
         return
-    entries = sanitize_autosave_entries(read_lines(AUTOSAVE_FILE))
-    if path in entries:
+    already = False
+
+    def mutate(entries: list[str]) -> list[str]:
+        nonlocal already
+        entries = sanitize_autosave_entries(entries)
+        already = any(entry_dir(e) == path for e in entries)
+        return entries if already else entries + [path]
+
+    update_lines(AUTOSAVE_FILE, mutate)
+    if already:
         messagebox.showinfo("AutoGit", "That directory is already in the AutoSave list.")
         return
-
-    entries.append(path)
-    write_lines(AUTOSAVE_FILE, entries)
     refresh_autosave_list()
     messagebox.showinfo("AutoGit", f"Added to AutoSave:\n{path}")
 
@@ -159,24 +247,21 @@ def remove_selected_autosave_dir() -> None:
     selection = autosave_listbox.curselection()
     if not selection:
         return
-    idx = selection[0]
-    entries = sanitize_autosave_entries(read_lines(AUTOSAVE_FILE))
-    removed = entries.pop(idx)
-    write_lines(AUTOSAVE_FILE, entries)
+    removed = autosave_listbox.get(selection[0])
+    update_lines(
+        AUTOSAVE_FILE,
+        lambda entries: [e for e in sanitize_autosave_entries(entries)
+                         if entry_dir(e) != entry_dir(removed)],
+    )
     refresh_autosave_list()
     messagebox.showinfo("AutoGit", f"Removed from AutoSave:\n{removed}")
 
 def refresh_autosave_list() -> None:
     """Refresh the display of AutoSave watch list."""
-    autosave_listbox.delete(0, tk.END)
-    raw_entries = read_lines(AUTOSAVE_FILE)
-    entries = sanitize_autosave_entries(raw_entries)
     # If file contained tags, write back sanitized entries to keep it clean
-    if entries != raw_entries:
-        write_lines(AUTOSAVE_FILE, entries)
-    for e in entries:
-        autosave_listbox.insert(tk.END, e)
-    autosave_status_var.set(f"Auto-saving {len(entries)} directories")
+    entries = update_lines(AUTOSAVE_FILE, sanitize_autosave_entries)
+    sync_listbox(autosave_listbox, entries)
+    autosave_status_var.set(f"Auto-saving {len(entries)} directories (double-click for history)")
 
 # --- System Functions --------------------------------------------------------
 def open_file(path: str) -> None:
@@ -187,39 +272,60 @@ def start_daemon(script: str, name: str) -> None:
     """Start a background service using the given script."""
     os.system(f"nohup {script} start >/dev/null 2>&1 &")
     messagebox.showinfo("AutoGit", f"{name} daemon started.")
-    update_status()
+    request_status_refresh()
 
 def stop_daemon(script: str, name: str) -> None:
     """Stop a background service using the given script."""
     os.system(f"{script} stop >/dev/null 2>&1")
     messagebox.showinfo("AutoGit", f"{name} daemon stopped.")
-    update_status()
-
-def get_service_status(service_name: str) -> tuple[str, datetime | None]:
-    """Query systemd for the status of a user service."""
+    request_status_refresh()
+
+def parse_systemctl_show(output: str, now_monotonic: float) -> dict[str, tuple[str, datetime | None]]:
+    """Parse `systemctl show` blocks into {unit: (status, start time)}.
+
+    Start times come from ActiveEnterTimestampMonotonic (microseconds on the
+    same CLOCK_MONOTONIC as time.monotonic()), so no locale-dependent date
+    text is involved.
+    """
+    statuses: dict[str, tuple[str, datetime | None]] = {}
+    for block in output.strip().split("\n\n"):
+        props: dict[str, str] = {}
+        for line in block.splitlines():
+            key, _, value = line.partition("=")
+            props[key] = value
+        unit = props.get("Id")
+        if not unit:
+            continue
+        if props.get("ActiveState") != "active":
+            statuses[unit] = ("inactive", None)
+            continue
+        start_time = None
+        try:
+            entered_us = int(props.get("ActiveEnterTimestampMonotonic", "0"))
+        except ValueError:
+            entered_us = 0
+        if entered_us > 0:
+            uptime = max(0.0, now_monotonic - entered_us / 1_000_000)
+            start_time = datetime.now() - timedelta(seconds=uptime)
+        statuses[unit] = ("active", start_time)
+    return statuses
+
+def get_service_statuses(units: tuple[str, ...] = SERVICE_UNITS) -> dict[str, tuple[str, datetime | None]]:
+    """Query systemd once for the status of all user services."""
+    statuses: dict[str, tuple[str, datetime | None]] = {u: ("inactive", None) for u in units}
     try:
         result = subprocess.run([
-            "systemctl", "--user", "is-active", service_name
-        ], capture_output=True, text=True, check=True)
-        if result.stdout.strip() == "active":
-            status_result = subprocess.run([
-                "systemctl", "--user", "status", service_name
-            ], capture_output=True, text=True)
-            for line in status_result.stdout.splitlines():
-                if "Active:" in line and "since" in line:
-                    since = line.split("since")[1].strip()
-                    try:
-                        dt_object = datetime.strptime(
-                            since.split(";")[0].strip(),
-                            "%a %Y-%m-%d %H:%M:%S %Z"
-                        )
-                    except ValueError:
-                        dt_object = None
-                    return "active", dt_object
-            return "active", None
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        return "inactive", None
-    return "inactive", None
+            "systemctl", "--user", "show", *units,
+            "--property=Id,ActiveState,ActiveEnterTimestampMonotonic",
+        ], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return statuses
+    statuses.update(parse_systemctl_show(result.stdout, time.monotonic()))
+    return statuses
+
+def get_service_status(service_name: str) -> tuple[str, datetime | None]:
+    """Query systemd for the status of a single user service."""
+    return get_service_statuses((service_name,))[service_name]
 
 # --- Status Update -----------------------------------------------------------
 def format_uptime(start_time: datetime | None) -> str:
@@ -233,10 +339,15 @@ def format_uptime(start_time: datetime | None) -> str:
     days = hours // 24
     return f"{int(seconds % 60)}s:{int(minutes % 60)}m:{int(hours % 24)}h:{int(days)}d"
 
-def update_status() -> None:
-    """Poll daemon statuses and update the GUI labels."""
+_status_inflight = False
+
+def apply_status(statuses: dict[str, tuple[str, datetime | None]]) -> None:
+    """Update the status labels from collected statuses (Tk thread only)."""
+    global _status_inflight
+    _status_inflight = False
+
     # Git watcher service
-    git_status, git_start_time = get_service_status("autogit.service")
+    git_status, git_start_time = statuses.get("autogit.service", ("inactive", None))
     if git_status == "active":
         dir_frame.config(highlightbackground=GREEN, highlightthickness=2)
         git_status_label.config(
@@ -249,7 +360,7 @@ def update_status() -> None:
         )
 
     # AutoSave directory watcher service (assumes autosave.service for backwards compat)
-    saver_status, saver_start_time = get_service_status("autosave.service")
+    saver_status, saver_start_time = statuses.get("autosave.service", ("inactive", None))
     if saver_status == "active":
         autosave_frame.config(highlightbackground=GREEN, highlightthickness=2)
         saver_status_label.config(
@@ -261,8 +372,371 @@ def update_status() -> None:
         saver_status_label.config(
             text="AutoSave Watcher [ ⚠️ OFFLINE ⚠️ ]"
         )
+
+def request_status_refresh() -> None:
+    """Collect daemon statuses on a worker thread and hand them back to Tk."""
+    global _status_inflight
+    if _status_inflight:
+        return
+    _status_inflight = True
+
+    def worker() -> None:
+        statuses = get_service_statuses()
+        root.after(0, apply_status, statuses)
+
+    threading.Thread(target=worker, daemon=True).start()
+
+def update_status() -> None:
+    """Poll daemon statuses periodically without blocking the UI."""
+    request_status_refresh()
     # schedule next update
-    root.after(5000, update_status)
+    root.after(STATUS_POLL_MS, update_status)
+
+# --- History Sources ---------------------------------------------------------
+# Both sources answer the same questions about one watched directory: a page
+# of its timeline (newest first), the entries of one folder at a point, the
+# head of a file's content, its diff against the previous point, and how to
+# put a file or folder back.  They never touch Tk, so the browser runs them
+# on worker threads.
+def decode_preview(data: bytes, total: int) -> str:
+    """Render file bytes for the preview pane."""
+    if b"\0" in data:
+        return f"(binary file, {total} bytes)"
+    text = data.decode("utf-8", errors="replace")
+    if total > len(data):
+        text += f"\n… ({total - len(data)} more bytes not shown)"
+    return text
+
+class GitHistory:
+    """Auto-backup commits of an AutoGit repository, read through git."""
+
+    kind = "commits"
+
+    def __init__(self, directory: str):
+        self.dir = directory
+
+    def git(self, *args: str) -> str:
+        result = subprocess.run(["git", "-C", self.dir, *args], capture_output=True, text=True,
+                                errors="surrogateescape")
+        if result.returncode != 0:
+            raise ValueError(result.stderr.strip() or f"git {args[0]} failed")
+        return result.stdout
+
+    def page(self, offset: int, limit: int) -> list[tuple[str, str]]:
+        out = self.git("log", "--first-parent", "--format=%H%x09%ct%x09%s",
+                       f"--skip={offset}", "-n", str(limit))
+        points: list[tuple[str, str]] = []
+        for line in out.splitlines():
+            sha, ct, subject = line.split("\t", 2)
+            stamp = datetime.fromtimestamp(int(ct)).strftime("%Y-%m-%d %H:%M:%S")
+            points.append((sha, f"{stamp}  {sha[:8]}  {subject}"))
+        return points
+
+    def children(self, point: str, path: str) -> list[tuple[str, bool, int]]:
+        out = self.git("ls-tree", "-z", "-l", f"{point}:{path}")
+        entries: list[tuple[str, bool, int]] = []
+        for item in out.split("\0"):
+            if not item:
+                continue
+            meta, _, name = item.partition("\t")
+            _mode, kind, _sha, size = meta.split()
+            if kind in ("tree", "blob"):
+                entries.append((name, kind == "tree", 0 if size == "-" else int(size)))
+        return entries
+
+    def read(self, point: str, path: str, limit: int) -> str:
+        total = int(self.git("cat-file", "-s", f"{point}:{path}").strip())
+        proc = subprocess.Popen(["git", "-C", self.dir, "cat-file", "blob", f"{point}:{path}"],
+                                stdout=subprocess.PIPE)
+        data = proc.stdout.read(limit)
+        proc.kill()
+        proc.wait()
+        return decode_preview(data, total)
+
+    def diff(self, point: str, path: str, limit: int) -> str:
+        proc = subprocess.Popen(["git", "-C", self.dir, "show", "--format=", "--no-color",
+                                 "--no-ext-diff", "--first-parent", point, "--", path or "."],
+                                stdout=subprocess.PIPE)
+        data = proc.stdout.read(limit + 1)
+        proc.kill()
+        proc.wait()
+        text = data[:limit].decode("utf-8", errors="replace") or "(no changes in this commit)"
+        return text + ("\n… (diff truncated)" if len(data) > limit else "")
+
+    def restore(self, point: str, path: str) -> str:
+        self.git("restore", f"--source={point}", "--worktree", "--", path or ".")
+        return f"Restored {path or 'the whole tree'} from {point[:8]}"
+
+class SnapshotHistory:
+    """AutoSave snapshots of a directory, read from the snapshot store."""
+
+    kind = "snapshots"
+
+    def __init__(self, directory: str):
+        self.dir = os.path.abspath(directory)
+        self.ids: list[str] | None = None
+        self.trees: dict[str, str] = {}
+
+    def page(self, offset: int, limit: int) -> list[tuple[str, str]]:
+        if self.ids is None or offset == 0:
+            self.ids = autogit_snapshot.list_records(SNAPSHOT_DIR, self.dir)[::-1]
+        points: list[tuple[str, str]] = []
+        for snap_id in self.ids[offset:offset + limit]:
+            when = datetime.fromtimestamp(autogit_snapshot.snapshot_time(snap_id))
+            points.append((snap_id, when.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]))
+        return points
+
+    def tree(self, point: str) -> str:
+        if point not in self.trees:
+            self.trees[point] = autogit_snapshot.read_record(SNAPSHOT_DIR, self.dir, point)["tree"]
+        return self.trees[point]
+
+    def children(self, point: str, path: str) -> list[tuple[str, bool, int]]:
+        _, digest = autogit_snapshot.resolve(SNAPSHOT_DIR, self.tree(point), path)
+        node = autogit_snapshot.read_tree(SNAPSHOT_DIR, digest)
+        entries = [(name, True, child[2]) for name, child in node["d"].items()]
+        entries += [(name, False, entry[0]) for name, entry in node["f"].items()]
+        return entries
+
+    def head(self, point: str, path: str, limit: int) -> tuple[bytes, int]:
+        """Return the first `limit` bytes of a file at a point, and its size."""
+        kind, entry = autogit_snapshot.resolve(SNAPSHOT_DIR, self.tree(point), path)
+        if kind != "f":
+            raise ValueError(f"{path} is a folder")
+        data = b""
+        for digest in entry[4]:
+            if len(data) >= limit:
+                break
+            with open(autogit_snapshot.object_path(SNAPSHOT_DIR, "objects", digest), "rb") as fh:
+                data += fh.read(limit - len(data))
+        return data, entry[0]
+
+    def read(self, point: str, path: str, limit: int) -> str:
+        return decode_preview(*self.head(point, path, limit))
+
+    def diff(self, point: str, path: str, limit: int) -> str:
+        index = self.ids.index(point) if self.ids and point in self.ids else -1
+        if index < 0 or index + 1 >= len(self.ids):
+            return "(oldest snapshot: nothing to compare with)"
+        new, _ = self.head(point, path, limit)
+        try:
+            old, _ = self.head(self.ids[index + 1], path, limit)
+        except ValueError:
+            old = b""
+        if b"\0" in old or b"\0" in new:
+            return "(binary files differ)" if old != new else "(no changes)"
+        lines = difflib.unified_diff(old.decode("utf-8", errors="replace").splitlines(True),
+                                     new.decode("utf-8", errors="replace").splitlines(True),
+                                     f"a/{path}", f"b/{path}")
+        return "".join(lines) or "(no changes since the previous snapshot)"
+
+    def restore(self, point: str, path: str) -> str:
+        dest = os.path.join(self.dir, path) if path else self.dir
+        count = autogit_snapshot.restore(SNAPSHOT_DIR, self.dir, point, dest, path)
+        return f"Restored {count} file(s) to {dest}"
+
+def run_in_background(work, done) -> None:
+    """Run work() on a worker thread; call done(result, error) on the Tk thread."""
+    def worker() -> None:
+        try:
+            result, error = work(), None
+        except (OSError, ValueError, KeyError, subprocess.SubprocessError) as exc:
+            result, error = None, exc
+        root.after(0, done, result, error)
+
+    threading.Thread(target=worker, daemon=True).start()
+
+# --- History Browser ---------------------------------------------------------
+class HistoryBrowser:
+    """Window showing one entry's timeline, folder tree and file preview.
+
+    The timeline loads HISTORY_PAGE points at a time and folders are listed
+    only when expanded, so opening a long history costs one page.  Every
+    query runs off the Tk thread; results for a point that is no longer
+    selected are dropped.
+    """
+
+    def __init__(self, source, title: str):
+        self.source = source
+        self.points: list[str] = []
+        self.point: str | None = None
+        self.loading = False
+        self.win = tk.Toplevel(root, bg=BG_COLOR, padx=10, pady=10)
+        self.win.title(f"History: {title}")
+        self.win.geometry("1100x650")
+
+        tk.Label(self.win, text=f"{title} ({source.kind})", **LABEL_STYLE).pack(anchor="w")
+        body = tk.Frame(self.win, bg=BG_COLOR)
+        body.pack(fill="both", expand=True, pady=5)
+
+        left = tk.Frame(body, bg=BG_COLOR)
+        left.pack(side="left", fill="y")
+        self.timeline = tk.Listbox(left, width=48, exportselection=False, **LISTBOX_STYLE)
+        self.timeline.pack(fill="y", expand=True)
+        self.timeline.bind("<<ListboxSelect>>", self.on_point)
+        self.more_btn = tk.Button(left, text="▼ Older", command=self.load_page, **BTN_STYLE)
+        self.more_btn.pack(fill="x", pady=5)
+
+        middle = tk.Frame(body, bg=BG_COLOR)
+        middle.pack(side="left", fill="both", expand=True, padx=5)
+        self.tree = ttk.Treeview(middle, columns=("size",), selectmode="browse")
+        self.tree.heading("#0", text="Path")
+        self.tree.heading("size", text="Bytes")
+        self.tree.column("size", width=90, anchor="e")
+        self.tree.pack(fill="both", expand=True)
+        self.tree.bind("<<TreeviewOpen>>", self.on_open)
+
+        right = tk.Frame(body, bg=BG_COLOR)
+        right.pack(side="left", fill="both", expand=True)
+        self.preview = tk.Text(right, wrap="none", bg=LISTBOX_STYLE["background"], fg=FG_COLOR,
+                               font=("Consolas", 9), border=0, highlightthickness=0)
+        self.preview.pack(fill="both", expand=True)
+        btns = tk.Frame(right, bg=BG_COLOR)
+        btns.pack(fill="x", pady=5)
+        tk.Button(btns, text="📄 View", command=lambda: self.show("read"), **BTN_STYLE).pack(side="left", padx=5)
+        tk.Button(btns, text="± Diff", command=lambda: self.show("diff"), **BTN_STYLE).pack(side="left", padx=5)
+        tk.Button(btns, text="⟲ Restore", command=self.restore, **BTN_STYLE).pack(side="left", padx=5)
+
+        self.status_var = tk.StringVar()
+        tk.Label(self.win, textvariable=self.status_var, bg=BG_COLOR, fg=TANGERINE,
+                 font=("Consolas", 9)).pack(anchor="w")
+        self.load_page()
+
+    def status(self, text: str) -> None:
+        self.status_var.set(text)
+
+    def background(self, work, done) -> None:
+        """run_in_background, dropping results that arrive after the window closed."""
+        def guarded(result, error) -> None:
+            if self.win.winfo_exists():
+                done(result, error)
+
+        run_in_background(work, guarded)
+
+    def load_page(self) -> None:
+        """Append the next page of the timeline."""
+        if self.loading:
+            return
+        self.loading = True
+        offset = len(self.points)
+        self.status(f"Loading {self.source.kind}…")
+
+        def done(page, error) -> None:
+            self.loading = False
+            if error:
+                self.status(f"Cannot read history: {error}")
+                return
+            for point, label in page:
+                self.points.append(point)
+                self.timeline.insert(tk.END, label)
+            if len(page) < HISTORY_PAGE:
+                self.more_btn.config(state="disabled")
+            if not self.points and isinstance(self.source, SnapshotHistory):
+                self.status("No snapshots yet (AutoSave takes them with SNAPSHOTS=1)")
+                return
+            self.status(f"Showing {len(self.points)} {self.source.kind}"
+                        + ("" if len(page) < HISTORY_PAGE else " (▼ Older for more)"))
+
+        self.background(lambda: self.source.page(offset, HISTORY_PAGE), done)
+
+    def selected_path(self) -> tuple[str, bool] | None:
+        """Return (root-relative path, is folder) of the selected tree row."""
+        selection = self.tree.selection()
+        if not selection or self.point is None:
+            return None
+        item = selection[0]
+        if ":" not in item:
+            return None  # placeholder row of a folder still loading
+        return item.partition(":")[2], "dir" in self.tree.item(item, "tags")
+
+    def load_children(self, item: str, path: str) -> None:
+        """List one folder of the selected point under a tree row."""
+        point = self.point
+
+        def done(entries, error) -> None:
+            if point != self.point or (item and not self.tree.exists(item)):
+                return
+            if error:
+                self.status(f"Cannot list {path or '/'}: {error}")
+                return
+            self.tree.delete(*self.tree.get_children(item))
+            for name, is_dir, size in sorted(entries, key=lambda e: (not e[1], e[0])):
+                child_path = f"{path}/{name}" if path else name
+                child = self.tree.insert(item, tk.END, iid=f"{point}:{child_path}", text=name,
+                                         values=(size,), tags=("dir",) if is_dir else ())
+                if is_dir:
+                    self.tree.insert(child, tk.END, text="…")
+
+        self.background(lambda: self.source.children(point, path), done)
+
+    def on_point(self, _event=None) -> None:
+        selection = self.timeline.curselection()
+        if not selection:
+            return
+        self.point = self.points[selection[0]]
+        self.tree.delete(*self.tree.get_children())
+        self.preview.delete("1.0", tk.END)
+        self.load_children("", "")
+
+    def on_open(self, _event=None) -> None:
+        item = self.tree.focus()
+        children = self.tree.get_children(item)
+        if len(children) == 1 and not self.tree.item(children[0], "values"):
+            self.load_children(item, item.partition(":")[2])
+
+    def show(self, what: str) -> None:
+        """Fetch a file's content or a path's diff into the preview pane."""
+        selected = self.selected_path()
+        if selected is None:
+            return
+        path, is_dir = selected
+        if what == "read" and is_dir:
+            return
+        point = self.point
+
+        def done(text, error) -> None:
+            if point != self.point:
+                return
+            self.status(path)
+            self.preview.delete("1.0", tk.END)
+            self.preview.insert("1.0", text if error is None else f"Error: {error}")
+
+        self.status(f"Loading {path}…")
+        self.background(lambda: getattr(self.source, what)(point, path, PREVIEW_BYTES), done)
+
+    def restore(self) -> None:
+        """Put the selected file or folder (or the whole tree) back as it was."""
+        selected = self.selected_path()
+        path = selected[0] if selected else ""
+        point = self.point
+        if point is None:
+            return
+        if not messagebox.askyesno(
+            "AutoGit", f"Restore {path or 'the whole directory'} to this point?\n"
+                       "Current versions of those files will be overwritten.", parent=self.win):
+            return
+
+        def done(message, error) -> None:
+            if error:
+                self.status(f"Restore failed: {error}")
+                messagebox.showerror("AutoGit", f"Restore failed:\n{error}", parent=self.win)
+                return
+            self.status(message)
+            messagebox.showinfo("AutoGit", message, parent=self.win)
+
+        self.status(f"Restoring {path or '/'}…")
+        self.background(lambda: self.source.restore(point, path), done)
+
+def open_history(listbox: tk.Listbox, source_type) -> None:
+    """Open a history window for the entry selected in a panel."""
+    selection = listbox.curselection()
+    if not selection:
+        return
+    directory = entry_dir(listbox.get(selection[0]))
+    if source_type is SnapshotHistory and autogit_snapshot is None:
+        messagebox.showerror("AutoGit", "autogit_snapshot.py was not found next to this script.")
+        return
+    HistoryBrowser(source_type(directory), directory)
 
 # --- GUI Construction -------------------------------------------------------
 def build_gui() -> None:
@@ -295,6 +769,7 @@ def build_gui() -> None:
     tk.Label(dir_frame, text="Git Watcher", **LABEL_STYLE).pack(anchor="w", pady=5)
     dir_listbox = tk.Listbox(dir_frame, height=15, **LISTBOX_STYLE)
     dir_listbox.pack(fill="both", expand=True, pady=5)
+    dir_listbox.bind("<Double-Button-1>", lambda _e: open_history(dir_listbox, GitHistory))
 
     dir_btn_frame = tk.Frame(dir_frame, bg=BG_COLOR)
     dir_btn_frame.pack(fill="x", pady=5)
@@ -320,6 +795,7 @@ def build_gui() -> None:
 
     autosave_listbox = tk.Listbox(autosave_frame, height=15, **LISTBOX_STYLE)
     autosave_listbox.pack(fill="both", expand=True, pady=5)
+    autosave_listbox.bind("<Double-Button-1>", lambda _e: open_history(autosave_listbox, SnapshotHistory))
 
     autosave_btn_frame = tk.Frame(autosave_frame, bg=BG_COLOR)
     autosave_btn_frame.pack(fill="x", pady=5)
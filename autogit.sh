@@ -2,9 +2,11 @@
 # autogit.sh — checksum-driven multi-repo backup daemon
 # - Watches dirs listed in ~/.autogit/dirs_main.txt
 # - Computes deterministic 16-digit int (from file metadata) per dir
-# - On change: updates main list, ensures a PUBLIC GitHub repo exists,
-#   initializes local git if needed, and pushes to origin/<BRANCH>
+# - On change: updates main list and queues a job for a pool of git workers,
+#   which ensure a PUBLIC GitHub repo exists, initialize local git if needed,
+#   commit, and push to origin/<BRANCH>
 # - CLI: start | stop | status | run-once | run-loop
+# - SHARDS=N splits the watch list across N cooperating instances
 # - Logs: ~/.autogit/auto_git.log
 
 set -Eeuo pipefail
@@ -16,6 +18,9 @@ CLONE_FILE="${CLONE_FILE:-$HOME/.autogit/dirs_clone.txt}"
 LOG_FILE="${LOG_FILE:-$HOME/.autogit/auto_git.log}"
 PID_FILE="${PID_FILE:-$HOME/.autogit/auto_git.pid}"
 IGNORE_FILE="${IGNORE_FILE:-$HOME/.autogit/ignore_globs.txt}"
+# Every writer of WATCH_FILE (both daemons and the GUI) holds this flock
+# while it re-reads, merges and atomically replaces the file.
+WATCH_LOCK_FILE="${WATCH_LOCK_FILE:-${WATCH_FILE}.lock}"
 INTERVAL="${INTERVAL:-5}"
 BRANCH="${BRANCH:-main}"
 REMOTE_NAME="${REMOTE_NAME:-origin}"
@@ -27,17 +32,182 @@ GIT_USER="${GIT_USER:-z3r0x0N3}"                  # <--- CHANGE if needed
 TOKEN_FILE="${TOKEN_FILE:-$HOME/.AUTH/.GIT_token}" # expects a PATH
 API_URL="${API_URL:-https://api.github.com}"
 GITHUB_HOST="github.com"
+# Known-existing repos are cached for REPO_CACHE_TTL seconds; expired
+# entries are revalidated with a conditional (ETag) request.
+REPO_CACHE_FILE="${REPO_CACHE_FILE:-$HOME/.autogit/repo_cache.tsv}"
+REPO_CACHE_TTL="${REPO_CACHE_TTL:-86400}"
+API_TIMEOUT="${API_TIMEOUT:-30}"
+
+# Commit/push worker pool. Detection only queues jobs; at most GIT_WORKERS
+# run at once in the background, each repo has at most one in flight, and
+# changes seen meanwhile coalesce into its pending job. pull/push are bounded
+# by GIT_NETWORK_TIMEOUT seconds and API calls by API_TIMEOUT; a job still
+# running after GIT_JOB_TIMEOUT seconds is killed.
+GIT_WORKERS="${GIT_WORKERS:-4}"
+GIT_JOB_DIR="${GIT_JOB_DIR:-$HOME/.autogit/jobs}"
+GIT_NETWORK_TIMEOUT="${GIT_NETWORK_TIMEOUT:-120}"
+GIT_JOB_TIMEOUT="${GIT_JOB_TIMEOUT:-900}"
+
+# Remote reachability. A failed push triggers a TCP probe of the remote's
+# host (REACH_TIMEOUT seconds). While it is unreachable, commits stay local
+# and pushes, pulls and API calls for its repos are paused; the host is
+# re-probed every REACH_PROBE_INTERVAL seconds. When it is back, backoff is
+# reset and pending pushes flush, highest entry priority and oldest change
+# first, at most PUSH_FLUSH_MAX at a time. REACH_PROBE=0 disables probing
+# (e.g. when remotes are only reachable through a proxy).
+REACH_PROBE="${REACH_PROBE:-1}"
+REACH_TIMEOUT="${REACH_TIMEOUT:-5}"
+REACH_PROBE_INTERVAL="${REACH_PROBE_INTERVAL:-30}"
+PUSH_FLUSH_MAX="${PUSH_FLUSH_MAX:-2}"
+
+# Incremental scan index (see autogit_scan.py). Falls back to a plain find
+# pipeline when python3 or the helper is unavailable.
+SCAN_HELPER="${SCAN_HELPER:-$(cd "$(dirname "$0")" && pwd)/autogit_scan.py}"
+INDEX_DIR="${INDEX_DIR:-$HOME/.autogit/index}"
+SCAN_TRUST_DIR_MTIME="${SCAN_TRUST_DIR_MTIME:-0}"
+SCAN_WORKERS="${SCAN_WORKERS:-4}"   # roots scanned concurrently per cycle
+# Opt-in: configure watched repos with core.untrackedCache and a
+# core.fsmonitor hook that answers git from the scan journal (requires the
+# scan helper). Ignored paths are always reported, so git re-checks those
+# itself.
+GIT_FSMONITOR="${GIT_FSMONITOR:-0}"
+# Targeted staging: commits stage only the paths journaled as changed since
+# this daemon's previous scan of the root (written to STAGE_DELTA_DIR by the
+# helper), instead of `git add -A`.
+# Deltas longer than STAGE_DELTA_MAX paths fall back to `git add -A`
+# (0 = always `git add -A`).
+STAGE_DELTA_DIR="${STAGE_DELTA_DIR:-$HOME/.autogit/delta}"
+STAGE_DELTA_MAX="${STAGE_DELTA_MAX:-1000}"
+
+# Push coalescing: commits happen every cycle, but each repo pushes at most
+# once per PUSH_MIN_INTERVAL seconds. Failed pushes back off exponentially
+# (PUSH_BACKOFF_BASE doubling up to PUSH_BACKOFF_MAX, plus jitter).
+PUSH_STATE_DIR="${PUSH_STATE_DIR:-$HOME/.autogit/push_state}"
+PUSH_MIN_INTERVAL="${PUSH_MIN_INTERVAL:-60}"
+PUSH_BACKOFF_BASE="${PUSH_BACKOFF_BASE:-30}"
+PUSH_BACKOFF_MAX="${PUSH_BACKOFF_MAX:-3600}"
+
+# Per-entry scheduling. Watch entries may carry ::tags and inline options,
+# e.g. /data/archive::archive::every=3600::priority=-1. SCHEDULE_FILE maps
+# tags (or "default") to "<tag> <every seconds> [priority]". Due entries are
+# scanned highest priority first, most overdue first, at most
+# SCHEDULE_MAX_PER_CYCLE per cycle (0 = no cap). With SCHEDULE_ADAPTIVE=1 an
+# idle entry is rescanned every idle_time/SCHEDULE_IDLE_FACTOR seconds (never
+# less than its own interval, never more than SCHEDULE_MAX_INTERVAL).
+SCHEDULE_FILE="${SCHEDULE_FILE:-$HOME/.autogit/schedule.conf}"
+SCHEDULE_STATE_FILE="${SCHEDULE_STATE_FILE:-$HOME/.autogit/schedule_state.tsv}"
+SCHEDULE_ADAPTIVE="${SCHEDULE_ADAPTIVE:-0}"
+SCHEDULE_IDLE_FACTOR="${SCHEDULE_IDLE_FACTOR:-10}"
+SCHEDULE_MAX_INTERVAL="${SCHEDULE_MAX_INTERVAL:-3600}"
+SCHEDULE_MAX_PER_CYCLE="${SCHEDULE_MAX_PER_CYCLE:-0}"
+
+# Quiescence, opt-in. With SETTLE_WINDOW > 0 a changed root is committed
+# once its fingerprint has been stable for that many seconds, and at the
+# latest SETTLE_MAX_DELAY seconds after the change was first seen, so
+# continuous writers still get committed. The default 0 commits on first
+# sight. Entries override the window inline with ::settle=<seconds>.
+SETTLE_WINDOW="${SETTLE_WINDOW:-0}"
+SETTLE_MAX_DELAY="${SETTLE_MAX_DELAY:-300}"
+
+# Large-file policy, applied before staging (autogit_scan.py policy). Files
+# over LARGE_FILE_MAX bytes (0 = no size limit) or with an extension in
+# LARGE_FILE_EXTENSIONS are either excluded (skip) or copied to the
+# content-addressed LARGE_FILE_STORE and committed as a pointer under
+# .autogit-pointers/ (store). Opt-in: LARGE_FILE_ACTION defaults to off,
+# because enabling it untracks files a repo may already commit.
+# Entries override it inline: ::large=<bytes>::large_action=skip::large_ext=iso,img
+LARGE_FILE_MAX="${LARGE_FILE_MAX:-52428800}"
+LARGE_FILE_EXTENSIONS="${LARGE_FILE_EXTENSIONS:-iso qcow2 vmdk vdi ova}"
+LARGE_FILE_ACTION="${LARGE_FILE_ACTION:-off}"
+LARGE_FILE_STORE="${LARGE_FILE_STORE:-$HOME/.autogit/store}"
+
+# History compaction, opt-in per entry with ::compact=hourly or
+# ::compact=daily. Consecutive "Auto backup" commits older than
+# COMPACT_AFTER seconds are squashed into one commit per hour/day by
+# autogit_compact.py, at most once per COMPACT_EVERY seconds per repo and one
+# repo per cycle. Repos with a remote are only compacted when the entry also
+# carries ::compact_force, which permits the force-push.
+COMPACT_HELPER="${COMPACT_HELPER:-$(cd "$(dirname "$0")" && pwd)/autogit_compact.py}"
+COMPACT_AFTER="${COMPACT_AFTER:-2592000}"
+COMPACT_EVERY="${COMPACT_EVERY:-86400}"
+
+# Idle-time repository maintenance. A watched repo unchanged for
+# MAINTENANCE_QUIET seconds gets `git maintenance run` (loose objects,
+# incremental repack with multi-pack-index, commit-graph) at most once every
+# MAINTENANCE_EVERY seconds, one repo per quiet cycle. Maintenance runs at
+# nice MAINTENANCE_NICE with idle IO priority, MAINTENANCE_THREADS pack
+# threads and a MAINTENANCE_TIMEOUT second budget. While enabled, the
+# daemon's own commits skip git's foreground `gc --auto`.
+MAINTENANCE="${MAINTENANCE:-1}"
+MAINTENANCE_EVERY="${MAINTENANCE_EVERY:-86400}"
+MAINTENANCE_QUIET="${MAINTENANCE_QUIET:-600}"
+MAINTENANCE_TIMEOUT="${MAINTENANCE_TIMEOUT:-600}"
+MAINTENANCE_THREADS="${MAINTENANCE_THREADS:-1}"
+MAINTENANCE_NICE="${MAINTENANCE_NICE:-19}"
+
+# Sharding (opt-in). With SHARDS=N > 1, `start` launches N run-loop
+# instances. Instance k holds an flock on SHARD_DIR/<k>.lock while it runs
+# and owns the watch entries that a jump consistent hash of the directory
+# maps to shard k, so growing N by one moves only ~1/N of the roots. A shard
+# whose lock is free (its instance died) is adopted by the next live instance
+# in ring order until it returns. SHARD_DIR/count holds the current N: `start`
+# rewrites it, running instances rehash on their next cycle and instances
+# beyond the new count exit. Per-instance files (PID, log, clone, schedule
+# state, deltas, metrics) get a ".<k>" suffix. A run-loop started without
+# SHARD_INDEX claims the first free slot.
+SHARDS="${SHARDS:-1}"
+SHARD_DIR="${SHARD_DIR:-$HOME/.autogit/shards}"
+SHARD_INDEX="${SHARD_INDEX:-}"
+
+# Cycle metrics (see autogit_metrics.py). Observations are buffered in memory
+# and merged into METRICS_DIR/autogit.{json,prom} every METRICS_FLUSH_INTERVAL
+# seconds; counters and histograms persist across restarts.
+METRICS="${METRICS:-1}"
+METRICS_HELPER="${METRICS_HELPER:-$(cd "$(dirname "$0")" && pwd)/autogit_metrics.py}"
+METRICS_DIR="${METRICS_DIR:-$HOME/.autogit/metrics}"
+METRICS_FLUSH_INTERVAL="${METRICS_FLUSH_INTERVAL:-15}"
+
+# Logging (see autogit_log.sh): lines are batched every LOG_FLUSH_INTERVAL
+# seconds, repeated idle lines are summarised every LOG_SUMMARY_INTERVAL
+# seconds, and the log rotates at LOG_MAX_BYTES keeping LOG_KEEP files for at
+# most LOG_MAX_AGE_DAYS days. LOG_FORMAT=json writes JSON lines.
+LOG_FORMAT="${LOG_FORMAT:-text}"
+LOG_FLUSH_INTERVAL="${LOG_FLUSH_INTERVAL:-5}"
+LOG_SUMMARY_INTERVAL="${LOG_SUMMARY_INTERVAL:-600}"
+LOG_MAX_BYTES="${LOG_MAX_BYTES:-5242880}"
+LOG_KEEP="${LOG_KEEP:-5}"
+LOG_MAX_AGE_DAYS="${LOG_MAX_AGE_DAYS:-30}"
+AUTOGIT_LOG_LIB="${AUTOGIT_LOG_LIB:-$(cd "$(dirname "$0")" && pwd)/autogit_log.sh}"
+LOG_TAG="autogit"
+if [[ -f "$AUTOGIT_LOG_LIB" ]]; then
+  # shellcheck source=autogit_log.sh
+  source "$AUTOGIT_LOG_LIB"
+else
+  # Minimal unbuffered fallback when the library is not installed alongside.
+  log_msg() {
+    local ts; printf -v ts '%(%Y-%m-%d %H:%M:%S)T' -1
+    printf '%s %s\n' "$ts" "$2" >> "$LOG_FILE"
+  }
+  log_idle() { log_msg "$@"; }
+  log_tick() { :; }
+  log_flush() { :; }
+  log_close() { :; }
+fi
 
 SCRIPT_NAME="$(basename "$0")"
-CURRENT_CLONE_TMP=""
+CLONE_CONTENT=""
+LAST_CLONE_CONTENT=""
+LAST_CLONE_LOADED=0
+declare -A MAIN_UPDATES=()
+SCAN_DIRS=(); SCAN_RESULTS=()
+METRICS_BUF=""
+METRICS_FLUSHED_AT=0
+METRICS_NAME="autogit"
+CYCLE_STARTED=0
 
 # ----- Logging / helpers ------------------------------------------------------
-log() {
-  local msg="$1"; local ts
-  ts="$(date '+%Y-%m-%d %H:%M:%S')"
-  mkdir -p "$(dirname "$LOG_FILE")"
-  printf '%s %s\n' "$ts" "$msg" >> "$LOG_FILE"
-}
+log() { log_msg INFO "$1"; }
+log_warn() { log_msg WARN "$1"; }
 
 usage() {
   cat <<EOF
@@ -48,16 +218,33 @@ Options:
   -h, --help                Show this help message
 
 Environment overrides:
-  WATCH_FILE, CLONE_FILE, LOG_FILE, PID_FILE, IGNORE_FILE, INTERVAL, BRANCH,
+  WATCH_FILE, WATCH_LOCK_FILE, CLONE_FILE, LOG_FILE, PID_FILE, IGNORE_FILE, INTERVAL, BRANCH,
   REMOTE_NAME, PRESERVE_EXISTING_REMOTE, REPO_VISIBILITY,
-  GIT_USER, TOKEN_FILE, API_URL
+  GIT_USER, TOKEN_FILE, API_URL, SCAN_HELPER, INDEX_DIR, SCAN_TRUST_DIR_MTIME,
+  SCAN_WORKERS, GIT_FSMONITOR, STAGE_DELTA_DIR, STAGE_DELTA_MAX, PUSH_STATE_DIR, PUSH_MIN_INTERVAL, PUSH_BACKOFF_BASE,
+  PUSH_BACKOFF_MAX, REPO_CACHE_FILE, REPO_CACHE_TTL, API_TIMEOUT, GIT_WORKERS, GIT_JOB_DIR,
+  GIT_NETWORK_TIMEOUT, GIT_JOB_TIMEOUT, REACH_PROBE, REACH_TIMEOUT, REACH_PROBE_INTERVAL,
+  PUSH_FLUSH_MAX, METRICS, METRICS_HELPER, METRICS_DIR,
+  METRICS_FLUSH_INTERVAL, AUTOGIT_LOG_LIB, LOG_FORMAT, LOG_FLUSH_INTERVAL, LOG_SUMMARY_INTERVAL,
+  LOG_MAX_BYTES, LOG_KEEP, LOG_MAX_AGE_DAYS, SCHEDULE_FILE, SCHEDULE_STATE_FILE, SCHEDULE_ADAPTIVE,
+  SCHEDULE_IDLE_FACTOR, SCHEDULE_MAX_INTERVAL, SCHEDULE_MAX_PER_CYCLE, SETTLE_WINDOW,
+  SETTLE_MAX_DELAY, COMPACT_HELPER, COMPACT_AFTER, COMPACT_EVERY, MAINTENANCE,
+  MAINTENANCE_EVERY, MAINTENANCE_QUIET, MAINTENANCE_TIMEOUT, MAINTENANCE_THREADS,
+  MAINTENANCE_NICE, LARGE_FILE_MAX, LARGE_FILE_EXTENSIONS, LARGE_FILE_ACTION, LARGE_FILE_STORE,
+  SHARDS, SHARD_DIR, SHARD_INDEX
 EOF
 }
 
+# Create missing paths only; existing files are not touched so idle cycles
+# leave the state files alone.
 ensure_runtime_paths() {
-  mkdir -p "$(dirname "$WATCH_FILE")" "$(dirname "$CLONE_FILE")" \
-           "$(dirname "$LOG_FILE")"   "$(dirname "$PID_FILE")"
-  touch "$WATCH_FILE" "$CLONE_FILE" "$LOG_FILE"
+  local f
+  for f in "$WATCH_FILE" "$CLONE_FILE" "$LOG_FILE" "$PID_FILE"; do
+    [[ "$f" == */* && ! -d "${f%/*}" ]] && mkdir -p "${f%/*}"
+  done
+  for f in "$WATCH_FILE" "$CLONE_FILE" "$LOG_FILE"; do
+    [[ -e "$f" ]] || : > "$f"
+  done
 }
 
 validate_interval() {
@@ -66,14 +253,98 @@ validate_interval() {
 }
 
 validate_runtime_options() {
+  [[ "$GIT_WORKERS" =~ ^[0-9]+$ ]] && [ "$GIT_WORKERS" -gt 0 ] || {
+    printf 'Invalid GIT_WORKERS: %s (expected a positive integer)\n' "$GIT_WORKERS" >&2
+    exit 1
+  }
+  [[ "$PUSH_FLUSH_MAX" =~ ^[0-9]+$ ]] && [ "$PUSH_FLUSH_MAX" -gt 0 ] || {
+    printf 'Invalid PUSH_FLUSH_MAX: %s (expected a positive integer)\n' "$PUSH_FLUSH_MAX" >&2
+    exit 1
+  }
+  [[ "$REACH_PROBE" =~ ^[01]$ ]] || {
+    printf 'Invalid REACH_PROBE: %s (expected 0 or 1)\n' "$REACH_PROBE" >&2
+    exit 1
+  }
+  [[ "$SCAN_WORKERS" =~ ^[0-9]+$ ]] && [ "$SCAN_WORKERS" -gt 0 ] || {
+    printf 'Invalid SCAN_WORKERS: %s (expected a positive integer)\n' "$SCAN_WORKERS" >&2
+    exit 1
+  }
+  [[ "$LARGE_FILE_MAX" =~ ^[0-9]+$ ]] || {
+    printf 'Invalid LARGE_FILE_MAX: %s (expected bytes)\n' "$LARGE_FILE_MAX" >&2
+    exit 1
+  }
+  [[ "$LARGE_FILE_ACTION" =~ ^(skip|store|off)$ ]] || {
+    printf 'Invalid LARGE_FILE_ACTION: %s (expected skip, store or off)\n' "$LARGE_FILE_ACTION" >&2
+    exit 1
+  }
+  [[ "$STAGE_DELTA_MAX" =~ ^[0-9]+$ ]] || {
+    printf 'Invalid STAGE_DELTA_MAX: %s (expected a path count)\n' "$STAGE_DELTA_MAX" >&2
+    exit 1
+  }
+  local opt
+  for opt in PUSH_MIN_INTERVAL PUSH_BACKOFF_BASE PUSH_BACKOFF_MAX REPO_CACHE_TTL \
+             METRICS_FLUSH_INTERVAL SCHEDULE_MAX_INTERVAL SCHEDULE_MAX_PER_CYCLE \
+             LOG_FLUSH_INTERVAL LOG_SUMMARY_INTERVAL LOG_MAX_BYTES LOG_KEEP LOG_MAX_AGE_DAYS \
+             SETTLE_WINDOW SETTLE_MAX_DELAY COMPACT_AFTER COMPACT_EVERY \
+             MAINTENANCE_EVERY MAINTENANCE_QUIET MAINTENANCE_TIMEOUT \
+             API_TIMEOUT GIT_NETWORK_TIMEOUT GIT_JOB_TIMEOUT REACH_TIMEOUT REACH_PROBE_INTERVAL; do
+    [[ "${!opt}" =~ ^[0-9]+$ ]] || {
+      printf 'Invalid %s: %s (expected seconds)\n' "$opt" "${!opt}" >&2
+      exit 1
+    }
+  done
+  [[ "$MAINTENANCE" =~ ^[01]$ ]] || {
+    printf 'Invalid MAINTENANCE: %s (expected 0 or 1)\n' "$MAINTENANCE" >&2
+    exit 1
+  }
+  [[ "$MAINTENANCE_THREADS" =~ ^[0-9]+$ ]] && [ "$MAINTENANCE_THREADS" -gt 0 ] || {
+    printf 'Invalid MAINTENANCE_THREADS: %s (expected a positive integer)\n' "$MAINTENANCE_THREADS" >&2
+    exit 1
+  }
+  [[ "$MAINTENANCE_NICE" =~ ^[0-9]+$ ]] && [ "$MAINTENANCE_NICE" -le 19 ] || {
+    printf 'Invalid MAINTENANCE_NICE: %s (expected 0-19)\n' "$MAINTENANCE_NICE" >&2
+    exit 1
+  }
   [[ "$PRESERVE_EXISTING_REMOTE" =~ ^[01]$ ]] || {
     printf 'Invalid PRESERVE_EXISTING_REMOTE: %s (expected 0 or 1)\n' "$PRESERVE_EXISTING_REMOTE" >&2
     exit 1
   }
+  [[ "$GIT_FSMONITOR" =~ ^[01]$ ]] || {
+    printf 'Invalid GIT_FSMONITOR: %s (expected 0 or 1)\n' "$GIT_FSMONITOR" >&2
+    exit 1
+  }
+  [[ "$SCHEDULE_IDLE_FACTOR" =~ ^[0-9]+$ ]] && [ "$SCHEDULE_IDLE_FACTOR" -gt 0 ] || {
+    printf 'Invalid SCHEDULE_IDLE_FACTOR: %s (expected a positive integer)\n' "$SCHEDULE_IDLE_FACTOR" >&2
+    exit 1
+  }
+  [[ "$SCHEDULE_ADAPTIVE" =~ ^[01]$ ]] || {
+    printf 'Invalid SCHEDULE_ADAPTIVE: %s (expected 0 or 1)\n' "$SCHEDULE_ADAPTIVE" >&2
+    exit 1
+  }
+  [[ "$LOG_FORMAT" == "text" || "$LOG_FORMAT" == "json" ]] || {
+    printf 'Invalid LOG_FORMAT: %s (expected text or json)\n' "$LOG_FORMAT" >&2
+    exit 1
+  }
+  [[ "$METRICS" =~ ^[01]$ ]] || {
+    printf 'Invalid METRICS: %s (expected 0 or 1)\n' "$METRICS" >&2
+    exit 1
+  }
   [[ "$REPO_VISIBILITY" == "public" || "$REPO_VISIBILITY" == "private" ]] || {
     printf 'Invalid REPO_VISIBILITY: %s (expected public or private)\n' "$REPO_VISIBILITY" >&2
     exit 1
   }
+  [[ "$SHARDS" =~ ^[0-9]+$ ]] && [ "$SHARDS" -gt 0 ] || {
+    printf 'Invalid SHARDS: %s (expected a positive integer)\n' "$SHARDS" >&2
+    exit 1
+  }
+  [[ -z "$SHARD_INDEX" ]] || { [[ "$SHARD_INDEX" =~ ^[0-9]+$ ]] && [ "$SHARD_INDEX" -lt "$SHARDS" ]; } || {
+    printf 'Invalid SHARD_INDEX: %s (expected 0-%s)\n' "$SHARD_INDEX" "$(( SHARDS - 1 ))" >&2
+    exit 1
+  }
+  [[ "$SHARDS" -eq 1 ]] || command -v flock >/dev/null 2>&1 || {
+    printf 'SHARDS=%s needs flock(1)\n' "$SHARDS" >&2
+    exit 1
+  }
 }
 
 is_process_running() {
@@ -87,14 +358,91 @@ write_pid() { echo "$$" > "$PID_FILE"; }
 
 cleanup_and_exit() {
   trap - EXIT INT TERM
+  drain_git_jobs 10
+  reach_stop
+  metrics_flush 1
   if [[ -f "$PID_FILE" ]] && [[ "$(cat "$PID_FILE" 2>/dev/null || true)" = "$$" ]]; then
     rm -f "$PID_FILE"
     log "Shutdown"
   fi
+  log_close
   exit 0
 }
 
+# ----- Metrics ----------------------------------------------------------------
+# Set NOW_US to microseconds since the epoch without forking.
+now_us() {
+  NOW_US="${EPOCHREALTIME/[.,]/}"
+  [[ -n "$NOW_US" ]] || NOW_US="$(date +%s%6N)"
+}
+
+# us_to_seconds <var> <microseconds>
+us_to_seconds() {
+  printf -v "$1" '%d.%06d' $(( $2 / 1000000 )) $(( $2 % 1000000 ))
+}
+
+# metric <c|g|h|i> <name> <value> [label=value ...]; see autogit_metrics.py.
+metric() {
+  [[ "$METRICS" == "1" ]] || return 0
+  local IFS=$'\t'
+  METRICS_BUF+="$*"$'\n'
+}
+
+# Hand buffered observations to the metrics helper at most once per
+# METRICS_FLUSH_INTERVAL seconds (always when forced, e.g. on shutdown).
+metrics_flush() {
+  local force="${1:-0}" now
+  [[ "$METRICS" == "1" && -n "$METRICS_BUF" ]] || return 0
+  printf -v now '%(%s)T' -1
+  [[ "$force" == "1" ]] || (( now - METRICS_FLUSHED_AT >= METRICS_FLUSH_INTERVAL )) || return 0
+  METRICS_FLUSHED_AT="$now"
+  if [[ -f "$METRICS_HELPER" ]] && command -v python3 >/dev/null 2>&1; then
+    local extra=()
+    [[ -n "$SHARD_INDEX" ]] && extra=(--label "shard=$SHARD_INDEX")
+    printf '%s' "$METRICS_BUF" | python3 "$METRICS_HELPER" record --daemon autogit "${extra[@]}" \
+      --state "$METRICS_DIR/$METRICS_NAME.json" --prom "$METRICS_DIR/$METRICS_NAME.prom" 2>>"$LOG_FILE" ||
+      log_warn "Metrics flush failed"
+  fi
+  METRICS_BUF=""
+}
+
+# timed_git <phase> <dir> <git args...>: run git and record its latency.
+# Network phases (pull, push*) are cut off after GIT_NETWORK_TIMEOUT seconds.
+timed_git() {
+  local phase="$1" dir="$2" start rc=0 secs run=() gc=()
+  shift 2
+  [[ "$MAINTENANCE" == "1" ]] && gc=(-c gc.auto=0)   # idle maintenance repacks instead
+  case "$phase" in
+    pull|*push) command -v timeout >/dev/null 2>&1 && run=(timeout "$GIT_NETWORK_TIMEOUT") ;;
+  esac
+  now_us; start="$NOW_US"
+  "${run[@]}" git -C "$dir" "${gc[@]}" "$@" || rc=$?
+  now_us; us_to_seconds secs $(( NOW_US - start ))
+  metric h autogit_git_duration_seconds "$secs" "phase=$phase"
+  [[ "$rc" -eq 0 ]] || metric c autogit_git_failures_total 1 "phase=$phase"
+  return "$rc"
+}
+
+# timed_api <call> <curl args...>: run curl (-w '%{http_code}') and record
+# its latency and HTTP status. Prints curl's output.
+timed_api() {
+  local call="$1" start out secs
+  shift
+  now_us; start="$NOW_US"
+  out="$(curl --connect-timeout "$API_TIMEOUT" --max-time "$API_TIMEOUT" "$@" || true)"
+  now_us; us_to_seconds secs $(( NOW_US - start ))
+  metric h autogit_api_duration_seconds "$secs" "call=$call"
+  metric c autogit_api_requests_total 1 "call=$call" "code=${out:-none}"
+  printf '%s' "$out"
+}
+
 # ----- Ignore patterns --------------------------------------------------------
+# The Python scan helper applies IGNORE_FILE with full gitignore semantics.
+# For the find fallback the file is compiled once into prune arguments and
+# reused until its mtime/size changes.
+IGNORE_SIGNATURE=""
+IGNORE_PRUNE_ARGS=()
+
 read_ignore_patterns() {
   local patterns=()
   if [[ -f "$IGNORE_FILE" ]]; then
@@ -102,28 +450,55 @@ read_ignore_patterns() {
       local line="$raw_line"
       line="${line#"${line%%[![:space:]]*}"}"; line="${line%"${line##*[![:space:]]}"}"
       [[ -z "$line" || "$line" == \#* ]] && continue
-      [[ "$line" != /* ]] && line="*/${line}"
-      line="${line//\*\*/\*}"   # collapse ** to *
       patterns+=("$line")
     done < "$IGNORE_FILE"
   fi
   printf '%s\n' "${patterns[@]}" 2>/dev/null || true
 }
 
+# Approximates gitignore rules with find: slash-free globs match names at
+# any depth, anchored globs match paths under the root ("ROOT" is replaced
+# per directory), and matching directories are pruned. Negations are only
+# honoured by the Python helper.
+load_ignore_prune_args() {
+  local sig=""
+  [[ -f "$IGNORE_FILE" ]] && sig="$(stat -c '%Y %s' "$IGNORE_FILE" 2>/dev/null || true)"
+  [[ -n "$IGNORE_SIGNATURE" && "$sig" == "$IGNORE_SIGNATURE" ]] && return 0
+  IGNORE_SIGNATURE="${sig:-none}"
+  IGNORE_PRUNE_ARGS=(-name .git)
+
+  local p patterns=()
+  mapfile -t patterns < <(read_ignore_patterns) || true
+  for p in "${patterns[@]}"; do
+    [[ "$p" == !* ]] && continue
+    p="${p%/}"
+    p="${p//\*\*/\*}"
+    if [[ "$p" == */* ]]; then
+      IGNORE_PRUNE_ARGS+=(-o -path "ROOT/${p#/}")
+    else
+      IGNORE_PRUNE_ARGS+=(-o -name "$p")
+    fi
+  done
+}
+
 # ----- Deterministic 16-digit int from metadata (size + mtime) ----------------
+have_scan_helper() {
+  [[ -f "$SCAN_HELPER" ]] && command -v python3 >/dev/null 2>&1
+}
+
+# find fallback for one directory (used when the scan helper is unavailable).
+# Hashes relative path, size and mtime of every file, so renames register.
 calc_int_for_dir() {
   local dir="$1"
-  local ignore_patterns
-  mapfile -t ignore_patterns < <(read_ignore_patterns) || true
-
-  local find_cmd=(find "$dir" -type f -not -path '*/.git/*')
-  local p
-  for p in "${ignore_patterns[@]}"; do
-    find_cmd+=(-not -path "$p")
+  load_ignore_prune_args
+  local find_cmd=(find "$dir" "(") arg
+  for arg in "${IGNORE_PRUNE_ARGS[@]}"; do
+    find_cmd+=("${arg/#ROOT\//${dir%/}/}")
   done
+  find_cmd+=(")" -prune -o -type f)
 
   local raw digits
-  raw="$("${find_cmd[@]}" -printf '%s %T@ ' 2>/dev/null | sha256sum | base64 || true)"
+  raw="$("${find_cmd[@]}" -printf '%P %s %T@\n' 2>/dev/null | sort | sha256sum | base64 || true)"
   digits="$(printf '%s' "$raw" | tr -dc '0-9' | head -c 16)"
   while [ "${#digits}" -lt 16 ]; do digits="0${digits}"; done
   printf '%s\n' "$digits"
@@ -132,26 +507,71 @@ calc_int_for_dir() {
 # ----- Clone / main file operations ------------------------------------------
 update_clone_line() {
   local label="$1" new_int="$2"
-  printf '%s - [ %s ]\n' "$label" "$new_int" >> "$CURRENT_CLONE_TMP"
+  CLONE_CONTENT+="${label} - [ ${new_int} ]"$'\n'
+}
+
+# Rewrite CLONE_FILE only when this cycle's snapshot differs from the last
+# one written, so idle cycles perform no writes.
+write_clone_if_changed() {
+  if [[ "$LAST_CLONE_LOADED" -eq 0 ]]; then
+    [[ -f "$CLONE_FILE" ]] && LAST_CLONE_CONTENT="$(< "$CLONE_FILE")"$'\n'
+    LAST_CLONE_LOADED=1
+  fi
+  [[ "$CLONE_CONTENT" == "$LAST_CLONE_CONTENT" ]] && return 0
+  local tmp; tmp="$(mktemp "$(dirname "$CLONE_FILE")/clone.XXXXXX")"
+  printf '%s' "$CLONE_CONTENT" > "$tmp"
+  mv "$tmp" "$CLONE_FILE"
+  LAST_CLONE_CONTENT="$CLONE_CONTENT"
+}
+
+# Run a command while holding the watch-file lock (skipped when flock(1)
+# is unavailable, e.g. on stock macOS).
+with_watch_lock() {
+  if ! command -v flock >/dev/null 2>&1; then "$@"; return; fi
+  local fd rc=0
+  exec {fd}>>"$WATCH_LOCK_FILE"
+  flock -x "$fd"
+  "$@" || rc=$?
+  exec {fd}>&-
+  return "$rc"
 }
 
-replace_main_line() {
+queue_main_update() {
   local label="$1" new_int="$2"
-  local base_dir="${label%%::*}"
-  local tmp; tmp="$(mktemp "$(dirname "$WATCH_FILE")/main.XXXXXX")"
-  local replaced=0
-  while IFS= read -r line || [[ -n "$line" ]]; do
-    if [[ "$line" == "$label" ]] || [[ "$line" == "$label - ["* ]] ||
-       [[ "$line" == "$base_dir" ]] || [[ "$line" == "$base_dir - ["* ]]; then
-      printf '%s - [ %s ]\n' "$label" "$new_int" >> "$tmp"; replaced=1
+  MAIN_UPDATES["$label"]="$new_int"
+}
+
+# Merge all queued hash updates into the current WATCH_FILE in one atomic
+# rewrite. Entries added or removed by others during the cycle are kept as
+# they are now; updates for entries that disappeared are dropped.
+apply_main_updates_locked() {
+  local line trimmed label tmp changed=0 out=""
+  local lines=()
+  [[ -f "$WATCH_FILE" ]] && mapfile -t lines < "$WATCH_FILE"
+  for line in "${lines[@]}"; do
+    trimmed="${line#"${line%%[![:space:]]*}"}"
+    trimmed="${trimmed%"${trimmed##*[![:space:]]}"}"
+    label="${trimmed%% - [*}"
+    if [[ -n "$trimmed" && "$trimmed" != \#* && -n "${MAIN_UPDATES[$label]+x}" ]]; then
+      local updated="${label} - [ ${MAIN_UPDATES[$label]} ]"
+      [[ "$updated" != "$line" ]] && changed=1
+      out+="$updated"$'\n'
     else
-      printf '%s\n' "$line" >> "$tmp"
+      out+="$line"$'\n'
     fi
-  done < "$WATCH_FILE"
-  [[ "$replaced" -eq 0 ]] && printf '%s - [ %s ]\n' "$label" "$new_int" >> "$tmp"
+  done
+  [[ "$changed" -eq 1 ]] || return 0
+  tmp="$(mktemp "$(dirname "$WATCH_FILE")/main.XXXXXX")"
+  printf '%s' "$out" > "$tmp"
   mv "$tmp" "$WATCH_FILE"
 }
 
+apply_main_updates() {
+  [[ "${#MAIN_UPDATES[@]}" -gt 0 ]] || return 0
+  with_watch_lock apply_main_updates_locked
+  MAIN_UPDATES=()
+}
+
 # ===== GitHub + Git integration (PUBLIC repo auto-creation) ===================
 
 read_token_trimmed() {
@@ -164,13 +584,13 @@ read_token_trimmed() {
 
 ensure_token() {
   if [[ ! -f "$TOKEN_FILE" ]]; then
-    log "No GitHub token at $TOKEN_FILE"
+    log_idle INFO "No GitHub token at $TOKEN_FILE"
     return 1
   fi
   local tok
   tok="$(read_token_trimmed)"
   if [[ -z "$tok" ]]; then
-    log "Empty GitHub token at $TOKEN_FILE"
+    log_idle INFO "Empty GitHub token at $TOKEN_FILE"
     return 1
   fi
   return 0
@@ -191,23 +611,75 @@ ensure_credential_entry() {
   fi
 }
 
+# ----- Repo-existence cache ---------------------------------------------------
+# REPO_CACHE_FILE holds "<api url>/<user>/<repo>\t<checked epoch>\t<etag>"
+# lines for repos known to exist.
+repo_cache_lookup() {
+  local key="$1" k checked etag
+  RC_CHECKED=0; RC_ETAG=""
+  [[ -f "$REPO_CACHE_FILE" ]] || return 1
+  while IFS=$'\t' read -r k checked etag; do
+    if [[ "$k" == "$key" ]]; then
+      RC_CHECKED="$checked"; RC_ETAG="$etag"
+      return 0
+    fi
+  done < "$REPO_CACHE_FILE"
+  return 1
+}
+
+repo_cache_store() {
+  local key="$1" etag="$2" now k checked old_etag
+  printf -v now '%(%s)T' -1
+  mkdir -p "$(dirname "$REPO_CACHE_FILE")"
+  local tmp="$REPO_CACHE_FILE.tmp.$BASHPID"   # git workers may store concurrently
+  : > "$tmp"
+  if [[ -f "$REPO_CACHE_FILE" ]]; then
+    while IFS=$'\t' read -r k checked old_etag; do
+      [[ -n "$k" && "$k" != "$key" ]] && printf '%s\t%s\t%s\n' "$k" "$checked" "$old_etag" >> "$tmp"
+    done < "$REPO_CACHE_FILE"
+  fi
+  printf '%s\t%s\t%s\n' "$key" "$now" "$etag" >> "$tmp"
+  mv "$tmp" "$REPO_CACHE_FILE"
+}
+
 # Ensure GitHub repo exists. If 404, create it using configured visibility.
+# Cached repos skip the API entirely until their TTL expires.
 ensure_remote_repo_exists() {
   local repo_name="$1"
-  local token; token="$(read_token_trimmed)"
-  local status
-  status="$(curl -s -o /dev/null -w '%{http_code}' \
-    -H "Authorization: token ${token}" \
-    "${API_URL}/repos/${GIT_USER}/${repo_name}")"
-
-  if [[ "$status" == "404" ]]; then
-    local private_flag="false"
-    [[ "$REPO_VISIBILITY" == "private" ]] && private_flag="true"
-    log "Creating ${REPO_VISIBILITY^^} GitHub repo: ${repo_name}"
-    curl -s -H "Authorization: token ${token}" \
-         -d "{\"name\":\"${repo_name}\", \"private\":${private_flag}}" \
-         "${API_URL}/user/repos" >/dev/null
+  local key="${API_URL}/${GIT_USER}/${repo_name}" now
+  printf -v now '%(%s)T' -1
+  if repo_cache_lookup "$key" && (( now - RC_CHECKED < REPO_CACHE_TTL )); then
+    return 0
   fi
+
+  local token; token="$(read_token_trimmed)"
+  local headers; headers="$(mktemp "${TMPDIR:-/tmp}/autogit_hdr.XXXXXX")"
+  local curl_args=(-s -o /dev/null -D "$headers" -w '%{http_code}'
+                   -H "Authorization: token ${token}")
+  [[ -n "$RC_ETAG" ]] && curl_args+=(-H "If-None-Match: ${RC_ETAG}")
+  local status etag
+  status="$(timed_api repo_get "${curl_args[@]}" "${API_URL}/repos/${GIT_USER}/${repo_name}")"
+  etag="$(grep -i '^etag:' "$headers" 2>/dev/null | head -n1 | cut -d' ' -f2- | tr -d '\r' || true)"
+  rm -f "$headers"
+
+  case "$status" in
+    200) repo_cache_store "$key" "$etag" ;;
+    304) repo_cache_store "$key" "${etag:-$RC_ETAG}" ;;
+    404)
+      local private_flag="false"
+      [[ "$REPO_VISIBILITY" == "private" ]] && private_flag="true"
+      log "Creating ${REPO_VISIBILITY^^} GitHub repo: ${repo_name}"
+      status="$(timed_api repo_create -s -o /dev/null -w '%{http_code}' -H "Authorization: token ${token}" \
+           -d "{\"name\":\"${repo_name}\", \"private\":${private_flag}}" \
+           "${API_URL}/user/repos")"
+      if [[ "$status" == "201" || "$status" == "422" ]]; then
+        repo_cache_store "$key" ""
+      else
+        log_warn "GitHub repo creation failed for ${repo_name} (HTTP ${status})"
+      fi
+      ;;
+    *) log_warn "GitHub repo check failed for ${repo_name} (HTTP ${status:-none})" ;;
+  esac
 }
 
 # Ensure local repo + remote configuration.
@@ -232,12 +704,13 @@ ensure_local_repo_and_remote() {
   local existing
   existing="$(git -C "$dir" config --get "remote.${REMOTE_NAME}.url" || true)"
   if [[ -n "$existing" && "$PRESERVE_EXISTING_REMOTE" == "1" ]]; then
-    log "Preserving existing remote ${REMOTE_NAME} for $dir"
+    log_idle INFO "Preserving existing remote ${REMOTE_NAME} for $dir"
     return 0
   fi
 
   ensure_credential_entry "$repo_name"
-  ensure_remote_repo_exists "$repo_name"
+  # Offline: the GitHub check runs with the first commit after reconnecting.
+  [[ "$PUSH_OFFLINE" == "1" ]] || ensure_remote_repo_exists "$repo_name"
 
   # configure remote
   if [[ -z "$existing" ]]; then
@@ -248,17 +721,615 @@ ensure_local_repo_and_remote() {
   fi
 }
 
-commit_and_push() {
+# ----- Push scheduling --------------------------------------------------------
+PUSH_OFFLINE=0   # set in commit jobs whose remote is unreachable
+PUSH_FAILED=0    # set in jobs when a push attempt failed
+
+# Per-repo state lives in PUSH_STATE_DIR/<escaped path>.state as key=value
+# lines: dir, last_push, next_try, failures, pending, changed_at (epoch of the
+# first change detected since the last successful push), compacted_at (last
+# history compaction check), maintained_at (last idle maintenance run).
+push_state_path() {
+  local key="${1//%/%25}"
+  PUSH_STATE_PATH="$PUSH_STATE_DIR/${key//\//%2F}.state"
+}
+
+load_push_state() {
+  push_state_path "$1"
+  PS_LAST=0; PS_NEXT=0; PS_FAILS=0; PS_PENDING=0; PS_CHANGED=0; PS_COMPACTED=0; PS_MAINTAINED=0
+  [[ -f "$PUSH_STATE_PATH" ]] || return 0
+  local k v
+  while IFS='=' read -r k v; do
+    case "$k" in
+      last_push) PS_LAST="$v" ;;
+      next_try)  PS_NEXT="$v" ;;
+      failures)  PS_FAILS="$v" ;;
+      pending)   PS_PENDING="$v" ;;
+      changed_at) PS_CHANGED="$v" ;;
+      compacted_at) PS_COMPACTED="$v" ;;
+      maintained_at) PS_MAINTAINED="$v" ;;
+    esac
+  done < "$PUSH_STATE_PATH"
+}
+
+save_push_state() {
+  local dir="$1"
+  push_state_path "$dir"
+  mkdir -p "$PUSH_STATE_DIR"
+  printf 'dir=%s\nlast_push=%s\nnext_try=%s\nfailures=%s\npending=%s\nchanged_at=%s\ncompacted_at=%s\nmaintained_at=%s\n' \
+    "$dir" "$PS_LAST" "$PS_NEXT" "$PS_FAILS" "$PS_PENDING" "$PS_CHANGED" "$PS_COMPACTED" "$PS_MAINTAINED" \
+    > "$PUSH_STATE_PATH.tmp"
+  mv "$PUSH_STATE_PATH.tmp" "$PUSH_STATE_PATH"
+}
+
+# Pull --rebase + push one repo and record the outcome in its state file.
+push_repo() {
+  local dir="$1" now commits
+  # best-effort rebase (noisy failures are fine)
+  timed_git pull "$dir" pull --rebase "$REMOTE_NAME" "$BRANCH" >/dev/null 2>&1 || true
+
+  commits="$(git -C "$dir" rev-list --count "${REMOTE_NAME}/${BRANCH}..HEAD" 2>/dev/null ||
+             git -C "$dir" rev-list --count HEAD 2>/dev/null || echo '?')"
+  printf -v now '%(%s)T' -1
+
+  if timed_git push "$dir" push -u "$REMOTE_NAME" "$BRANCH" >/dev/null 2>&1; then
+    log "Pushed $dir → ${REMOTE_NAME}/$BRANCH (${commits} commit(s))"
+    metric c autogit_pushes_total 1
+    [[ "$PS_CHANGED" -gt 0 ]] &&
+      metric h autogit_change_to_push_seconds $(( now - PS_CHANGED ))
+    PS_LAST="$now"; PS_NEXT=0; PS_FAILS=0; PS_PENDING=0; PS_CHANGED=0
+    save_push_state "$dir"
+    return 0
+  fi
+
+  PS_FAILS=$((PS_FAILS + 1))
+  local delay="$PUSH_BACKOFF_BASE" i
+  for ((i = 1; i < PS_FAILS && delay < PUSH_BACKOFF_MAX; i++)); do delay=$((delay * 2)); done
+  [[ "$delay" -gt "$PUSH_BACKOFF_MAX" ]] && delay="$PUSH_BACKOFF_MAX"
+  delay=$((delay + RANDOM % (delay / 4 + 1)))
+  PS_NEXT=$((now + delay)); PS_PENDING=1
+  PUSH_FAILED=1
+  save_push_state "$dir"
+  log_warn "git push failed: $dir (attempt ${PS_FAILS}, ${commits} commit(s) pending, retry in ${delay}s)"
+  return 1
+}
+
+# push_due <dir>: load the repo's push state and succeed if it has pending
+# commits whose interval/backoff has elapsed.
+push_due() {
+  local now due
+  load_push_state "$1"
+  [[ "$PS_PENDING" == "1" ]] || return 1
+  printf -v now '%(%s)T' -1
+  due=$((PS_LAST + PUSH_MIN_INTERVAL))
+  [[ "$PS_NEXT" -gt "$due" ]] && due="$PS_NEXT"
+  [[ "$now" -ge "$due" ]]
+}
+
+# Push a repo with pending commits once its interval/backoff has elapsed.
+push_if_due() {
+  push_due "$1" || return 0
+  push_repo "$1"
+}
+
+# Mark a repo as having unpushed commits, then push if it is due and its
+# remote is reachable.
+schedule_push() {
   local dir="$1"
+  load_push_state "$dir"
+  if [[ "$PS_PENDING" != "1" ]]; then
+    PS_PENDING=1
+    [[ "$PS_CHANGED" -gt 0 ]] || PS_CHANGED="$CYCLE_STARTED"
+    save_push_state "$dir"
+  fi
+  [[ "$PUSH_OFFLINE" == "1" ]] && return 0
+  push_if_due "$dir"
+}
+
+# state_file_dir <state file>: set STATE_DIR to the repo a state file is for.
+state_file_dir() {
+  local k v
+  STATE_DIR=""
+  while IFS='=' read -r k v; do
+    [[ "$k" == "dir" ]] && { STATE_DIR="$v"; break; }
+  done < "$1"
+  return 0
+}
+
+# Called once per cycle so coalesced/backed-off pushes go out even when the
+# repo sees no further changes. The push state files are the durable queue
+# of unpushed repos, so a restart resumes where the last run stopped. Due
+# repos with a reachable remote are queued by entry priority, then oldest
+# change first, keeping at most PUSH_FLUSH_MAX push jobs queued or running.
+# Repos with a job in flight or queued are left to that job.
+flush_due_pushes() {
+  [[ -d "$PUSH_STATE_DIR" ]] || return 0
+  local f dir kind line i slots="$PUSH_FLUSH_MAX" unpushed=0 due=()
+  for kind in "${JOB_KIND[@]}" "${QUEUED_KIND[@]}"; do
+    [[ "$kind" == "push" ]] && slots=$(( slots - 1 ))
+  done
+  for f in "$PUSH_STATE_DIR"/*.state; do
+    [[ -f "$f" ]] || continue
+    state_file_dir "$f"; dir="$STATE_DIR"
+    [[ -n "$dir" && -d "$dir/.git" ]] && shard_owns "$dir" || continue
+    push_due "$dir" || { [[ "$PS_PENDING" == "1" ]] && unpushed=$(( unpushed + 1 )); continue; }
+    unpushed=$(( unpushed + 1 ))
+    (( slots > 0 )) && git_job_idle "$dir" && reach_ok "$dir" || continue
+    due+=("0"$'\t'"$PS_CHANGED"$'\t'"$dir")
+  done
+  metric g autogit_unpushed_repos "$unpushed"
+  [[ "${#due[@]}" -gt 0 ]] || return 0
+  if [[ "${#due[@]}" -gt 1 ]]; then
+    local -A prio=()
+    for i in "${!ENTRY_DIRS[@]}"; do
+      entry_policy "${ENTRY_LABELS[$i]}"
+      prio["${ENTRY_DIRS[$i]}"]="$POL_PRIO"
+    done
+    for i in "${!due[@]}"; do
+      dir="${due[$i]#*$'\t'}"; dir="${dir#*$'\t'}"
+      due[$i]="${prio[$dir]:-0}${due[$i]#0}"
+    done
+    mapfile -t due < <(printf '%s\n' "${due[@]}" | sort -t $'\t' -k1,1nr -k2,2n)
+  fi
+  for line in "${due[@]}"; do
+    (( slots > 0 )) || break
+    dir="${line#*$'\t'}"; dir="${dir#*$'\t'}"
+    enqueue_git_job push "$dir"
+    slots=$(( slots - 1 ))
+  done
+  return 0
+}
+
+# ----- Remote reachability ----------------------------------------------------
+# Hosts are keyed "host:port" and assumed up until a push fails. A failed
+# push starts a background TCP probe; a host whose probe fails is down until
+# a later probe (every REACH_PROBE_INTERVAL seconds) connects. Local and
+# file remotes are never probed.
+declare -A REPO_HOST=()                                     # dir -> host:port
+declare -A REACH_STATE=() REACH_PID=() REACH_STARTED=() REACH_CHECKED=()
+
+# remote_host_key <url>: set HOST_KEY to "host:port" ("" for local remotes).
+remote_host_key() {
+  local url="$1" rest port
+  HOST_KEY=""
+  case "$url" in
+    https://*) rest="${url#https://}"; port=443 ;;
+    http://*)  rest="${url#http://}"; port=80 ;;
+    ssh://*)   rest="${url#ssh://}"; port=22 ;;
+    git://*)   rest="${url#git://}"; port=9418 ;;
+    *://*|/*|.*|file:*) return 0 ;;
+    *:*)       rest="${url%%:*}"; port=22 ;;      # scp-like user@host:path
+    *) return 0 ;;
+  esac
+  rest="${rest%%/*}"; rest="${rest##*@}"
+  if [[ "$rest" =~ ^(.+):([0-9]+)$ ]]; then
+    rest="${BASH_REMATCH[1]}"; port="${BASH_REMATCH[2]}"
+  fi
+  [[ -n "$rest" ]] && HOST_KEY="$rest:$port"
+  return 0
+}
+
+# repo_host_key <dir>: set HOST_KEY for a repo's remote, cached per process.
+repo_host_key() {
+  local dir="$1" url
+  HOST_KEY="${REPO_HOST[$dir]:-}"
+  [[ -z "$HOST_KEY" ]] || return 0
+  url="$(git -C "$dir" config --get "remote.${REMOTE_NAME}.url" 2>/dev/null || true)"
+  remote_host_key "$url"
+  [[ -z "$HOST_KEY" ]] || REPO_HOST["$dir"]="$HOST_KEY"
+  return 0
+}
+
+# reach_ok <dir>: succeed unless the repo's remote host is down or probing.
+reach_ok() {
+  [[ "$REACH_PROBE" == "1" && "${#REACH_STATE[@]}" -gt 0 ]] || return 0
+  repo_host_key "$1"
+  [[ -z "$HOST_KEY" || "${REACH_STATE[$HOST_KEY]:-up}" == "up" ]]
+}
+
+reach_probe_start() {
+  local key="$1" now
+  printf -v now '%(%s)T' -1
+  ( exec 3<>"/dev/tcp/${key%:*}/${key##*:}" ) 2>/dev/null &
+  REACH_PID["$key"]=$!; REACH_STARTED["$key"]="$now"
+  [[ "${REACH_STATE[$key]:-up}" == "down" ]] || REACH_STATE["$key"]=probing
+  return 0
+}
+
+# reach_suspect <dir>: a push of this repo failed; probe its host.
+reach_suspect() {
+  [[ "$REACH_PROBE" == "1" ]] || return 0
+  repo_host_key "$1"
+  [[ -n "$HOST_KEY" && -z "${REACH_PID[$HOST_KEY]:-}" ]] || return 0
+  [[ "${REACH_STATE[$HOST_KEY]:-up}" == "up" ]] || return 0
+  reach_probe_start "$HOST_KEY"
+}
+
+# reset_push_backoff [host key]: make the idle unpushed repos (of one host,
+# or all) due now, so the backlog flushes without waiting out retry delays
+# that piled up while offline. Sets RESET_COUNT.
+reset_push_backoff() {
+  local key="${1:-}" f dir
+  RESET_COUNT=0
+  [[ -d "$PUSH_STATE_DIR" ]] || return 0
+  for f in "$PUSH_STATE_DIR"/*.state; do
+    [[ -f "$f" ]] || continue
+    state_file_dir "$f"; dir="$STATE_DIR"
+    [[ -n "$dir" && -d "$dir/.git" ]] && shard_owns "$dir" && git_job_idle "$dir" || continue
+    if [[ -n "$key" ]]; then
+      repo_host_key "$dir"
+      [[ "$HOST_KEY" == "$key" ]] || continue
+    fi
+    load_push_state "$dir"
+    [[ "$PS_PENDING" == "1" ]] || continue
+    PS_NEXT=0; PS_FAILS=0; PS_LAST=0
+    save_push_state "$dir"
+    RESET_COUNT=$(( RESET_COUNT + 1 ))
+  done
+  return 0
+}
+
+# Called every cycle: collect finished probes, time out slow ones and
+# re-probe down hosts.
+reach_poll() {
+  [[ "$REACH_PROBE" == "1" && "${#REACH_STATE[@]}" -gt 0 ]] || return 0
+  local key pid rc now started checked was
+  printf -v now '%(%s)T' -1
+  for key in "${!REACH_STATE[@]}"; do
+    pid="${REACH_PID[$key]:-}"
+    if [[ -z "$pid" ]]; then
+      checked="${REACH_CHECKED[$key]:-0}"
+      if [[ "${REACH_STATE[$key]}" == "down" ]] && (( now - checked >= REACH_PROBE_INTERVAL )); then
+        reach_probe_start "$key"
+      fi
+      continue
+    fi
+    started="${REACH_STARTED[$key]}"
+    if kill -0 "$pid" 2>/dev/null; then
+      (( now - started >= REACH_TIMEOUT )) || continue
+      kill -KILL "$pid" 2>/dev/null || true
+    fi
+    rc=0; wait "$pid" 2>/dev/null || rc=$?
+    unset 'REACH_PID[$key]' 'REACH_STARTED[$key]'
+    REACH_CHECKED["$key"]="$now"
+    was="${REACH_STATE[$key]}"
+    if [[ "$rc" -eq 0 ]]; then
+      metric c autogit_reach_probes_total 1 "result=up"
+      metric g autogit_remote_up 1 "host=$key"
+      unset 'REACH_STATE[$key]'
+      if [[ "$was" == "down" ]]; then
+        reset_push_backoff "$key"
+        log "Remote $key reachable again; flushing $RESET_COUNT unpushed repo(s)"
+      fi
+    else
+      metric c autogit_reach_probes_total 1 "result=down"
+      metric g autogit_remote_up 0 "host=$key"
+      REACH_STATE["$key"]=down
+      [[ "$was" == "down" ]] || log_warn "Remote $key unreachable; pausing pushes to it"
+    fi
+  done
+  return 0
+}
+
+# Stop outstanding probes (shutdown and run-once).
+reach_stop() {
+  local key
+  for key in "${!REACH_PID[@]}"; do
+    kill -KILL "${REACH_PID[$key]}" 2>/dev/null || true
+  done
+  return 0
+}
+
+# ----- History compaction -----------------------------------------------------
+# compact_repo <dir> <granularity> <force 0|1>: squash old auto-backup
+# commits, move the branch with compare-and-swap and, for repos with a
+# remote, force-push with a lease on the old tip. A failed push restores the
+# old tip, so local and remote history never diverge. Returns 1 when the
+# lease was rejected and 2 when the repo is not eligible yet (its branch is
+# not exactly what the remote has).
+compact_repo() {
+  local dir="$1" granularity="$2" force="$3" out old new before after remote=0
+  if git -C "$dir" remote get-url "$REMOTE_NAME" >/dev/null 2>&1; then
+    remote=1
+    if [[ "$force" != "1" ]]; then
+      log_idle INFO "Not compacting $dir: it has a remote and the entry lacks ::compact_force"
+      return 0
+    fi
+    # Only rewrite what the remote already has, so the lease covers everything.
+    [[ "$(git -C "$dir" rev-parse -q --verify "refs/heads/$BRANCH" 2>/dev/null)" == \
+       "$(git -C "$dir" rev-parse -q --verify "refs/remotes/$REMOTE_NAME/$BRANCH" 2>/dev/null)" ]] || {
+      log_idle INFO "Not compacting $dir yet: $BRANCH differs from $REMOTE_NAME/$BRANCH"
+      return 2
+    }
+  fi
+
+  out="$(python3 "$COMPACT_HELPER" --repo "$dir" --branch "$BRANCH" \
+    --older-than "$COMPACT_AFTER" --granularity "$granularity" 2>>"$LOG_FILE")" || {
+    log_warn "History compaction failed for $dir"; return 0; }
+  IFS=' ' read -r old new before after <<< "$out"
+  [[ -n "$new" && "$new" != "$old" ]] || return 0
+
+  git -C "$dir" update-ref -m "autogit: compact history" "refs/heads/$BRANCH" "$new" "$old" >/dev/null 2>&1 || {
+    log_warn "History compaction of $dir skipped: $BRANCH moved"; return 0; }
+  if [[ "$remote" == "1" ]] &&
+     ! timed_git compact_push "$dir" push --force-with-lease="refs/heads/$BRANCH:$old" \
+         "$REMOTE_NAME" "refs/heads/$BRANCH:refs/heads/$BRANCH" >/dev/null 2>&1; then
+    git -C "$dir" update-ref -m "autogit: undo compaction" "refs/heads/$BRANCH" "$old" "$new" >/dev/null 2>&1 || true
+    log_warn "History compaction of $dir rolled back: force-push rejected"
+    return 1
+  fi
+  log "Compacted history of $dir: $before -> $after commits ($granularity, older than ${COMPACT_AFTER}s)"
+  metric c autogit_compacted_commits_total $(( before - after ))
+  return 0
+}
+
+# Git job: compact one repo and record the check in its push state, so the
+# next check is COMPACT_EVERY seconds away. Only a rejected lease is retried
+# on the next cycle.
+compact_job() {
+  local dir="$1" granularity="${2%% *}" force="${2##* }" now rc=0
+  printf -v now '%(%s)T' -1
+  compact_repo "$dir" "$granularity" "$force" || rc=$?
+  [[ "$rc" -ne 1 ]] || return 1
+  load_push_state "$dir"
+  PS_COMPACTED="$now"
+  save_push_state "$dir"
+}
+
+# Queue compaction for at most one opted-in repo whose COMPACT_EVERY has
+# elapsed, and only while no other compaction or maintenance job is queued
+# or running. Repos with unpushed commits, a settling change or a git job of
+# their own wait.
+compact_due_repos() {
+  [[ -f "$COMPACT_HELPER" ]] && command -v python3 >/dev/null 2>&1 || return 0
+  git_housekeeping_busy && return 0
+  local i label dir granularity force now
+  printf -v now '%(%s)T' -1
+  for i in "${!ENTRY_DIRS[@]}"; do
+    label="${ENTRY_LABELS[$i]}"; dir="${ENTRY_DIRS[$i]}"
+    [[ "$label" =~ ::compact=(hourly|daily)(::|$) ]] || continue
+    granularity="${BASH_REMATCH[1]}"
+    force=0; [[ "$label" =~ ::compact_force(::|$) ]] && force=1
+    [[ -d "$dir/.git" && -z "${SETTLE_FIRST[$dir]:-}" ]] && git_job_idle "$dir" && reach_ok "$dir" || continue
+    load_push_state "$dir"
+    [[ "$PS_PENDING" != "1" ]] || continue
+    (( now - PS_COMPACTED >= COMPACT_EVERY )) || continue
+    enqueue_git_job compact "$dir" "$label" "$granularity $force"
+    return 0
+  done
+  return 0
+}
+
+# ----- Idle maintenance -------------------------------------------------------
+MAINTENANCE_OK=""   # git supports the tasks: "" unknown, 1 yes, 0 no
+
+maintenance_supported() {
+  if [[ -z "$MAINTENANCE_OK" ]]; then
+    MAINTENANCE_OK=0
+    if [[ "$(git version 2>/dev/null)" =~ ([0-9]+)\.([0-9]+) ]] &&
+       (( BASH_REMATCH[1] > 2 || (BASH_REMATCH[1] == 2 && BASH_REMATCH[2] >= 30) )); then
+      MAINTENANCE_OK=1
+    else
+      log_warn "Idle maintenance needs git 2.30 or newer; disabled"
+    fi
+  fi
+  [[ "$MAINTENANCE_OK" == "1" ]]
+}
+
+# loose_object_count <dir>: set LOOSE_COUNT and PACK_COUNT from count-objects.
+loose_object_count() {
+  local k v
+  LOOSE_COUNT=0; PACK_COUNT=0
+  while IFS=': ' read -r k v; do
+    case "$k" in
+      count) LOOSE_COUNT="$v" ;;
+      packs) PACK_COUNT="$v" ;;
+    esac
+  done < <(git -C "$1" count-objects -v 2>/dev/null)
+  return 0
+}
+
+# maintain_repo <dir>: run the maintenance tasks at low CPU and IO priority
+# within the time budget, and log the loose object and pack counts. The
+# incremental repack (and its multi-pack-index) needs an existing pack, so a
+# repo without one only gets its loose objects packed on the first run.
+maintain_repo() {
+  local dir="$1" start secs rc=0 run=() tasks=(--task=loose-objects) loose packs result=ok
+  command -v nice >/dev/null 2>&1 && run+=(nice -n "$MAINTENANCE_NICE")
+  command -v ionice >/dev/null 2>&1 && run+=(ionice -c 3)
+  command -v taskpolicy >/dev/null 2>&1 && run+=(taskpolicy -b)     # macOS
+  command -v timeout >/dev/null 2>&1 && run+=(timeout "$MAINTENANCE_TIMEOUT")
+  loose_object_count "$dir"; loose="$LOOSE_COUNT"; packs="$PACK_COUNT"
+  [[ "$packs" -gt 0 ]] && tasks+=(--task=incremental-repack)
+  tasks+=(--task=commit-graph)
+
+  now_us; start="$NOW_US"
+  "${run[@]}" git -C "$dir" -c gc.auto=0 -c maintenance.auto=false \
+    -c pack.threads="$MAINTENANCE_THREADS" maintenance run --quiet "${tasks[@]}" \
+    >/dev/null 2>&1 || rc=$?
+  now_us; us_to_seconds secs $(( NOW_US - start ))
+
+  loose_object_count "$dir"
+  if [[ "$rc" -eq 124 ]]; then
+    result=timeout
+    log_warn "Maintenance of $dir stopped after ${MAINTENANCE_TIMEOUT}s; continuing next time"
+  elif [[ "$rc" -ne 0 ]]; then
+    result=failed
+    log_warn "Maintenance of $dir failed (exit $rc)"
+  else
+    log "Maintained $dir in ${secs}s (loose objects $loose -> $LOOSE_COUNT, packs $packs -> $PACK_COUNT)"
+  fi
+  metric h autogit_maintenance_duration_seconds "$secs"
+  metric c autogit_maintenance_total 1 "result=$result"
+  metric g autogit_repo_loose_objects "$LOOSE_COUNT" "root=$dir"
+  metric g autogit_repo_packs "$PACK_COUNT" "root=$dir"
+  return 0
+}
+
+# Git job: maintain one repo and record the run in its push state. Failed
+# and timed-out runs also wait a full interval, so a repo that cannot finish
+# does not repack every cycle.
+maintain_job() {
+  local dir="$1" now
+  printf -v now '%(%s)T' -1
+  maintain_repo "$dir"
+  load_push_state "$dir"
+  PS_MAINTAINED="$now"
+  save_push_state "$dir"
+}
+
+# Queue maintenance for at most one repo at a time: the first watched repo
+# that has been quiet for MAINTENANCE_QUIET seconds, has no git job of its
+# own and was not maintained for MAINTENANCE_EVERY seconds.
+maintain_due_repos() {
+  [[ "$MAINTENANCE" == "1" ]] || return 0
+  git_housekeeping_busy && return 0
+  local i dir now last
+  printf -v now '%(%s)T' -1
+  for i in "${!ENTRY_DIRS[@]}"; do
+    dir="${ENTRY_DIRS[$i]}"
+    [[ -d "$dir/.git" && -z "${SETTLE_FIRST[$dir]:-}" ]] && git_job_idle "$dir" || continue
+    last="${SCHED_LAST_CHANGE[$dir]:-$now}"
+    (( now - last >= MAINTENANCE_QUIET )) || continue
+    load_push_state "$dir"
+    (( now - PS_MAINTAINED >= MAINTENANCE_EVERY )) || continue
+    maintenance_supported || return 0
+    enqueue_git_job maintain "$dir"
+    return 0
+  done
+  return 0
+}
+
+# ----- Git fsmonitor integration ---------------------------------------------
+# Single-quote a word for the sh -c command line git uses to run the hook.
+shell_quote() {
+  local q="'\\''"
+  printf "'%s'" "${1//\'/$q}"
+}
+
+# Point core.fsmonitor at autogit_scan.py so git reuses the daemon's scan
+# instead of re-stating the tree. Hooks configured by the user are left alone.
+configure_git_fsmonitor() {
+  local dir="$1" current hook
+  [[ -d "$dir/.git" ]] || return 0
+  current="$(git -C "$dir" config --get core.fsmonitor 2>/dev/null || true)"
+  if [[ "$GIT_FSMONITOR" != "1" ]] || ! have_scan_helper; then
+    if [[ "$current" == *"autogit_scan.py"*" fsmonitor "* ]]; then
+      git -C "$dir" config --unset core.fsmonitor || true
+      git -C "$dir" config --unset core.fsmonitorHookVersion || true
+      git -C "$dir" config --unset core.untrackedCache true || true
+      log "Removed fsmonitor hook from $dir"
+    fi
+    return 0
+  fi
+  [[ -z "$current" || "$current" == *"autogit_scan.py"*" fsmonitor "* ]] || return 0
+
+  hook="python3 $(shell_quote "$SCAN_HELPER") fsmonitor --root $(shell_quote "$dir")"
+  hook+=" --index-dir $(shell_quote "$INDEX_DIR") --ignore-file $(shell_quote "$IGNORE_FILE")"
+  [[ "$SCAN_TRUST_DIR_MTIME" == "1" ]] && hook+=" --trust-dir-mtime"
+  [[ "$current" == "$hook" ]] && return 0
+
+  git -C "$dir" config core.fsmonitor "$hook"
+  git -C "$dir" config core.fsmonitorHookVersion 2
+  git -C "$dir" config core.untrackedCache true
+  log "Configured fsmonitor hook and untracked cache for $dir"
+}
+
+# Repos whose last commit attempt in this process staged everything and
+# succeeded. Only those may use targeted staging: the first commit after
+# startup and the one after any failure run `git add -A`, so changes from
+# a lost delta are never left behind.
+declare -A STAGE_CLEAN=()
+# Repos whose scan result was lost since their last commit job started. A
+# commit job already in flight must not mark them clean when it finishes.
+declare -A STAGE_LOST=()
+
+# True when the repo tracks files that IGNORE_FILE excludes. The scan never
+# reports changes to those, so such repos must always be staged in full.
+tracks_ignored_files() {
+  [[ -s "$IGNORE_FILE" ]] || return 1
+  local first
+  first="$(git -C "$1" ls-files -z -c -i --exclude-from="$IGNORE_FILE" 2>/dev/null | head -c 1 || true)"
+  [[ -n "$first" ]]
+}
+
+# stage_changes <dir> [delta file]: stage the scan delta (NUL-separated
+# root-relative paths) when allowed, otherwise the whole tree.
+stage_changes() {
+  local dir="$1" delta="${2:-}" clean="${STAGE_CLEAN[$dir]:-}"
+  unset 'STAGE_CLEAN[$dir]'
+  # The scan that triggered this commit just refreshed the fsmonitor journal.
+  if [[ -n "$clean" && -n "$delta" && -s "$delta" ]] && ! tracks_ignored_files "$dir"; then
+    if AUTOGIT_FSMONITOR_FRESH=1 GIT_LITERAL_PATHSPECS=1 timed_git add "$dir" \
+        add -A --pathspec-from-file="$delta" --pathspec-file-nul >/dev/null 2>&1; then
+      metric c autogit_stage_total 1 "mode=targeted"
+      return 0
+    fi
+    log_idle INFO "Targeted staging failed for $dir; staging everything"
+  fi
+  AUTOGIT_FSMONITOR_FRESH=1 timed_git add "$dir" add -A >/dev/null 2>&1 || return 1
+  metric c autogit_stage_total 1 "mode=full"
+}
+
+# apply_large_file_policy <dir> <label> [delta file]: skip or side-store
+# large files before staging. Sizes come from the scan index, so this does
+# not walk the tree; already handled files cost nothing.
+apply_large_file_policy() {
+  local dir="$1" label="$2" delta="${3:-}" part rest
+  local max="$LARGE_FILE_MAX" action="$LARGE_FILE_ACTION" exts="$LARGE_FILE_EXTENSIONS"
+  rest="${label#"${label%%::*}"}"
+  while [[ "$rest" == ::* ]]; do
+    rest="${rest#::}"; part="${rest%%::*}"; rest="${rest#"$part"}"
+    case "$part" in
+      large=*)        [[ "${part#large=}" =~ ^[0-9]+$ ]] && max="${part#large=}" ;;
+      large_action=*) [[ "${part#large_action=}" =~ ^(skip|store|off)$ ]] && action="${part#large_action=}" ;;
+      large_ext=*)    exts="${part#large_ext=}" ;;
+    esac
+  done
+  [[ "$action" != "off" ]] && have_scan_helper || return 0
+  [[ "$max" -gt 0 || -n "$exts" ]] || return 0
+
+  local args=(policy --root "$dir" --index-dir "$INDEX_DIR" --ignore-file "$IGNORE_FILE"
+    --max-bytes "$max" --extensions "$exts" --action "$action" --store-dir "$LARGE_FILE_STORE")
+  [[ -n "$delta" && -s "$delta" ]] && args+=(--delta "$delta")
+  local report=() line kind size path untrack=()
+  mapfile -t report < <(python3 "$SCAN_HELPER" "${args[@]}" 2>>"$LOG_FILE" || true)
+  for line in "${report[@]}"; do
+    IFS=$'\t' read -r kind size path <<< "$line"
+    [[ -n "$path" && "$kind" != "release" ]] || continue
+    case "$kind" in
+      skip)    log "Large file skipped: $dir/$path ($size bytes)" ;;
+      store)   log "Large file stored: $dir/$path ($size bytes) -> .autogit-pointers/$path" ;;
+      drop)    log "Large file pointer removed: $dir/.autogit-pointers/$path" ;;
+      include) log "Large file included again: $dir/$path" ;;
+    esac
+    metric c autogit_large_files_total 1 "action=$kind"
+    [[ "$kind" == "skip" || "$kind" == "store" ]] && untrack+=("$path")
+  done
+  # Stop tracking handled files that an earlier commit may have included.
+  if [[ "${#untrack[@]}" -gt 0 ]]; then
+    GIT_LITERAL_PATHSPECS=1 git -C "$dir" rm -q --cached --ignore-unmatch -- "${untrack[@]}" >/dev/null 2>&1 || true
+  fi
+  return 0
+}
+
+# commit_and_push <dir> [delta file] [label]
+commit_and_push() {
+  local dir="$1" delta="${2:-}" label="${3:-$1}"
+  configure_git_fsmonitor "$dir"
+  apply_large_file_policy "$dir" "$label" "$delta"
   # stage/commit if any staged deltas; silence harmless “nothing to commit”
-  git -C "$dir" add -A >/dev/null 2>&1 || { log "git add failed: $dir"; return 1; }
+  stage_changes "$dir" "$delta" || { log_warn "git add failed: $dir"; return 1; }
 
   if git -C "$dir" diff --cached --quiet >/dev/null 2>&1; then
-    log "No staged changes for $dir"; return 0
+    STAGE_CLEAN["$dir"]=1
+    log_idle INFO "No staged changes for $dir"; return 0
   fi
 
   local msg="Auto backup: $(date '+%Y-%m-%d %H:%M:%S')"
-  git -C "$dir" commit -m "$msg" >/dev/null 2>&1 || { log "git commit failed: $dir"; return 1; }
+  timed_git commit "$dir" commit -m "$msg" >/dev/null 2>&1 || { log_warn "git commit failed: $dir"; return 1; }
+  STAGE_CLEAN["$dir"]=1
+  metric c autogit_commits_total 1
 
   # If no remote configured, stop after local commit
   if ! git -C "$dir" remote get-url "$REMOTE_NAME" >/dev/null 2>&1; then
@@ -266,24 +1337,26 @@ commit_and_push() {
     return 0
   fi
 
-  # best-effort rebase (noisy failures are fine)
-  git -C "$dir" pull --rebase "$REMOTE_NAME" "$BRANCH" >/dev/null 2>&1 || true
-
-  if git -C "$dir" push -u "$REMOTE_NAME" "$BRANCH" >/dev/null 2>&1; then
-    log "Pushed $dir → ${REMOTE_NAME}/$BRANCH"
-    return 0
-  else
-    log "git push failed: $dir"
-    return 1
-  fi
+  # Pushes are coalesced per repo; pending ones are flushed by later cycles.
+  schedule_push "$dir" || return 1
+  [[ "$PS_PENDING" == "1" ]] && log "Committed locally in $dir (push pending)"
+  return 0
 }
 
 # ----- Main reconciliation on change -----------------------------------------
+# Runs in the cycle: record the new fingerprint and hand the commit to the
+# git workers, so a slow remote never holds up detection.
 update_main_and_commit() {
-  local label="$1" new_int="$2" old_int="$3" dir="$4"
-  replace_main_line "$label" "$new_int"
+  local label="$1" new_int="$2" old_int="$3" dir="$4" delta="${5:-}"
+  queue_main_update "$label" "$new_int"
   log "Change detected for $dir ($old_int -> $new_int)"
+  enqueue_git_job commit "$dir" "$label" "$delta"
+}
 
+# Git job: ensure the repo (and, with a token, its GitHub remote) exists,
+# then commit and push.
+commit_job() {
+  local dir="$1" label="$2" delta="${3:-}"
   # If no token, still commit locally (skip remote ensure)
   if ! ensure_token; then
     if [[ ! -d "$dir/.git" ]]; then
@@ -292,7 +1365,7 @@ update_main_and_commit() {
     fi
     git -C "$dir" config user.name "$GIT_USER" >/dev/null 2>&1 || true
     git -C "$dir" config user.email "${GIT_USER}@users.noreply.github.com" >/dev/null 2>&1 || true
-    commit_and_push "$dir"
+    commit_and_push "$dir" "$delta" "$label"
     return
   fi
 
@@ -300,21 +1373,665 @@ update_main_and_commit() {
   ensure_local_repo_and_remote "$dir"
 
   # Commit and push
-  commit_and_push "$dir"
+  commit_and_push "$dir" "$delta" "$label"
+}
+
+# ----- Git job queue ----------------------------------------------------------
+# Jobs are commit (also pushes), push, compact and maintain. Each runs in a
+# background subshell that reports "<rc> <stage clean> <push failed>" in
+# <id>.done and its
+# metrics in <id>.metrics under GIT_JOB_RUN_DIR; reap_git_jobs collects them
+# at the next poll. Workers write only per-repo state (push state, the repo
+# itself), so the cycle never waits on them.
+declare -A JOB_PID=() JOB_ID=() JOB_KIND=() JOB_STARTED=() JOB_KILLED=()   # in flight
+declare -A QUEUED_KIND=() QUEUED_LABEL=() QUEUED_DELTA=() QUEUED_ARG=()    # pending
+JOB_QUEUE=()   # repos with a pending job, oldest first
+JOB_SEQ=0
+GIT_JOB_RUN_DIR=""
+
+# Create this process's job directory and drop those of dead processes.
+git_jobs_init() {
+  local d
+  GIT_JOB_RUN_DIR="$GIT_JOB_DIR/$$"
+  LOG_IDLE_SPOOL="$GIT_JOB_RUN_DIR/idle.log"
+  mkdir -p "$GIT_JOB_RUN_DIR"
+  for d in "$GIT_JOB_DIR"/*/; do
+    d="${d%/}"
+    [[ "${d##*/}" =~ ^[0-9]+$ && "${d##*/}" != "$$" ]] || continue
+    kill -0 "${d##*/}" 2>/dev/null || rm -rf "${GIT_JOB_DIR:?}/${d##*/}"
+  done
+  return 0
+}
+
+git_job_idle() { [[ -z "${JOB_PID[$1]:-}" && -z "${QUEUED_KIND[$1]:-}" ]]; }
+
+# Succeed if a compaction or maintenance job is queued or running.
+git_housekeeping_busy() {
+  local kind
+  for kind in "${JOB_KIND[@]}" "${QUEUED_KIND[@]}"; do
+    [[ "$kind" == "compact" || "$kind" == "maintain" ]] && return 0
+  done
+  return 1
+}
+
+# enqueue_git_job <kind> <dir> [label] [delta file | job argument]
+# A commit replaces any other pending job of the repo (it pushes too) and
+# merges its delta into a pending commit; other kinds are only queued for an
+# idle repo.
+enqueue_git_job() {
+  local kind="$1" dir="$2" label="${3:-$2}" src="${4:-}" queued="${QUEUED_KIND[$2]:-}" acc
+  if [[ "$kind" == "commit" ]]; then
+    if [[ "$queued" == "commit" ]]; then
+      acc="${QUEUED_DELTA[$dir]}"
+      if [[ -n "$acc" && -s "$src" ]]; then
+        cat "$src" >> "$acc"
+      elif [[ -n "$acc" ]]; then
+        rm -f "$acc"; QUEUED_DELTA["$dir"]=""   # unknown delta: stage everything
+      fi
+      QUEUED_LABEL["$dir"]="$label"
+      metric c autogit_git_jobs_coalesced_total 1
+      return 0
+    fi
+    # The scan reuses its delta files next cycle, so the job keeps a copy.
+    JOB_SEQ=$(( JOB_SEQ + 1 ))
+    acc="$GIT_JOB_RUN_DIR/q$JOB_SEQ.delta"
+    if [[ -s "$src" ]]; then cp "$src" "$acc" 2>/dev/null || acc=""; else acc=""; fi
+    QUEUED_DELTA["$dir"]="$acc"; QUEUED_ARG["$dir"]=""
+  else
+    [[ -z "$queued" && -z "${JOB_PID[$dir]:-}" ]] || return 0
+    QUEUED_DELTA["$dir"]=""; QUEUED_ARG["$dir"]="$src"
+  fi
+  [[ -n "$queued" ]] || JOB_QUEUE+=("$dir")
+  QUEUED_KIND["$dir"]="$kind"; QUEUED_LABEL["$dir"]="$label"
+  return 0
+}
+
+# Body of a background job; never returns.
+git_job_main() {
+  local id="$1" kind="$2" dir="$3" label="$4" arg="$5" delta="$6" rc=0 start secs
+  METRICS_BUF=""            # the inherited copy belongs to the parent
+  export GIT_TERMINAL_PROMPT=0
+  [[ "$kind" == "commit" && "$arg" == "offline" ]] && PUSH_OFFLINE=1
+  now_us; start="$NOW_US"
+  case "$kind" in
+    commit)   commit_job "$dir" "$label" "$delta" || rc=$? ;;
+    push)     push_if_due "$dir" || rc=$? ;;
+    compact)  compact_job "$dir" "$arg" || rc=$? ;;
+    maintain) maintain_job "$dir" || rc=$? ;;
+  esac
+  now_us; us_to_seconds secs $(( NOW_US - start ))
+  metric h autogit_git_job_duration_seconds "$secs" "kind=$kind"
+  [[ -n "$delta" ]] && rm -f "$delta"
+  printf '%s' "$METRICS_BUF" > "$GIT_JOB_RUN_DIR/$id.metrics"
+  printf '%s %s %s\n' "$rc" "${STAGE_CLEAN[$dir]:-0}" "$PUSH_FAILED" > "$GIT_JOB_RUN_DIR/$id.tmp"
+  mv "$GIT_JOB_RUN_DIR/$id.tmp" "$GIT_JOB_RUN_DIR/$id.done"
+  exit 0
+}
+
+# Start the pending job of a repo in the background.
+start_git_job() {
+  local dir="$1" now
+  local kind="${QUEUED_KIND[$dir]}" label="${QUEUED_LABEL[$dir]}"
+  local delta="${QUEUED_DELTA[$dir]:-}" arg="${QUEUED_ARG[$dir]:-}"
+  unset 'QUEUED_KIND[$dir]' 'QUEUED_LABEL[$dir]' 'QUEUED_DELTA[$dir]' 'QUEUED_ARG[$dir]'
+  # Commits for an unreachable remote stay local; the push is queued.
+  [[ "$kind" == "commit" ]] && ! reach_ok "$dir" && arg=offline
+  JOB_SEQ=$(( JOB_SEQ + 1 ))
+  printf -v now '%(%s)T' -1
+  git_job_main "$JOB_SEQ" "$kind" "$dir" "$label" "$arg" "$delta" &
+  JOB_PID["$dir"]=$!; JOB_ID["$dir"]="$JOB_SEQ"; JOB_KIND["$dir"]="$kind"
+  JOB_STARTED["$dir"]="$now"; JOB_KILLED["$dir"]=0
+  # The job inherited the staging state; only its outcome may set it again.
+  [[ "$kind" == "commit" ]] && unset 'STAGE_CLEAN[$dir]' 'STAGE_LOST[$dir]'
+  return 0
+}
+
+# Start pending jobs, oldest first, while workers are free. A repo whose
+# previous job is still running keeps its place in the queue. Pushes to a
+# host that went down meanwhile are dropped; the flush re-queues them.
+dispatch_git_jobs() {
+  local dir rest=() flushed=0
+  for dir in "${JOB_QUEUE[@]}"; do
+    if [[ "${QUEUED_KIND[$dir]}" == "push" ]] && ! reach_ok "$dir"; then
+      unset 'QUEUED_KIND[$dir]' 'QUEUED_LABEL[$dir]' 'QUEUED_DELTA[$dir]' 'QUEUED_ARG[$dir]'
+      continue
+    fi
+    if [[ -n "${JOB_PID[$dir]:-}" || "${#JOB_PID[@]}" -ge "$GIT_WORKERS" ]]; then
+      rest+=("$dir")
+      continue
+    fi
+    # Jobs write their lines directly; keep the log in order.
+    [[ "$flushed" == "1" ]] || { log_flush 1; flushed=1; }
+    start_git_job "$dir"
+  done
+  JOB_QUEUE=("${rest[@]}")
+  metric g autogit_git_jobs_running "${#JOB_PID[@]}"
+  metric g autogit_git_jobs_queued "${#JOB_QUEUE[@]}"
+}
+
+# stop_git_job <dir> <signal>: signal a job and its direct children.
+stop_git_job() {
+  pkill "-$2" -P "${JOB_PID[$1]}" 2>/dev/null || true
+  kill "-$2" "${JOB_PID[$1]}" 2>/dev/null || true
+}
+
+# Collect finished jobs without blocking. Jobs past GIT_JOB_TIMEOUT get
+# SIGTERM, and SIGKILL 30 seconds later.
+reap_git_jobs() {
+  local dir pid id kind started killed now rc clean pushfail extra result job
+  printf -v now '%(%s)T' -1
+  for dir in "${!JOB_PID[@]}"; do
+    pid="${JOB_PID[$dir]}"; id="${JOB_ID[$dir]}"; kind="${JOB_KIND[$dir]}"
+    killed="${JOB_KILLED[$dir]}"
+    if kill -0 "$pid" 2>/dev/null; then
+      started="${JOB_STARTED[$dir]}"
+      if [[ "$killed" == "0" ]] && (( now - started >= GIT_JOB_TIMEOUT )); then
+        log_warn "Git $kind job for $dir still running after ${GIT_JOB_TIMEOUT}s; stopping it"
+        metric c autogit_git_job_timeouts_total 1 "kind=$kind"
+        stop_git_job "$dir" TERM
+        JOB_KILLED["$dir"]="$now"
+      elif [[ "$killed" != "0" ]] && (( now - killed >= 30 )); then
+        stop_git_job "$dir" KILL
+      fi
+      continue
+    fi
+    wait "$pid" 2>/dev/null || true
+    job="${GIT_JOB_RUN_DIR:?}/$id"
+    rc=1; clean=0; pushfail=0; result=failed
+    if [[ -f "$job.done" ]]; then
+      IFS=' ' read -r rc clean pushfail < "$job.done" || true
+      [[ "$rc" == "0" ]] && result=ok
+    fi
+    [[ "$killed" != "0" ]] && result=timeout
+    if [[ -s "$job.metrics" ]]; then
+      extra=""
+      IFS= read -r -d '' extra < "$job.metrics" || true
+      METRICS_BUF+="$extra"
+    fi
+    rm -f "$job.done" "$job.metrics" "$job.tmp"
+    if [[ "$kind" == "commit" && "$clean" == "1" && "$result" == "ok" && -z "${STAGE_LOST[$dir]:-}" ]]; then
+      STAGE_CLEAN["$dir"]=1
+    fi
+    [[ "$pushfail" == "1" || "$result" == "timeout" && "$kind" != "maintain" ]] && reach_suspect "$dir"
+    metric c autogit_git_jobs_total 1 "kind=$kind" "result=$result"
+    unset 'JOB_PID[$dir]' 'JOB_ID[$dir]' 'JOB_KIND[$dir]' 'JOB_STARTED[$dir]' 'JOB_KILLED[$dir]'
+  done
+  return 0
+}
+
+# drain_git_jobs [seconds]: run queued and in-flight jobs to completion,
+# giving up after the deadline (0: none) and stopping what is left.
+drain_git_jobs() {
+  local limit="${1:-0}" start now dir
+  [[ -n "$GIT_JOB_RUN_DIR" ]] || return 0
+  printf -v start '%(%s)T' -1
+  while true; do
+    reap_git_jobs
+    dispatch_git_jobs
+    [[ "${#JOB_PID[@]}" -gt 0 ]] || break
+    printf -v now '%(%s)T' -1
+    if [[ "$limit" -gt 0 ]] && (( now - start >= limit )); then
+      for dir in "${!JOB_PID[@]}"; do
+        log_warn "Stopping git ${JOB_KIND[$dir]} job for $dir at shutdown"
+        stop_git_job "$dir" TERM
+      done
+      wait || true
+      break
+    fi
+    sleep 0.1
+  done
+  rm -rf "${GIT_JOB_RUN_DIR:?}"
+  return 0
+}
+
+# ----- Fingerprinting ---------------------------------------------------------
+# Fill SCAN_RESULTS[i] with "<16 digits> [<files> <dirs> <dirs read>] <us>"
+# for every directory in SCAN_DIRS (empty when it could not be hashed).
+# The scan helper handles all of them in one invocation on SCAN_WORKERS
+# threads; without it, find runs per directory on background jobs. The two
+# produce different digits, so a root the helper did not report is left
+# empty (it keeps its stored value) rather than hashed with find.
+scan_dirs() {
+  SCAN_RESULTS=()
+  [[ "${#SCAN_DIRS[@]}" -gt 0 ]] || return 0
+  if have_scan_helper; then
+    local helper_args=(fingerprint --labels --stats --workers "$SCAN_WORKERS"
+      --index-dir "$INDEX_DIR" --ignore-file "$IGNORE_FILE") out=() line rest dir
+    local -A reported=()
+    [[ "$SCAN_TRUST_DIR_MTIME" == "1" ]] && helper_args+=(--trust-dir-mtime)
+    [[ "$STAGE_DELTA_MAX" -gt 0 ]] && helper_args+=(--delta-dir "$STAGE_DELTA_DIR" --delta-max "$STAGE_DELTA_MAX")
+    mapfile -t out < <(python3 "$SCAN_HELPER" "${helper_args[@]}" "${SCAN_DIRS[@]}" 2>>"$LOG_FILE" || true)
+    for line in "${out[@]}"; do
+      rest="${line##* - \[ }"
+      dir="${line%% - \[ *}"
+      [[ -n "$dir" && "$rest" == *" ] "* ]] && reported["$dir"]="${rest%% ]*} ${rest#* ] }"
+    done
+    for dir in "${SCAN_DIRS[@]}"; do
+      SCAN_RESULTS+=("${reported[$dir]:-}")
+      # The helper may have moved the root's delta mark without reporting
+      # it, so its next commit must stage everything.
+      [[ -n "${reported[$dir]:-}" ]] || { unset 'STAGE_CLEAN[$dir]'; STAGE_LOST["$dir"]=1; }
+    done
+    [[ "${#out[@]}" -eq "${#SCAN_DIRS[@]}" ]] ||
+      log_warn "Scan helper reported ${#out[@]} of ${#SCAN_DIRS[@]} roots; the rest keep their stored values"
+    return 0
+  fi
+
+  rm -f "$STAGE_DELTA_DIR"/[0-9]* 2>/dev/null || true
+  local result_dir i
+  result_dir="$(mktemp -d "$(dirname "$CLONE_FILE")/scan.XXXXXX")"
+  load_ignore_prune_args
+  scan_dirs_parallel "$result_dir"
+  for i in "${!SCAN_DIRS[@]}"; do
+    if [[ -s "$result_dir/$i" ]]; then
+      SCAN_RESULTS+=("$(< "$result_dir/$i") $(< "$result_dir/$i.us")")
+    else
+      SCAN_RESULTS+=("")
+    fi
+  done
+  rm -rf "$result_dir"
+}
+
+# find fallback: hash every directory in SCAN_DIRS on up to SCAN_WORKERS
+# background jobs.  Each job writes its result to <result_dir>/<index> and
+# its wall time in microseconds to <result_dir>/<index>.us.
+scan_dirs_parallel() {
+  local result_dir="$1"
+  local i running=0 start
+  for i in "${!SCAN_DIRS[@]}"; do
+    if [[ "$running" -ge "$SCAN_WORKERS" ]]; then
+      wait -n 2>/dev/null || true
+      running=$((running - 1))
+    fi
+    (
+      now_us; start="$NOW_US"
+      calc_int_for_dir "${SCAN_DIRS[$i]}" > "$result_dir/$i" || rm -f "$result_dir/$i"
+      now_us; printf '%s\n' $(( NOW_US - start )) > "$result_dir/$i.us"
+    ) &
+    running=$((running + 1))
+  done
+  wait || true
+}
+
+# record_scan_metrics <dir> <digits> "[<files> <dirs> <dirs read>] <us>"
+# Only the wall time is present when the find fallback produced the value.
+record_scan_metrics() {
+  local dir="$1" digits="$2" secs files dirs read_dirs us
+  IFS=' ' read -r files dirs read_dirs us <<< "$3"
+  [[ -z "$us" ]] && { us="$files"; files=""; read_dirs=""; }
+  if [[ "$us" =~ ^[0-9]+$ ]]; then
+    us_to_seconds secs "$us"
+    metric h autogit_scan_duration_seconds "$secs" "root=$dir"
+  fi
+  if [[ -n "$read_dirs" ]]; then
+    metric g autogit_scan_files "$files" "root=$dir"
+    metric g autogit_scan_dirs "$dirs" "root=$dir"
+    metric g autogit_scan_dirs_read "$read_dirs" "root=$dir"
+  fi
+  metric i autogit_root_fingerprint "$digits" "root=$dir"
+}
+
+# ----- Scheduling -------------------------------------------------------------
+declare -A SCHED_TAG_EVERY=() SCHED_TAG_PRIO=() SCHED_LAST_SCAN=() SCHED_LAST_CHANGE=()
+SCHED_STATE_LOADED=0
+ENTRY_LABELS=(); ENTRY_DIRS=(); ENTRY_OLD=(); DUE_ORDER=()
+
+# Re-read SCHEDULE_FILE (a few lines; no fork) so edits apply next cycle.
+load_schedule_rules() {
+  SCHED_TAG_EVERY=(); SCHED_TAG_PRIO=()
+  [[ -f "$SCHEDULE_FILE" ]] || return 0
+  local tag every prio rest
+  while IFS=$' \t' read -r tag every prio rest || [[ -n "$tag" ]]; do
+    [[ -z "$tag" || "$tag" == \#* || ! "$every" =~ ^[0-9]+$ ]] && continue
+    SCHED_TAG_EVERY["$tag"]="$every"
+    [[ "$prio" =~ ^-?[0-9]+$ ]] && SCHED_TAG_PRIO["$tag"]="$prio"
+  done < "$SCHEDULE_FILE"
+  return 0
+}
+
+# Last change time per directory, so adaptive backoff survives restarts.
+load_schedule_state() {
+  [[ "$SCHED_STATE_LOADED" -eq 1 ]] && return 0
+  SCHED_STATE_LOADED=1
+  [[ -f "$SCHEDULE_STATE_FILE" ]] || return 0
+  local dir changed
+  while IFS=$'\t' read -r dir changed; do
+    [[ -n "$dir" && "$changed" =~ ^[0-9]+$ ]] && SCHED_LAST_CHANGE["$dir"]="$changed"
+  done < "$SCHEDULE_STATE_FILE"
+  return 0
+}
+
+save_schedule_state() {
+  local dir out=""
+  for dir in "${ENTRY_DIRS[@]}"; do
+    out+="${dir}"$'\t'"${SCHED_LAST_CHANGE[$dir]:-0}"$'\n'
+  done
+  printf '%s' "$out" > "$SCHEDULE_STATE_FILE.tmp"
+  mv "$SCHEDULE_STATE_FILE.tmp" "$SCHEDULE_STATE_FILE"
+}
+
+# Set POL_EVERY / POL_PRIO / POL_SETTLE for a watch label. Tag rules apply
+# in order (the last matching tag wins); inline every=/priority= options
+# override them, and settle= overrides SETTLE_WINDOW.
+entry_policy() {
+  local rest part inline_every="" inline_prio=""
+  POL_EVERY="${SCHED_TAG_EVERY[default]:-0}"
+  POL_PRIO="${SCHED_TAG_PRIO[default]:-0}"
+  POL_SETTLE="$SETTLE_WINDOW"
+  [[ "$1" == *::* ]] || return 0
+  rest="${1#*::}"
+  while [[ -n "$rest" ]]; do
+    part="${rest%%::*}"
+    if [[ "$rest" == *::* ]]; then rest="${rest#*::}"; else rest=""; fi
+    case "$part" in
+      every=*)    [[ "${part#every=}" =~ ^[0-9]+$ ]] && inline_every="${part#every=}" ;;
+      priority=*) [[ "${part#priority=}" =~ ^-?[0-9]+$ ]] && inline_prio="${part#priority=}" ;;
+      settle=*)   [[ "${part#settle=}" =~ ^[0-9]+$ ]] && POL_SETTLE="${part#settle=}" ;;
+      large=*|large_action=*|large_ext=*|compact=*|compact_force) ;;
+      *)
+        [[ -n "${SCHED_TAG_EVERY[$part]:-}" ]] && POL_EVERY="${SCHED_TAG_EVERY[$part]}"
+        [[ -n "${SCHED_TAG_PRIO[$part]:-}" ]] && POL_PRIO="${SCHED_TAG_PRIO[$part]}"
+        ;;
+    esac
+  done
+  [[ -n "$inline_every" ]] && POL_EVERY="$inline_every"
+  [[ -n "$inline_prio" ]] && POL_PRIO="$inline_prio"
+  return 0
+}
+
+# Fill DUE_ORDER with the ENTRY_* indices to scan this cycle. Without tag
+# rules, inline options or adaptive mode every entry is due every cycle, in
+# watch-list order, exactly as before.
+schedule_due_entries() {
+  local now i dir last due_at over stretch mixed=0 first_prio="" line
+  local -a keyed=()
+  printf -v now '%(%s)T' -1
+  load_schedule_rules
+  load_schedule_state
+  DUE_ORDER=()
+  for i in "${!ENTRY_DIRS[@]}"; do
+    dir="${ENTRY_DIRS[$i]}"
+    entry_policy "${ENTRY_LABELS[$i]}"
+    [[ -n "${SCHED_LAST_CHANGE[$dir]:-}" ]] || SCHED_LAST_CHANGE["$dir"]="$now"
+    if [[ "$SCHEDULE_ADAPTIVE" == "1" ]]; then
+      last="${SCHED_LAST_CHANGE[$dir]}"
+      stretch=$(( (now - last) / SCHEDULE_IDLE_FACTOR ))
+      [[ "$stretch" -gt "$SCHEDULE_MAX_INTERVAL" ]] && stretch="$SCHEDULE_MAX_INTERVAL"
+      [[ "$stretch" -gt "$POL_EVERY" ]] && POL_EVERY="$stretch"
+    fi
+    # A settling root is rechecked at least once per settle window.
+    if [[ -n "${SETTLE_FIRST[$dir]:-}" && "$POL_EVERY" -gt "$POL_SETTLE" ]]; then
+      POL_EVERY="$POL_SETTLE"
+    fi
+    last="${SCHED_LAST_SCAN[$dir]:-}"
+    if [[ -n "$last" ]]; then
+      due_at=$(( last + POL_EVERY ))
+      [[ "$now" -ge "$due_at" ]] || continue
+      over=$(( now - due_at ))
+    else
+      over="$now"   # never scanned by this process: most overdue
+    fi
+    [[ -z "$first_prio" ]] && first_prio="$POL_PRIO"
+    [[ "$POL_PRIO" != "$first_prio" ]] && mixed=1
+    keyed+=("${POL_PRIO}"$'\t'"${over}"$'\t'"${i}")
+  done
+  [[ "${#keyed[@]}" -gt 0 ]] || return 0
+
+  if [[ "$mixed" -eq 1 ]] ||
+     [[ "$SCHEDULE_MAX_PER_CYCLE" -gt 0 && "${#keyed[@]}" -gt "$SCHEDULE_MAX_PER_CYCLE" ]]; then
+    mapfile -t keyed < <(printf '%s\n' "${keyed[@]}" | sort -t $'\t' -k1,1nr -k2,2nr -k3,3n)
+  fi
+  for line in "${keyed[@]}"; do
+    [[ "$SCHEDULE_MAX_PER_CYCLE" -gt 0 && "${#DUE_ORDER[@]}" -ge "$SCHEDULE_MAX_PER_CYCLE" ]] && break
+    i="${line##*$'\t'}"
+    DUE_ORDER+=("$i")
+    SCHED_LAST_SCAN["${ENTRY_DIRS[$i]}"]="$now"
+  done
+}
+
+# ----- Quiescence -------------------------------------------------------------
+declare -A SETTLE_INT=() SETTLE_SINCE=() SETTLE_FIRST=() SETTLE_DELTA=()
+SETTLE_SEQ=0
+SETTLE_READY_DELTA=""
+SETTLE_ACTIVE=0   # run-loop only: run-once has no later cycle to settle in
+
+# settle_ready <dir> <new int> <delta file>: succeed when a changed root
+# should be committed now (POL_SETTLE must be set by entry_policy). While a
+# root settles, each scan's delta is appended to STAGE_DELTA_DIR/settle.<n>
+# so targeted staging still covers every change since the last commit; an
+# unknown delta on the way makes it stage everything. SETTLE_READY_DELTA
+# names the delta to commit with.
+settle_ready() {
+  local dir="$1" new_int="$2" delta="$3" now="$CYCLE_STARTED" acc since first secs
+  SETTLE_READY_DELTA="$delta"
+  if [[ -z "${SETTLE_FIRST[$dir]:-}" ]]; then
+    [[ "$SETTLE_ACTIVE" == "1" && "$POL_SETTLE" -gt 0 ]] || return 0
+    SETTLE_SEQ=$(( SETTLE_SEQ + 1 ))
+    acc="$STAGE_DELTA_DIR/settle.$SETTLE_SEQ"
+    if [[ -s "$delta" ]]; then cp "$delta" "$acc" 2>/dev/null || acc=""; else acc=""; fi
+    SETTLE_FIRST["$dir"]="$now"; SETTLE_SINCE["$dir"]="$now"
+    SETTLE_INT["$dir"]="$new_int"; SETTLE_DELTA["$dir"]="$acc"
+    return 1
+  fi
+  if [[ "$new_int" != "${SETTLE_INT[$dir]}" ]]; then
+    SETTLE_INT["$dir"]="$new_int"; SETTLE_SINCE["$dir"]="$now"
+    acc="${SETTLE_DELTA[$dir]}"
+    if [[ -n "$acc" && -s "$delta" ]]; then
+      cat "$delta" >> "$acc"
+    elif [[ -n "$acc" ]]; then
+      rm -f "$acc"; SETTLE_DELTA["$dir"]=""
+    fi
+  fi
+  since="${SETTLE_SINCE[$dir]}"; first="${SETTLE_FIRST[$dir]}"
+  if (( now - since >= POL_SETTLE || now - first >= SETTLE_MAX_DELAY )); then
+    SETTLE_READY_DELTA="${SETTLE_DELTA[$dir]}"
+    us_to_seconds secs $(( (now - first) * 1000000 ))
+    metric h autogit_settle_delay_seconds "$secs"
+    return 0
+  fi
+  return 1
+}
+
+settle_clear() {
+  local dir="$1"
+  [[ -n "${SETTLE_DELTA[$dir]:-}" ]] && rm -f "${SETTLE_DELTA[$dir]}"
+  unset 'SETTLE_INT[$dir]' 'SETTLE_SINCE[$dir]' 'SETTLE_FIRST[$dir]' 'SETTLE_DELTA[$dir]'
+  return 0
+}
+
+# ----- Sharding ---------------------------------------------------------------
+SHARD_COUNT=1
+SHARD_LOCK_FD=""
+SHARD_OWNED_LIST=""
+SHARD_STATUS=""
+declare -A SHARD_HASH=() SHARD_OF=() SHARD_OWNED=()
+
+# shard_path <var> <path> <k>: <path> with ".<k>" before its extension.
+shard_path() {
+  local path="$2" base="${2##*/}"
+  if [[ "$base" == *.* ]]; then
+    path="${path%.*}.$3.${path##*.}"
+  else
+    path="$path.$3"
+  fi
+  printf -v "$1" '%s' "$path"
+}
+
+# Set SHARD_BUCKET to the shard of a directory: a 64-bit FNV-1a hash of its
+# path (computed once per process) fed to Lamping & Veach's jump consistent
+# hash over SHARD_COUNT buckets.
+shard_bucket() {
+  local dir="$1" key b=-1 j=0
+  if [[ -n "${SHARD_OF[$dir]:-}" ]]; then SHARD_BUCKET="${SHARD_OF[$dir]}"; return 0; fi
+  key="${SHARD_HASH[$dir]:-}"
+  if [[ -z "$key" ]]; then
+    local LC_ALL=C i c
+    key=-3750763034362895579
+    for (( i = 0; i < ${#dir}; i++ )); do
+      printf -v c '%d' "'${dir:i:1}"
+      (( key = (key ^ (c & 255)) * 1099511628211 ))
+    done
+    SHARD_HASH["$dir"]="$key"
+  fi
+  while (( j < SHARD_COUNT )); do
+    b="$j"
+    (( key = key * 2862933555777941757 + 1 ))
+    (( j = ((b + 1) << 31) / (((key >> 33) & 0x7FFFFFFF) + 1) ))
+  done
+  SHARD_OF["$dir"]="$b"
+  SHARD_BUCKET="$b"
+}
+
+# True when this instance handles <dir> this cycle (always when unsharded).
+shard_owns() {
+  [[ -n "$SHARD_INDEX" ]] || return 0
+  shard_bucket "$1"
+  [[ -n "${SHARD_OWNED[$SHARD_BUCKET]:-}" ]]
+}
+
+# Try to take slot <k>'s lock without waiting; on success SHARD_TRY_FD holds
+# it, otherwise the slot has a live owner (or another instance is probing it).
+shard_try_lock() {
+  local fd
+  exec {fd}>>"$SHARD_DIR/$1.lock"
+  if flock -n "$fd"; then SHARD_TRY_FD="$fd"; return 0; fi
+  exec {fd}>&-
+  return 1
+}
+
+# Called by run-loop before anything touches per-instance files: claim a
+# slot (SHARD_INDEX, or the first free one) and suffix the per-instance paths.
+shard_init() {
+  [[ "$SHARDS" -gt 1 || -n "$SHARD_INDEX" ]] || return 0
+  mkdir -p "$SHARD_DIR"
+  [[ -f "$SHARD_DIR/count" ]] || printf '%s\n' "$SHARDS" > "$SHARD_DIR/count"
+  shard_read_count
+  local k tries=0
+  while [[ -z "$SHARD_INDEX" ]]; do
+    for (( k = 0; k < SHARD_COUNT; k++ )); do
+      shard_try_lock "$k" && { SHARD_INDEX="$k"; SHARD_LOCK_FD="$SHARD_TRY_FD"; break; }
+    done
+    [[ -n "$SHARD_INDEX" ]] && break
+    tries=$(( tries + 1 ))
+    (( tries < 60 )) || { printf 'No free AutoGit shard slot in %s\n' "$SHARD_DIR" >&2; exit 1; }
+    sleep 1
+  done
+  shard_path PID_FILE "$PID_FILE" "$SHARD_INDEX"
+  shard_path LOG_FILE "$LOG_FILE" "$SHARD_INDEX"
+  shard_path CLONE_FILE "$CLONE_FILE" "$SHARD_INDEX"
+  shard_path SCHEDULE_STATE_FILE "$SCHEDULE_STATE_FILE" "$SHARD_INDEX"
+  STAGE_DELTA_DIR="$STAGE_DELTA_DIR/$SHARD_INDEX"
+  METRICS_NAME="autogit.$SHARD_INDEX"
+  SHARD_OWNED=(["$SHARD_INDEX"]=1)
+  SHARD_OWNED_LIST="$SHARD_INDEX"
+  return 0
+}
+
+# Take this instance's own slot lock, waiting out a probing instance.
+shard_lock_own() {
+  [[ -n "$SHARD_INDEX" && -z "$SHARD_LOCK_FD" ]] || return 0
+  exec {SHARD_LOCK_FD}>>"$SHARD_DIR/$SHARD_INDEX.lock"
+  flock -w $(( INTERVAL * 2 + 60 )) "$SHARD_LOCK_FD" || {
+    log_warn "Shard $SHARD_INDEX is locked by another instance; exiting"
+    exit 0
+  }
+}
+
+shard_read_count() {
+  local n=""
+  [[ -f "$SHARD_DIR/count" ]] && read -r n < "$SHARD_DIR/count" || true
+  [[ "$n" =~ ^[0-9]+$ && "$n" -gt 0 ]] || n="$SHARDS"
+  if [[ "$n" != "$SHARD_COUNT" ]]; then
+    SHARD_COUNT="$n"
+    SHARD_OF=()
+    return 0
+  fi
+  return 0
+}
+
+# Start of each cycle: follow count changes, then adopt dead shards whose
+# next live slot (in ring order) is this one. A slot is dead when its lock can
+# be taken; the probe lets go at once (children must not inherit it), so a
+# restarted owner takes its shard back from the next cycle on. Live slots
+# always look live, so at most one instance adopts a dead shard; a probe
+# racing another instance's probe can only make a shard skip one cycle.
+shard_refresh() {
+  [[ -n "$SHARD_INDEX" ]] || return 0
+  local old_count="$SHARD_COUNT" k j list="$SHARD_INDEX"
+  shard_read_count
+  [[ "$SHARD_COUNT" == "$old_count" ]] || log "Shard count changed to $SHARD_COUNT; rebalancing"
+  if (( SHARD_INDEX >= SHARD_COUNT )); then
+    log "Shard $SHARD_INDEX retired (shard count is now $SHARD_COUNT)"
+    exit 0
+  fi
+  local -A dead=()
+  for (( k = 0; k < SHARD_COUNT; k++ )); do
+    [[ "$k" -eq "$SHARD_INDEX" ]] && continue
+    shard_try_lock "$k" || continue
+    dead[$k]=1
+    exec {SHARD_TRY_FD}>&-
+  done
+  SHARD_OWNED=(["$SHARD_INDEX"]=1)
+  for k in "${!dead[@]}"; do
+    j="$k"
+    while true; do
+      j=$(( (j + 1) % SHARD_COUNT ))
+      [[ -z "${dead[$j]:-}" ]] && break
+    done
+    [[ "$j" -eq "$SHARD_INDEX" ]] && SHARD_OWNED[$k]=1
+  done
+  for (( k = 0; k < SHARD_COUNT; k++ )); do
+    [[ "$k" -ne "$SHARD_INDEX" && -n "${SHARD_OWNED[$k]:-}" ]] && list+=" $k"
+  done
+  if [[ "$list" != "$SHARD_OWNED_LIST" ]]; then
+    log "Shard $SHARD_INDEX now covering shard(s) ${list// /, }"
+    SHARD_OWNED_LIST="$list"
+  fi
+  return 0
+}
+
+# SHARD_DIR/<k>.status ("<covered shards>\t<roots>") for `status`; only
+# rewritten when it changes so idle cycles stay write-free.
+shard_write_status() {
+  [[ -n "$SHARD_INDEX" ]] || return 0
+  local line="$SHARD_OWNED_LIST"$'\t'"$1"
+  [[ "$line" != "$SHARD_STATUS" ]] || return 0
+  printf '%s\n' "$line" > "$SHARD_DIR/$SHARD_INDEX.status.tmp"
+  mv "$SHARD_DIR/$SHARD_INDEX.status.tmp" "$SHARD_DIR/$SHARD_INDEX.status"
+  SHARD_STATUS="$line"
+}
+
+# True when any shard instance is alive.
+shards_running() {
+  local pat f pid
+  shard_path pat "$PID_FILE" '[0-9]*'
+  for f in $pat; do
+    [[ -f "$f" ]] || continue
+    pid="$(cat "$f" 2>/dev/null || true)"
+    [[ "$pid" =~ ^[0-9]+$ ]] && kill -0 "$pid" 2>/dev/null && return 0
+  done
+  return 1
 }
 
 # ----- One cycle --------------------------------------------------------------
 single_cycle() {
   ensure_runtime_paths
+  local cycle_start
+  now_us; cycle_start="$NOW_US"; CYCLE_STARTED=$(( NOW_US / 1000000 ))
+
+  reap_git_jobs
+  reach_poll
+  shard_refresh
 
   local lines=()
   [[ -f "$WATCH_FILE" ]] && mapfile -t lines < "$WATCH_FILE" || true
 
-  local tmp_clone; tmp_clone="$(mktemp "$(dirname "$CLONE_FILE")/clone.XXXXXX")"
-  CURRENT_CLONE_TMP="$tmp_clone"
+  CLONE_CONTENT=""
 
-  local processed=0
-  local line label dir trimmed old_int new_int
+  local processed=0 changed=0 settling=0
+  local line label dir trimmed old_int new_int i pos result stats secs now
+  ENTRY_LABELS=(); ENTRY_DIRS=(); ENTRY_OLD=()
+  SCAN_DIRS=()
 
   for line in "${lines[@]}"; do
     trimmed="$line"
@@ -328,64 +2045,196 @@ single_cycle() {
       label="$trimmed"
     fi
 
-    [[ -z "$label" ]] && { log "Skipping malformed line: $trimmed"; continue; }
+    [[ -z "$label" ]] && { log_idle INFO "Skipping malformed line: $trimmed"; continue; }
     dir="${label%%::*}"
-    [[ -d "$dir" ]] || { log "Directory not found: $dir"; continue; }
+    shard_owns "$dir" || continue
+    [[ -d "$dir" ]] || { log_idle INFO "Directory not found: $dir"; continue; }
+
+    old_int="0000000000000000"
+    [[ "$trimmed" =~ \[[[:space:]]*([0-9]{1,16})[[:space:]]*\] ]] && old_int="${BASH_REMATCH[1]}"
 
-    old_int="$(printf '%s\n' "$trimmed" | grep -oE '\[[[:space:]]*[0-9]{1,16}[[:space:]]*\]' | tr -dc '0-9' || true)"
-    [[ -z "$old_int" ]] && old_int="0000000000000000"
+    ENTRY_LABELS+=("$label"); ENTRY_OLD+=("$old_int"); ENTRY_DIRS+=("$dir")
+  done
 
-    if ! new_int="$(calc_int_for_dir "$dir")"; then
-      log "Failed to hash metadata for $dir"; continue
+  # Scan only due entries, in priority order; scan_pos maps entry -> result.
+  local -A scan_pos=()
+  schedule_due_entries
+  for i in "${DUE_ORDER[@]}"; do
+    scan_pos[$i]="${#SCAN_DIRS[@]}"
+    SCAN_DIRS+=("${ENTRY_DIRS[$i]}")
+  done
+
+  scan_dirs
+
+  # Merge in watch-list order so the clone file and commit order stay stable.
+  # Entries that were not due keep their stored value.
+  printf -v now '%(%s)T' -1
+  for i in "${!ENTRY_DIRS[@]}"; do
+    label="${ENTRY_LABELS[$i]}"; dir="${ENTRY_DIRS[$i]}"; old_int="${ENTRY_OLD[$i]}"
+    if [[ -z "${scan_pos[$i]:-}" ]]; then
+      update_clone_line "$label" "$old_int"
+      continue
     fi
+    pos="${scan_pos[$i]}"
+    result="${SCAN_RESULTS[$pos]:-}"
+    new_int="${result%% *}"
+    if [[ ! "$new_int" =~ ^[0-9]{16}$ ]]; then
+      log_warn "Failed to hash metadata for $dir"
+      update_clone_line "$label" "$old_int"
+      continue
+    fi
+    record_scan_metrics "$dir" "$new_int" "${result#"$new_int" }"
 
     update_clone_line "$label" "$new_int"
     processed=$((processed + 1))
 
     if [[ "$new_int" != "$old_int" ]]; then
-      update_main_and_commit "$label" "$new_int" "$old_int" "$dir"
+      SCHED_LAST_CHANGE["$dir"]="$now"
+      entry_policy "$label"
+      if ! settle_ready "$dir" "$new_int" "$STAGE_DELTA_DIR/$pos"; then
+        settling=$((settling + 1))
+        continue
+      fi
+      changed=$((changed + 1))
+      metric c autogit_root_changes_total 1 "root=$dir"
+      update_main_and_commit "$label" "$new_int" "$old_int" "$dir" "$SETTLE_READY_DELTA"
+      settle_clear "$dir"
+    elif [[ -n "${SETTLE_FIRST[$dir]:-}" ]]; then
+      settle_clear "$dir"   # reverted to the committed state while settling
     fi
   done
-
-  mv "$tmp_clone" "$CLONE_FILE"
-  CURRENT_CLONE_TMP=""
-
-  log "Cycle complete (processed $processed directories)"
-  if [[ "$processed" -eq 0 ]]; then
-    log "No directories to process. Add entries to $WATCH_FILE"
+  flush_due_pushes
+  compact_due_repos
+  if [[ "$changed" -eq 0 && "$settling" -eq 0 ]]; then
+    maintain_due_repos
   fi
+  dispatch_git_jobs
+
+  apply_main_updates
+  write_clone_if_changed
+  [[ "$changed" -gt 0 ]] && save_schedule_state
+  shard_write_status "${#ENTRY_DIRS[@]}"
+
+  now_us; us_to_seconds secs $(( NOW_US - cycle_start ))
+  metric h autogit_cycle_duration_seconds "$secs"
+  metric c autogit_cycles_total 1
+  metric g autogit_watched_roots "${#ENTRY_DIRS[@]}"
+  metric g autogit_cycle_scanned_roots "$processed"
+  metric g autogit_cycle_changed_roots "$changed"
+  metric g autogit_cycle_settling_roots "$settling"
+  metrics_flush
+
+  if [[ "$processed" -lt "${#ENTRY_DIRS[@]}" ]]; then
+    log_idle INFO "Cycle complete (processed $processed directories, $(( ${#ENTRY_DIRS[@]} - processed )) not due)"
+  else
+    log_idle INFO "Cycle complete (processed $processed directories)"
+  fi
+  if [[ "${#ENTRY_DIRS[@]}" -eq 0 ]]; then
+    log_idle INFO "No directories to process. Add entries to $WATCH_FILE"
+  fi
+  log_tick
 }
 
 # ----- Loop / Service ---------------------------------------------------------
 run_loop() {
+  shard_init
   ensure_runtime_paths
   if is_process_running; then exit 0; fi
   write_pid
+  shard_lock_own
   log "Startup (PID $$, interval ${INTERVAL}s, branch $BRANCH, user $GIT_USER)"
+  [[ -z "$SHARD_INDEX" ]] || log "Running as shard $SHARD_INDEX of $SHARD_COUNT"
   trap 'cleanup_and_exit' EXIT INT TERM
+  git_jobs_init
+  reset_push_backoff
+  [[ "$RESET_COUNT" -eq 0 ]] || log "Resuming $RESET_COUNT unpushed repo(s) from the push queue"
+  SETTLE_ACTIVE=1
+  mkdir -p "$STAGE_DELTA_DIR"
+  rm -f "$STAGE_DELTA_DIR"/settle.* 2>/dev/null || true
 
   while true; do
-    single_cycle || log "Cycle encountered errors"
+    single_cycle || log_warn "Cycle encountered errors"
     sleep "$INTERVAL"
   done
 }
 
-start_service() {
-  ensure_runtime_paths; validate_interval
-  if is_process_running; then
-    printf 'AutoGit already running (PID %s)\n' "$(cat "$PID_FILE")"; return 0; fi
-
-  nohup env INTERVAL="$INTERVAL" BRANCH="$BRANCH" WATCH_FILE="$WATCH_FILE" \
+# Launch a detached run-loop with the current settings.
+spawn_run_loop() {
+  nohup env INTERVAL="$INTERVAL" BRANCH="$BRANCH" WATCH_FILE="$WATCH_FILE" WATCH_LOCK_FILE="$WATCH_LOCK_FILE" \
     CLONE_FILE="$CLONE_FILE" LOG_FILE="$LOG_FILE" PID_FILE="$PID_FILE" \
     IGNORE_FILE="$IGNORE_FILE" REMOTE_NAME="$REMOTE_NAME" \
     PRESERVE_EXISTING_REMOTE="$PRESERVE_EXISTING_REMOTE" \
     REPO_VISIBILITY="$REPO_VISIBILITY" GIT_USER="$GIT_USER" TOKEN_FILE="$TOKEN_FILE" \
-    API_URL="$API_URL" "$0" run-loop >/dev/null 2>&1 &
+    API_URL="$API_URL" SCAN_HELPER="$SCAN_HELPER" INDEX_DIR="$INDEX_DIR" \
+    SCAN_TRUST_DIR_MTIME="$SCAN_TRUST_DIR_MTIME" SCAN_WORKERS="$SCAN_WORKERS" GIT_FSMONITOR="$GIT_FSMONITOR" \
+    STAGE_DELTA_DIR="$STAGE_DELTA_DIR" STAGE_DELTA_MAX="$STAGE_DELTA_MAX" \
+    PUSH_STATE_DIR="$PUSH_STATE_DIR" PUSH_MIN_INTERVAL="$PUSH_MIN_INTERVAL" \
+    PUSH_BACKOFF_BASE="$PUSH_BACKOFF_BASE" PUSH_BACKOFF_MAX="$PUSH_BACKOFF_MAX" \
+    REPO_CACHE_FILE="$REPO_CACHE_FILE" REPO_CACHE_TTL="$REPO_CACHE_TTL" METRICS="$METRICS" \
+    API_TIMEOUT="$API_TIMEOUT" GIT_WORKERS="$GIT_WORKERS" GIT_JOB_DIR="$GIT_JOB_DIR" \
+    GIT_NETWORK_TIMEOUT="$GIT_NETWORK_TIMEOUT" GIT_JOB_TIMEOUT="$GIT_JOB_TIMEOUT" \
+    REACH_PROBE="$REACH_PROBE" REACH_TIMEOUT="$REACH_TIMEOUT" \
+    REACH_PROBE_INTERVAL="$REACH_PROBE_INTERVAL" PUSH_FLUSH_MAX="$PUSH_FLUSH_MAX" \
+    METRICS_HELPER="$METRICS_HELPER" METRICS_DIR="$METRICS_DIR" \
+    METRICS_FLUSH_INTERVAL="$METRICS_FLUSH_INTERVAL" SCHEDULE_FILE="$SCHEDULE_FILE" \
+    SCHEDULE_STATE_FILE="$SCHEDULE_STATE_FILE" SCHEDULE_ADAPTIVE="$SCHEDULE_ADAPTIVE" \
+    SCHEDULE_IDLE_FACTOR="$SCHEDULE_IDLE_FACTOR" SCHEDULE_MAX_INTERVAL="$SCHEDULE_MAX_INTERVAL" \
+    SCHEDULE_MAX_PER_CYCLE="$SCHEDULE_MAX_PER_CYCLE" AUTOGIT_LOG_LIB="$AUTOGIT_LOG_LIB" \
+    SETTLE_WINDOW="$SETTLE_WINDOW" SETTLE_MAX_DELAY="$SETTLE_MAX_DELAY" COMPACT_HELPER="$COMPACT_HELPER" \
+    COMPACT_AFTER="$COMPACT_AFTER" COMPACT_EVERY="$COMPACT_EVERY" MAINTENANCE="$MAINTENANCE" \
+    MAINTENANCE_EVERY="$MAINTENANCE_EVERY" MAINTENANCE_QUIET="$MAINTENANCE_QUIET" \
+    MAINTENANCE_TIMEOUT="$MAINTENANCE_TIMEOUT" MAINTENANCE_THREADS="$MAINTENANCE_THREADS" \
+    MAINTENANCE_NICE="$MAINTENANCE_NICE" \
+    LARGE_FILE_MAX="$LARGE_FILE_MAX" LARGE_FILE_EXTENSIONS="$LARGE_FILE_EXTENSIONS" \
+    LARGE_FILE_ACTION="$LARGE_FILE_ACTION" LARGE_FILE_STORE="$LARGE_FILE_STORE" \
+    LOG_FORMAT="$LOG_FORMAT" LOG_FLUSH_INTERVAL="$LOG_FLUSH_INTERVAL" \
+    LOG_SUMMARY_INTERVAL="$LOG_SUMMARY_INTERVAL" LOG_MAX_BYTES="$LOG_MAX_BYTES" LOG_KEEP="$LOG_KEEP" \
+    LOG_MAX_AGE_DAYS="$LOG_MAX_AGE_DAYS" SHARDS="$SHARDS" SHARD_DIR="$SHARD_DIR" \
+    SHARD_INDEX="$SHARD_INDEX" "$0" run-loop >/dev/null 2>&1 &
+}
+
+start_service() {
+  ensure_runtime_paths; validate_interval
+  if [[ "$SHARDS" -gt 1 ]]; then start_shards; return; fi
+  if shards_running; then
+    printf 'AutoGit is running sharded; stop it before starting a single instance\n'; return 1; fi
+  if is_process_running; then
+    printf 'AutoGit already running (PID %s)\n' "$(cat "$PID_FILE")"; return 0; fi
 
+  spawn_run_loop
   printf 'AutoGit started (PID %s)\n' "$!"
 }
 
+# Publish the shard count (running instances rebalance on their next cycle)
+# and launch the instances that are not running.
+start_shards() {
+  if is_process_running; then
+    printf 'AutoGit is running unsharded (PID %s); stop it first\n' "$(cat "$PID_FILE")"; return 1; fi
+  mkdir -p "$SHARD_DIR"
+  printf '%s\n' "$SHARDS" > "$SHARD_DIR/count.tmp"
+  mv "$SHARD_DIR/count.tmp" "$SHARD_DIR/count"
+  local k pid_file
+  for (( k = 0; k < SHARDS; k++ )); do
+    shard_path pid_file "$PID_FILE" "$k"
+    if PID_FILE="$pid_file" is_process_running; then
+      printf 'AutoGit shard %s already running (PID %s)\n' "$k" "$(cat "$pid_file")"; continue; fi
+    SHARD_INDEX="$k" spawn_run_loop
+    printf 'AutoGit shard %s/%s started (PID %s)\n' "$k" "$SHARDS" "$!"
+  done
+}
+
 stop_service() {
+  local pat f found=0
+  shard_path pat "$PID_FILE" '[0-9]*'
+  for f in $pat; do
+    [[ -f "$f" ]] || continue
+    found=1; PID_FILE="$f" stop_instance
+  done
+  rm -f "$SHARD_DIR/count"
+  [[ "$found" -eq 1 && ! -f "$PID_FILE" ]] || stop_instance
+}
+
+stop_instance() {
   if [[ ! -f "$PID_FILE" ]]; then printf 'AutoGit not running\n'; return 0; fi
   local pid; pid="$(cat "$PID_FILE" 2>/dev/null || true)"
   if [[ -z "$pid" ]] || ! kill -0 "$pid" 2>/dev/null; then
@@ -395,14 +2244,60 @@ stop_service() {
 }
 
 status_service() {
-  if is_process_running; then
+  if [[ -f "$SHARD_DIR/count" ]]; then
+    shard_status
+  elif is_process_running; then
     printf 'AutoGit running (PID %s)\n' "$(cat "$PID_FILE")"
   else
     printf 'AutoGit not running\n'
   fi
+  local f count=0
+  [[ -d "$PUSH_STATE_DIR" ]] || return 0
+  for f in "$PUSH_STATE_DIR"/*.state; do
+    [[ -f "$f" ]] || continue
+    state_file_dir "$f"
+    load_push_state "$STATE_DIR"
+    [[ "$PS_PENDING" == "1" ]] || continue
+    count=$(( count + 1 ))
+    printf '  unpushed: %s (since %(%Y-%m-%d %H:%M:%S)T, %s failed attempt(s))\n' \
+      "$STATE_DIR" "${PS_CHANGED:-0}" "$PS_FAILS"
+  done
+  printf 'Unpushed repos: %s\n' "$count"
+}
+
+# One line per shard: its instance, the shards it covers and its root count.
+shard_status() {
+  local n k j pid_file covered roots running=0 total=0 out="" parts=()
+  read -r n < "$SHARD_DIR/count" || n=0
+  [[ "$n" =~ ^[0-9]+$ ]] || n=0
+  local -A cover=()
+  for (( k = 0; k < n; k++ )); do
+    shard_path pid_file "$PID_FILE" "$k"
+    PID_FILE="$pid_file" is_process_running || continue
+    covered="$k"; roots="?"
+    [[ -f "$SHARD_DIR/$k.status" ]] && IFS=$'\t' read -r covered roots < "$SHARD_DIR/$k.status"
+    IFS=' ' read -ra parts <<< "$covered"
+    for j in "${parts[@]}"; do cover[$j]="$k"; done
+    running=$(( running + 1 ))
+    [[ "$roots" =~ ^[0-9]+$ ]] && total=$(( total + roots ))
+    out+="  shard $k: running (PID $(cat "$pid_file"), $roots root(s), covering ${covered// /, })"$'\n'
+  done
+  for (( k = 0; k < n; k++ )); do
+    shard_path pid_file "$PID_FILE" "$k"
+    PID_FILE="$pid_file" is_process_running && continue
+    if [[ -n "${cover[$k]:-}" ]]; then
+      out+="  shard $k: not running (covered by shard ${cover[$k]})"$'\n'
+    else
+      out+="  shard $k: not running"$'\n'
+    fi
+  done
+  printf 'AutoGit sharded: %s/%s instance(s) running, %s root(s)\n%s' "$running" "$n" "$total" "$out"
 }
 
-run_once() { ensure_runtime_paths; validate_interval; single_cycle; }
+run_once() {
+  ensure_runtime_paths; validate_interval; git_jobs_init
+  single_cycle; drain_git_jobs; reach_stop; metrics_flush 1
+}
 
 # ----- CLI --------------------------------------------------------------------
 parse_args_and_dispatch() {
@@ -420,6 +2315,7 @@ parse_args_and_dispatch() {
   [[ -n "$cmd" ]] || { usage; exit 1; }
   validate_interval
   validate_runtime_options
+  trap 'log_close' EXIT
   case "$cmd" in
     start)    start_service ;;
     stop)     stop_service ;;
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# autogit_compact.py — squash old auto-backup commits in a watched repo
+#
+# autogit.sh commits "Auto backup: <timestamp>" every time a watched
+# directory settles, so long-lived repos collect hundreds of thousands of
+# tiny commits.  This helper rewrites the first-parent history of a branch:
+# runs of consecutive auto-backup commits older than a horizon are replaced
+# by one commit per hour or day, carrying the tree, author and committer of
+# the last commit in the run.  Every other commit (manual commits, merges,
+# anything newer than the horizon) is kept with its tree, metadata and
+# message; only its first parent changes (and signatures are dropped, since
+# they no longer verify).  The final tree is unchanged, so the working tree
+# and index are unaffected.
+#
+# The helper only writes objects and prints "<old tip> <new tip> <commits
+# before> <commits after>".  Moving the branch and force-pushing is left to
+# autogit.sh, which does both with compare-and-swap semantics.  Commits are
+# read through one `git cat-file --batch` process and written as loose
+# objects directly, so no process is started per commit.
+
+import argparse
+import hashlib
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+AUTO_PREFIX = b"Auto backup: "
+BUCKETS = {"hourly": "%Y-%m-%d %H:00", "daily": "%Y-%m-%d"}
+
+
+# --- GIT OBJECTS --------------------------------------------------------------
+def git(repo: str, *args: str) -> str:
+    """Run a git command in a repo and return its stripped stdout."""
+    return subprocess.run(["git", "-C", repo, *args], check=True, capture_output=True,
+                          text=True).stdout.strip()
+
+
+class ObjectReader:
+    """Read raw objects through one long-running `git cat-file --batch`."""
+
+    def __init__(self, repo: str):
+        self.proc = subprocess.Popen(["git", "-C", repo, "cat-file", "--batch"],
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def read(self, sha: str) -> bytes:
+        self.proc.stdin.write(sha.encode("ascii") + b"\n")
+        self.proc.stdin.flush()
+        header = self.proc.stdout.readline().split()
+        if len(header) != 3 or header[1] != b"commit":
+            raise ValueError(f"not a commit: {sha}")
+        data = self.proc.stdout.read(int(header[2]) + 1)
+        return data[:-1]
+
+    def close(self) -> None:
+        self.proc.stdin.close()
+        self.proc.wait()
+
+
+class ObjectWriter:
+    """Write commit objects as loose objects (SHA-1 repositories only)."""
+
+    def __init__(self, objects_dir: str):
+        self.objects_dir = objects_dir
+        self.written = 0
+
+    def write(self, body: bytes) -> str:
+        data = b"commit %d\0" % len(body) + body
+        sha = hashlib.sha1(data).hexdigest()
+        directory = os.path.join(self.objects_dir, sha[:2])
+        path = os.path.join(directory, sha[2:])
+        if not os.path.exists(path):
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp_obj_")
+            try:
+                with os.fdopen(fd, "wb") as fh:
+                    fh.write(zlib.compress(data))
+                os.chmod(tmp, 0o444)
+                os.replace(tmp, path)
+            except BaseException:
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+                raise
+            self.written += 1
+        return sha
+
+
+def parse_commit(raw: bytes) -> tuple[list[list[bytes]], bytes]:
+    """Split a raw commit into [key, value] headers and the message."""
+    head, _, message = raw.partition(b"\n\n")
+    headers: list[list[bytes]] = []
+    for line in head.split(b"\n"):
+        if line.startswith(b" ") and headers:
+            headers[-1][1] += b"\n" + line        # continuation (e.g. gpgsig)
+        else:
+            key, _, value = line.partition(b" ")
+            headers.append([key, value])
+    return headers, message
+
+
+def format_commit(headers: list[list[bytes]], message: bytes) -> bytes:
+    """Serialise headers and message back into a raw commit body."""
+    return b"".join(k + b" " + v + b"\n" for k, v in headers) + b"\n" + message
+
+
+def header(headers: list[list[bytes]], key: bytes) -> bytes:
+    """Return the first value of a header, or b"" if missing."""
+    for k, v in headers:
+        if k == key:
+            return v
+    return b""
+
+
+def reparent(headers: list[list[bytes]], parent: str | None) -> list[list[bytes]]:
+    """Return headers with the first parent replaced and signatures dropped."""
+    out: list[list[bytes]] = []
+    replaced = False
+    for k, v in headers:
+        if k in (b"gpgsig", b"gpgsig-sha256"):
+            continue
+        if k == b"parent" and not replaced:
+            replaced = True
+            if parent:
+                out.append([k, parent.encode("ascii")])
+            continue
+        out.append([k, v])
+    if not replaced and parent:
+        out.insert(1, [b"parent", parent.encode("ascii")])   # after "tree"
+    return out
+
+
+# --- COMPACTION ---------------------------------------------------------------
+def compact(repo: str, branch: str, horizon: int, granularity: str,
+            dry_run: bool = False) -> tuple[str, str, int, int]:
+    """Rewrite a branch's history; return (old tip, new tip, before, after)."""
+    if git(repo, "rev-parse", "--show-object-format") != "sha1":
+        raise ValueError("only SHA-1 repositories are supported")
+    tip = git(repo, "rev-parse", "--verify", f"refs/heads/{branch}^{{commit}}")
+    shas = git(repo, "rev-list", "--first-parent", "--reverse", tip).split()
+    objects_dir = os.path.join(repo, git(repo, "rev-parse", "--git-path", "objects"))
+    reader = ObjectReader(repo)
+    writer = ObjectWriter(objects_dir)
+    fmt = BUCKETS[granularity]
+
+    state = {"parent": None, "changed": False, "after": 0}
+    group: list = []          # [count, bucket, (sha, headers, message) of the last commit]
+
+    def emit(body: bytes) -> None:
+        state["parent"] = "0" * 40 if dry_run else writer.write(body)
+        state["changed"] = True
+        state["after"] += 1
+
+    def keep(sha: str, headers: list, message: bytes) -> None:
+        if not state["changed"]:
+            state["parent"] = sha
+            state["after"] += 1
+            return
+        emit(format_commit(reparent(headers, state["parent"]), message))
+
+    def flush() -> None:
+        if not group:
+            return
+        count, bucket, (sha, headers, message) = group
+        group.clear()
+        if count == 1:
+            keep(sha, headers, message)
+            return
+        squashed = [[k, v] for k, v in headers if k in (b"tree", b"author", b"committer")]
+        message = AUTO_PREFIX + f"{bucket} (squashed {count} commits)\n".encode("utf-8")
+        emit(format_commit(reparent(squashed, state["parent"]), message))
+
+    try:
+        for sha in shas:
+            headers, message = parse_commit(reader.read(sha))
+            parents = sum(1 for k, _ in headers if k == b"parent")
+            committed = int(header(headers, b"committer").split()[-2])
+            if parents <= 1 and message.startswith(AUTO_PREFIX) and committed < horizon:
+                bucket = time.strftime(fmt, time.localtime(committed))
+                if group and group[1] == bucket:
+                    group[0] += 1
+                    group[2] = (sha, headers, message)
+                    continue
+                flush()
+                group.extend([1, bucket, (sha, headers, message)])
+                continue
+            flush()
+            keep(sha, headers, message)
+        flush()
+    finally:
+        reader.close()
+    new_tip = state["parent"] if state["changed"] else tip
+    return tip, new_tip, len(shas), state["after"]
+
+
+# --- CLI ----------------------------------------------------------------------
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Squash old AutoGit backup commits")
+    parser.add_argument("--repo", required=True)
+    parser.add_argument("--branch", default="main")
+    parser.add_argument("--older-than", type=int, required=True,
+                        help="only squash commits older than this many seconds")
+    parser.add_argument("--granularity", choices=tuple(BUCKETS), default="daily")
+    parser.add_argument("--dry-run", action="store_true", help="count only, write nothing")
+    args = parser.parse_args(argv)
+
+    try:
+        old, new, before, after = compact(args.repo, args.branch,
+                                          int(time.time()) - args.older_than,
+                                          args.granularity, args.dry_run)
+    except (OSError, ValueError, subprocess.CalledProcessError) as exc:
+        print(f"autogit_compact: {args.repo}: {exc}", file=sys.stderr)
+        return 1
+    print(old, new, before, after)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
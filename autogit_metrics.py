@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# autogit_metrics.py — persistent cycle metrics for the AutoGit daemons
+#
+# autogit.sh and autosave_dirwatch.sh buffer observations in memory while
+# they run and periodically pipe them to `autogit_metrics.py record`.  Each
+# observation is one tab-separated line:
+#
+#     <kind> TAB <name> TAB <value> [TAB label=value ...]
+#
+# where kind is `c` (add to a counter), `g` (set a gauge), `h` (observe a
+# histogram sample, in seconds) or `i` (set an info string, kept in the JSON
+# snapshot only, e.g. the last fingerprint of a root).
+#
+# Counters and histograms are merged into a JSON state file, so they survive
+# daemon restarts.  That JSON file doubles as the snapshot for humans and
+# scripts, and a Prometheus textfile (node_exporter textfile collector format)
+# is rendered next to it.  Both files are replaced atomically.
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+STATE_VERSION = 1
+# Seconds; spans fast idle scans up to backed-off pushes.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+           30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+KINDS = ("c", "g", "h", "i")
+
+
+# --- STATE --------------------------------------------------------------------
+def new_state() -> dict:
+    """Return an empty metrics state."""
+    return {"version": STATE_VERSION, "buckets": list(BUCKETS), "updated": 0,
+            "counters": {}, "gauges": {}, "histograms": {}, "info": {}}
+
+
+def load_state(path: str) -> dict:
+    """Load persisted metrics, or a fresh state if the file is missing or stale."""
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            state = json.load(fh)
+    except (OSError, ValueError):
+        return new_state()
+    if (not isinstance(state, dict) or state.get("version") != STATE_VERSION
+            or state.get("buckets") != list(BUCKETS)):
+        return new_state()
+    return state
+
+
+def atomic_write(path: str, text: str) -> None:
+    """Replace a file atomically with the given text."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".metrics.")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            fh.write(text)
+        # Readable by a node_exporter textfile collector running as another user.
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+# --- OBSERVATIONS -------------------------------------------------------------
+def escape_label(value: str) -> str:
+    """Escape a label value for the Prometheus text format."""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def series_key(name: str, labels: list[tuple[str, str]]) -> str:
+    """Return the canonical `name{k="v",...}` key for a series."""
+    if not labels:
+        return name
+    body = ",".join(f'{k}="{escape_label(v)}"' for k, v in sorted(labels))
+    return f"{name}{{{body}}}"
+
+
+def parse_observation(line: str, base_labels: list[tuple[str, str]]):
+    """Parse one observation line into (kind, key, value); None if malformed."""
+    parts = line.rstrip("\n").split("\t")
+    if len(parts) < 3 or parts[0] not in KINDS or not parts[1]:
+        return None
+    kind, name, raw = parts[0], parts[1], parts[2]
+    labels = list(base_labels)
+    for field in parts[3:]:
+        key, sep, value = field.partition("=")
+        if sep and key:
+            labels.append((key, value))
+    if kind == "i":
+        return kind, series_key(name, labels), raw
+    try:
+        value = float(raw)
+    except ValueError:
+        return None
+    return kind, series_key(name, labels), value
+
+
+def observe(state: dict, kind: str, key: str, value) -> None:
+    """Apply one parsed observation to the state."""
+    if kind == "c":
+        state["counters"][key] = state["counters"].get(key, 0) + value
+    elif kind == "g":
+        state["gauges"][key] = value
+    elif kind == "i":
+        state["info"][key] = value
+    else:
+        hist = state["histograms"].get(key)
+        if hist is None:
+            hist = state["histograms"][key] = {"counts": [0] * len(BUCKETS), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                hist["counts"][i] += 1
+                break
+        hist["sum"] += value
+        hist["count"] += 1
+
+
+# --- PROMETHEUS TEXT ----------------------------------------------------------
+def split_key(key: str) -> tuple[str, str]:
+    """Split `name{labels}` into (name, labels without braces)."""
+    name, _, rest = key.partition("{")
+    return name, rest[:-1] if rest else ""
+
+
+def with_label(labels: str, extra: str) -> str:
+    """Return a `{...}` label block with one extra label appended."""
+    return "{" + (f"{labels},{extra}" if labels else extra) + "}"
+
+
+def format_value(value: float) -> str:
+    """Format a sample value without a trailing `.0` for integers."""
+    return str(int(value)) if float(value).is_integer() else repr(round(float(value), 6))
+
+
+def render_prometheus(state: dict) -> str:
+    """Render the state in the Prometheus text exposition format."""
+    lines: list[str] = []
+    typed: set[str] = set()
+
+    def header(name: str, kind: str) -> None:
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} {kind}")
+
+    for key in sorted(state["counters"]):
+        name, _ = split_key(key)
+        header(name, "counter")
+        lines.append(f"{key} {format_value(state['counters'][key])}")
+    for key in sorted(state["gauges"]):
+        name, _ = split_key(key)
+        header(name, "gauge")
+        lines.append(f"{key} {format_value(state['gauges'][key])}")
+    for key in sorted(state["histograms"]):
+        name, labels = split_key(key)
+        hist = state["histograms"][key]
+        header(name, "histogram")
+        running = 0
+        for bound, count in zip(BUCKETS, hist["counts"]):
+            running += count
+            le = with_label(labels, 'le="%g"' % bound)
+            lines.append(f"{name}_bucket{le} {running}")
+        le = with_label(labels, 'le="+Inf"')
+        lines.append(f"{name}_bucket{le} {hist['count']}")
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {format_value(hist['sum'])}")
+        lines.append(f"{name}_count{suffix} {hist['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def record(stream, state_path: str, prom_path: str | None, daemon: str,
+           labels: list[str] | None = None) -> int:
+    """Merge observations from a stream and rewrite the JSON and textfile."""
+    state = load_state(state_path)
+    base = [("daemon", daemon)] if daemon else []
+    for field in labels or []:
+        key, sep, value = field.partition("=")
+        if sep and key:
+            base.append((key, value))
+    applied = 0
+    for line in stream:
+        parsed = parse_observation(line, base)
+        if parsed is None:
+            continue
+        observe(state, *parsed)
+        applied += 1
+    state["updated"] = int(time.time())
+    observe(state, "g", series_key("autogit_metrics_updated_timestamp_seconds", base),
+            state["updated"])
+    atomic_write(state_path, json.dumps(state, indent=1, sort_keys=True) + "\n")
+    if prom_path:
+        atomic_write(prom_path, render_prometheus(state))
+    return applied
+
+
+# --- CLI ----------------------------------------------------------------------
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="AutoGit metrics recorder")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    rec = sub.add_parser("record", help="merge observations from stdin into the metric files")
+    rec.add_argument("--state", required=True, help="JSON state/snapshot file")
+    rec.add_argument("--prom", help="Prometheus textfile to render")
+    rec.add_argument("--daemon", default="", help="value of the daemon label")
+    rec.add_argument("--label", action="append", default=[], metavar="NAME=VALUE",
+                     help="extra label on every series (repeatable)")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "record":
+        try:
+            record(sys.stdin, args.state, args.prom, args.daemon, args.label)
+        except OSError as exc:
+            print(f"autogit_metrics: {exc}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
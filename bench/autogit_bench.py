@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+# autogit_bench.py — reproducible benchmark for the AutoGit daemons
+#
+# Builds a synthetic sandbox HOME (watched roots, local bare remotes, watch
+# files and ignore globs), then drives autogit.sh and autosave_dirwatch.sh
+# through `run-once` and measures:
+#
+#   - idle cycle wall time (nothing changed since the previous cycle),
+#   - forks per idle cycle (Linux: delta of the `processes` counter in
+#     /proc/stat, so keep the machine otherwise quiet),
+#   - bytes written per idle cycle and extrapolated per idle hour at the
+#     daemon's interval (sandbox files created, rewritten or appended),
+#   - time from a file write until it is committed and pushed to the bare
+#     remote (autogit) or recorded in the watch file (autosave).
+#
+# Trees are generated from a fixed seed with fixed mtimes, so two runs with
+# the same parameters scan identical input.  Results are written as JSON;
+# `autogit_bench.py compare old.json new.json` prints the relative change of
+# every numeric result.
+#
+# Example:
+#   python3 bench/autogit_bench.py run --roots 10 --files 10000 --out base.json
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXED_MTIME = 1_600_000_000
+RESULT_VERSION = 1
+# Seconds between cycles when each daemon runs as a service (used for the
+# per-hour extrapolation).
+DEFAULT_INTERVALS = {"autogit": 5.0, "autosave": 0.2}
+SCRIPTS = {"autogit": "autogit.sh", "autosave": "autosave_dirwatch.sh"}
+
+
+# --- TREE GENERATION ----------------------------------------------------------
+def dir_layout(n_dirs: int, shape: str, depth: int) -> list[str]:
+    """Return root-relative directory paths for a wide or deep tree."""
+    if shape == "wide":
+        fan = max(1, math.ceil(math.sqrt(n_dirs)))
+        return [f"w{i // fan:03d}/w{i % fan:03d}" for i in range(n_dirs)]
+    paths = []
+    for i in range(n_dirs):
+        chain, level = divmod(i, depth)
+        paths.append("/".join([f"c{chain:03d}"] + [f"d{j}" for j in range(level + 1)]))
+    return paths
+
+
+def write_file(path: str, size: int, rng: random.Random) -> None:
+    """Write a file of `size` pseudo-random bytes with a fixed mtime."""
+    with open(path, "wb") as fh:
+        fh.write(rng.randbytes(size))
+    os.utime(path, (FIXED_MTIME, FIXED_MTIME))
+
+
+def generate_root(root: str, n_files: int, args: argparse.Namespace, rng: random.Random) -> None:
+    """Populate one watched root, with part of it under an ignored subtree."""
+    ignored = int(n_files * args.ignored_fraction)
+    kept = n_files - ignored
+    dirs = dir_layout(max(1, math.ceil(kept / args.files_per_dir)), args.shape, args.depth)
+    for i in range(kept):
+        d = os.path.join(root, dirs[i // args.files_per_dir])
+        os.makedirs(d, exist_ok=True)
+        write_file(os.path.join(d, f"f{i:07d}.dat"), args.file_size, rng)
+    for i in range(ignored):
+        d = os.path.join(root, "node_modules", f"pkg{i // args.files_per_dir:04d}")
+        os.makedirs(d, exist_ok=True)
+        write_file(os.path.join(d, f"m{i:07d}.js"), args.file_size, rng)
+    with open(os.path.join(root, ".gitignore"), "w", encoding="utf-8") as fh:
+        fh.write("node_modules/\n")
+
+
+def git(*cmd: str, env: dict) -> str:
+    """Run git quietly and return its stdout."""
+    return subprocess.run(("git",) + cmd, env=env, check=True, capture_output=True,
+                          text=True).stdout.strip()
+
+
+def build_sandbox(base: str, args: argparse.Namespace, env: dict) -> list[str]:
+    """Create roots, bare remotes and watch files; return the root paths."""
+    rng = random.Random(args.seed)
+    state = os.path.join(base, ".autogit")
+    os.makedirs(state)
+    roots = []
+    per_root, extra = divmod(args.files, args.roots)
+    for r in range(args.roots):
+        root = os.path.join(base, "roots", f"root{r:04d}")
+        os.makedirs(root)
+        generate_root(root, per_root + (1 if r < extra else 0), args, rng)
+        remote = os.path.join(base, "remotes", f"root{r:04d}.git")
+        git("init", "-q", "--bare", "-b", "main", remote, env=env)
+        git("-C", root, "init", "-q", "-b", "main", env=env)
+        git("-C", root, "remote", "add", "origin", remote, env=env)
+        roots.append(root)
+    for name in ("dirs_main.txt", "autosave_dirs_main.txt"):
+        with open(os.path.join(state, name), "w", encoding="utf-8") as fh:
+            fh.writelines(f"{root}\n" for root in roots)
+    with open(os.path.join(state, "ignore_globs.txt"), "w", encoding="utf-8") as fh:
+        fh.write("node_modules/\n")
+    return roots
+
+
+# --- MEASUREMENT --------------------------------------------------------------
+def fork_counter() -> int | None:
+    """Return the system-wide number of forks since boot (Linux only)."""
+    try:
+        with open("/proc/stat", "r", encoding="ascii") as fh:
+            for line in fh:
+                if line.startswith("processes "):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def snapshot(base: str) -> dict:
+    """Return {path: (inode, size, mtime_ns)} for every file in the sandbox."""
+    files = {}
+    for dirpath, _, names in os.walk(base):
+        for name in names:
+            path = os.path.join(dirpath, name)
+            try:
+                st = os.lstat(path)
+            except OSError:
+                continue
+            files[path] = (st.st_ino, st.st_size, st.st_mtime_ns)
+    return files
+
+
+def bytes_written(before: dict, after: dict) -> int:
+    """Estimate bytes written between two snapshots.
+
+    Files that kept their inode and grew (logs) count their growth; new or
+    replaced files count their full size.
+    """
+    total = 0
+    for path, (ino, size, mtime) in after.items():
+        old = before.get(path)
+        if old == (ino, size, mtime):
+            continue
+        if old and old[0] == ino and size > old[1]:
+            total += size - old[1]
+        else:
+            total += size
+    return total
+
+
+def run_once(daemon: str, args: argparse.Namespace, env: dict) -> tuple[float, int | None]:
+    """Run one daemon cycle; return (seconds, forks)."""
+    script = os.path.join(args.bin_dir, SCRIPTS[daemon])
+    forks = fork_counter()
+    start = time.perf_counter()
+    proc = subprocess.run(["bash", script, "run-once"], env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    after = fork_counter()
+    if proc.returncode != 0:
+        raise RuntimeError(f"{script} run-once failed ({proc.returncode}): {proc.stderr.strip()}")
+    return elapsed, (after - forks if forks is not None and after is not None else None)
+
+
+def summarize(samples: list[float]) -> dict:
+    """Return min/median/p90/max of a list of samples."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    p90 = ordered[min(len(ordered) - 1, math.ceil(0.9 * len(ordered)) - 1)]
+    return {"min": round(ordered[0], 6), "median": round(statistics.median(ordered), 6),
+            "p90": round(p90, 6), "max": round(ordered[-1], 6), "n": len(ordered)}
+
+
+def remote_has_head(root: str, env: dict) -> bool:
+    """Return True when the bare remote's main branch matches the root's HEAD."""
+    remote = git("-C", root, "remote", "get-url", "origin", env=env)
+    try:
+        local = git("-C", root, "rev-parse", "HEAD", env=env)
+        pushed = git("--git-dir", remote, "rev-parse", "refs/heads/main", env=env)
+    except subprocess.CalledProcessError:
+        return False
+    return local == pushed
+
+
+def watch_hash(watch_file: str, root: str) -> str:
+    """Return the stored hash for a root in an AutoSave watch file."""
+    with open(watch_file, "r", encoding="utf-8") as fh:
+        for line in fh:
+            if line.split(" - [")[0].strip() == root:
+                return line.strip()
+    return ""
+
+
+def bench_daemon(daemon: str, base: str, roots: list[str], args: argparse.Namespace,
+                 env: dict) -> dict:
+    """Measure one daemon against the sandbox."""
+    warm, _ = run_once(daemon, args, env)
+
+    before = snapshot(base)
+    idle, forks = [], []
+    for _ in range(args.idle_cycles):
+        elapsed, n = run_once(daemon, args, env)
+        idle.append(elapsed)
+        if n is not None:
+            forks.append(n)
+    written = bytes_written(before, snapshot(base)) / max(1, args.idle_cycles)
+    interval = args.interval if args.interval is not None else DEFAULT_INTERVALS[daemon]
+
+    latency, confirmed = [], 0
+    watch_file = os.path.join(base, ".autogit", "autosave_dirs_main.txt")
+    for i in range(args.writes):
+        root = roots[i % len(roots)]
+        old = watch_hash(watch_file, root)
+        start = time.perf_counter()
+        with open(os.path.join(root, f"bench_write_{daemon}.txt"), "a", encoding="utf-8") as fh:
+            fh.write(f"write {i}\n")
+        run_once(daemon, args, env)
+        latency.append(time.perf_counter() - start)
+        if daemon == "autogit":
+            confirmed += remote_has_head(root, env)
+        else:
+            confirmed += watch_hash(watch_file, root) != old
+
+    return {
+        "first_cycle_seconds": round(warm, 6),
+        "idle_cycle_seconds": summarize(idle),
+        "idle_forks_per_cycle": summarize([float(n) for n in forks]),
+        "idle_bytes_per_cycle": round(written, 1),
+        "idle_bytes_per_hour": round(written * 3600 / interval),
+        "interval_seconds": interval,
+        ("write_to_push_seconds" if daemon == "autogit" else "write_to_snapshot_seconds"):
+            summarize(latency),
+        "writes_confirmed": confirmed,
+        "writes": args.writes,
+    }
+
+
+def source_revision() -> str:
+    """Return the git revision of the scripts under test, if known."""
+    try:
+        return subprocess.run(["git", "-C", REPO_ROOT, "describe", "--always", "--dirty"],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run_benchmark(args: argparse.Namespace) -> dict:
+    """Build the sandbox, benchmark the requested daemons and return results."""
+    base = tempfile.mkdtemp(prefix="autogit_bench.", dir=args.work_dir)
+    env = dict(os.environ)
+    env.update({
+        "HOME": base,
+        "GIT_CONFIG_GLOBAL": os.path.join(base, ".gitconfig"),
+        "GIT_CONFIG_NOSYSTEM": "1",
+        "TOKEN_FILE": os.path.join(base, "no_token"),
+        "PUSH_MIN_INTERVAL": "0",
+        "METRICS": "0",
+    })
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    try:
+        start = time.perf_counter()
+        roots = build_sandbox(base, args, env)
+        setup = time.perf_counter() - start
+        results = {d: bench_daemon(d, base, roots, args, env) for d in args.daemons}
+    finally:
+        if args.keep:
+            print(f"sandbox kept at {base}", file=sys.stderr)
+        else:
+            shutil.rmtree(base, ignore_errors=True)
+    return {
+        "version": RESULT_VERSION,
+        "timestamp": int(time.time()),
+        "revision": source_revision(),
+        "host": {"system": platform.system(), "release": platform.release(),
+                 "machine": platform.machine(), "cpus": os.cpu_count(),
+                 "python": platform.python_version()},
+        "params": {"roots": args.roots, "files": args.files, "shape": args.shape,
+                   "depth": args.depth, "files_per_dir": args.files_per_dir,
+                   "file_size": args.file_size, "ignored_fraction": args.ignored_fraction,
+                   "idle_cycles": args.idle_cycles, "writes": args.writes,
+                   "seed": args.seed, "env": args.env},
+        "setup_seconds": round(setup, 3),
+        "results": results,
+    }
+
+
+# --- COMPARISON ---------------------------------------------------------------
+def flatten(prefix: str, value, out: dict) -> None:
+    """Collect numeric leaves as dotted keys."""
+    if isinstance(value, dict):
+        for key, child in value.items():
+            flatten(f"{prefix}.{key}" if prefix else key, child, out)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        out[prefix] = value
+
+
+def compare(old_path: str, new_path: str) -> int:
+    """Print the relative change of every numeric result."""
+    with open(old_path, "r", encoding="utf-8") as fh:
+        old = json.load(fh)
+    with open(new_path, "r", encoding="utf-8") as fh:
+        new = json.load(fh)
+    if old.get("params") != new.get("params"):
+        print("warning: runs used different parameters", file=sys.stderr)
+    a, b = {}, {}
+    flatten("", old.get("results", {}), a)
+    flatten("", new.get("results", {}), b)
+    width = max((len(k) for k in a.keys() | b.keys()), default=10)
+    for key in sorted(a.keys() | b.keys()):
+        va, vb = a.get(key), b.get(key)
+        if va is None or vb is None:
+            change = "n/a"
+        elif va == 0:
+            change = "0%" if vb == 0 else "new"
+        else:
+            change = f"{(vb - va) / va * 100:+.1f}%"
+        print(f"{key:<{width}}  {va!s:>14}  {vb!s:>14}  {change:>8}")
+    return 0
+
+
+# --- CLI ----------------------------------------------------------------------
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="AutoGit benchmark harness")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    run = sub.add_parser("run", help="generate a sandbox and benchmark the daemons")
+    run.add_argument("--roots", type=int, default=10, help="number of watched roots")
+    run.add_argument("--files", type=int, default=10000, help="total files across all roots")
+    run.add_argument("--shape", choices=("wide", "deep"), default="wide")
+    run.add_argument("--depth", type=int, default=8, help="nesting depth for --shape deep")
+    run.add_argument("--files-per-dir", type=int, default=50)
+    run.add_argument("--file-size", type=int, default=256, help="bytes per file")
+    run.add_argument("--ignored-fraction", type=float, default=0.2,
+                     help="share of files placed under ignored node_modules/")
+    run.add_argument("--idle-cycles", type=int, default=5)
+    run.add_argument("--writes", type=int, default=5, help="write-to-commit samples")
+    run.add_argument("--daemon", dest="daemons", action="append", choices=tuple(SCRIPTS),
+                     help="daemon to benchmark (repeatable; default: both)")
+    run.add_argument("--interval", type=float,
+                     help="cycle interval used for per-hour figures (default: daemon default)")
+    run.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                     help="extra environment for the daemons (repeatable)")
+    run.add_argument("--bin-dir", default=REPO_ROOT, help="directory holding the scripts")
+    run.add_argument("--work-dir", help="where to create the sandbox (default: $TMPDIR)")
+    run.add_argument("--seed", type=int, default=1)
+    run.add_argument("--keep", action="store_true", help="keep the sandbox afterwards")
+    run.add_argument("--out", help="write JSON results here instead of stdout")
+    cmp_ = sub.add_parser("compare", help="compare two result files")
+    cmp_.add_argument("old")
+    cmp_.add_argument("new")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "compare":
+        return compare(args.old, args.new)
+    if args.roots < 1 or args.files < args.roots or args.files_per_dir < 1 or args.depth < 1:
+        parser.error("need --roots >= 1, --files >= --roots, --files-per-dir >= 1, --depth >= 1")
+    args.daemons = args.daemons or list(SCRIPTS)
+    result = run_benchmark(args)
+    text = json.dumps(result, indent=2, sort_keys=True) + "\n"
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            fh.write(text)
+    else:
+        sys.stdout.write(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
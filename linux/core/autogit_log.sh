@@ -0,0 +1,182 @@
+# autogit_log.sh — shared logging layer for autogit.sh and autosave_dirwatch.sh
+# (sourced, not executed)
+#
+# - Timestamps come from bash's printf %()T, so logging never forks.
+# - Lines are buffered in memory and appended to LOG_FILE in one write at
+#   most every LOG_FLUSH_INTERVAL seconds.  WARN/ERROR lines, and lines
+#   logged from subshells, are written through immediately.
+# - log_idle marks routine messages such as "Cycle complete".  The first
+#   occurrence is written; identical repeats within LOG_SUMMARY_INTERVAL
+#   seconds are only counted and then reported as one summary line.
+# - When LOG_FILE would grow past LOG_MAX_BYTES it is rotated to
+#   LOG_FILE.1 .. LOG_FILE.<LOG_KEEP>.  Rotated files older than
+#   LOG_MAX_AGE_DAYS are deleted.
+# - LOG_FORMAT=json writes one JSON object per line instead of text.
+# - Background jobs report log_idle occurrences through LOG_IDLE_SPOOL (when
+#   the caller sets it), so repeats in jobs are counted by the parent too.
+#
+# Callers must set LOG_FILE and may set LOG_TAG (the "daemon" JSON field).
+
+LOG_FORMAT="${LOG_FORMAT:-text}"             # text | json
+LOG_FLUSH_INTERVAL="${LOG_FLUSH_INTERVAL:-5}"
+LOG_SUMMARY_INTERVAL="${LOG_SUMMARY_INTERVAL:-600}"
+LOG_MAX_BYTES="${LOG_MAX_BYTES:-5242880}"
+LOG_KEEP="${LOG_KEEP:-5}"
+LOG_MAX_AGE_DAYS="${LOG_MAX_AGE_DAYS:-30}"
+LOG_TAG="${LOG_TAG:-autogit}"
+
+LOG_BUF=""
+LOG_FLUSHED_AT=0
+LOG_SUMMARY_AT=0
+LOG_SIZE=-1
+LOG_IDLE_SPOOL=""
+declare -A LOG_REPEATS=()
+
+# Escape a string for use inside a JSON string literal.
+log_json_escape() {
+  local s="$1"
+  s="${s//\\/\\\\}"; s="${s//\"/\\\"}"
+  s="${s//$'\n'/\\n}"; s="${s//$'\r'/\\r}"; s="${s//$'\t'/\\t}"
+  printf -v LOG_ESCAPED '%s' "$s"
+}
+
+# log_format <level> <message> [repeats]: append one formatted line to LOG_BUF.
+log_format() {
+  local level="$1" msg="$2" repeats="${3:-0}" ts
+  if [[ "$LOG_FORMAT" == "json" ]]; then
+    printf -v ts '%(%Y-%m-%dT%H:%M:%S%z)T' -1
+    log_json_escape "$msg"
+    LOG_BUF+="{\"ts\":\"${ts}\",\"daemon\":\"${LOG_TAG}\",\"pid\":$$,\"level\":\"${level}\",\"msg\":\"${LOG_ESCAPED}\""
+    [[ "$repeats" -gt 0 ]] && LOG_BUF+=",\"repeated\":${repeats},\"window\":${LOG_SUMMARY_INTERVAL}"
+    LOG_BUF+=$'}\n'
+  else
+    printf -v ts '%(%Y-%m-%d %H:%M:%S)T' -1
+    if [[ "$repeats" -gt 0 ]]; then
+      LOG_BUF+="${ts} ${msg} (repeated ${repeats} times in the last ${LOG_SUMMARY_INTERVAL}s)"$'\n'
+    else
+      LOG_BUF+="${ts} ${msg}"$'\n'
+    fi
+  fi
+}
+
+# Shift LOG_FILE -> .1 -> .2 ... and prune rotated files past LOG_KEEP or
+# LOG_MAX_AGE_DAYS.  Runs only when the size limit is hit, so the fork to
+# find(1) is rare.
+log_rotate() {
+  local i
+  rm -f "$LOG_FILE.$LOG_KEEP"
+  for (( i = LOG_KEEP - 1; i >= 1; i-- )); do
+    [[ -f "$LOG_FILE.$i" ]] && mv -f "$LOG_FILE.$i" "$LOG_FILE.$((i + 1))"
+  done
+  [[ "$LOG_KEEP" -gt 0 && -f "$LOG_FILE" ]] && mv -f "$LOG_FILE" "$LOG_FILE.1"
+  rm -f "$LOG_FILE"
+  find "$(dirname "$LOG_FILE")" -maxdepth 1 -name "$(basename "$LOG_FILE").[0-9]*" \
+    -mtime +"$LOG_MAX_AGE_DAYS" -delete 2>/dev/null || true
+  LOG_SIZE=0
+}
+
+# log_flush [force]: write the buffer if LOG_FLUSH_INTERVAL has passed.
+log_flush() {
+  local force="${1:-0}" now bytes LC_ALL=C   # C locale: ${#LOG_BUF} counts bytes
+  [[ -n "$LOG_BUF" ]] || return 0
+  printf -v now '%(%s)T' -1
+  [[ "$force" == "1" ]] || (( now - LOG_FLUSHED_AT >= LOG_FLUSH_INTERVAL )) || return 0
+  LOG_FLUSHED_AT="$now"
+  if [[ "$LOG_SIZE" -lt 0 ]]; then
+    mkdir -p "$(dirname "$LOG_FILE")"
+    LOG_SIZE=0
+    [[ -f "$LOG_FILE" ]] && LOG_SIZE="$(wc -c < "$LOG_FILE" | tr -d ' ')"
+  fi
+  bytes="${#LOG_BUF}"
+  if [[ "$LOG_MAX_BYTES" -gt 0 ]] && (( LOG_SIZE + bytes > LOG_MAX_BYTES )); then
+    log_rotate
+  fi
+  printf '%s' "$LOG_BUF" >> "$LOG_FILE"
+  LOG_SIZE=$(( LOG_SIZE + bytes ))
+  LOG_BUF=""
+}
+
+# log_msg <level> <message>
+log_msg() {
+  if [[ "$BASHPID" != "$$" ]]; then
+    # Subshell (e.g. a parallel scan job): its buffer dies with it, and the
+    # inherited copy belongs to the parent, so write just this line.
+    LOG_BUF=""
+    log_format "$1" "$2"
+    printf '%s' "$LOG_BUF" >> "$LOG_FILE"
+    LOG_BUF=""
+    return 0
+  fi
+  log_format "$1" "$2"
+  if [[ "$1" == "WARN" || "$1" == "ERROR" ]]; then
+    log_flush 1
+  else
+    log_flush
+  fi
+}
+
+# log_idle <level> <message>: routine message, collapsed when repeated.
+log_idle() {
+  local key="$1 $2" seen
+  if [[ -n "$LOG_IDLE_SPOOL" && "$BASHPID" != "$$" ]]; then
+    # Background job: the parent owns the counts. Report the occurrence and
+    # write the line only if the parent has not seen it yet.
+    printf '%s\n' "$key" >> "$LOG_IDLE_SPOOL"
+    [[ -z "${LOG_REPEATS[$key]+x}" ]] || return 0
+    LOG_REPEATS["$key"]=0
+    log_msg "$1" "$2"
+    return 0
+  fi
+  if [[ -n "${LOG_REPEATS[$key]+x}" ]]; then
+    seen="${LOG_REPEATS[$key]}"
+    LOG_REPEATS["$key"]=$(( seen + 1 ))
+    return 0
+  fi
+  LOG_REPEATS["$key"]=0
+  log_msg "$1" "$2"
+}
+
+# Fold occurrences reported by background jobs into LOG_REPEATS. Lines new
+# to the parent were already written by the job.
+log_idle_merge() {
+  local key seen
+  [[ -n "$LOG_IDLE_SPOOL" && -s "$LOG_IDLE_SPOOL" ]] || return 0
+  mv -f "$LOG_IDLE_SPOOL" "$LOG_IDLE_SPOOL.merge" 2>/dev/null || return 0
+  while IFS= read -r key; do
+    [[ -n "$key" ]] || continue
+    if [[ -n "${LOG_REPEATS[$key]+x}" ]]; then
+      seen="${LOG_REPEATS[$key]}"
+      LOG_REPEATS["$key"]=$(( seen + 1 ))
+    else
+      LOG_REPEATS["$key"]=0
+    fi
+  done < "$LOG_IDLE_SPOOL.merge"
+  rm -f "$LOG_IDLE_SPOOL.merge"
+}
+
+# Call once per cycle: emits due repeat summaries and flushes if due.
+log_tick() {
+  local now key
+  log_idle_merge
+  printf -v now '%(%s)T' -1
+  [[ "$LOG_SUMMARY_AT" -gt 0 ]] || LOG_SUMMARY_AT="$now"
+  if (( now - LOG_SUMMARY_AT >= LOG_SUMMARY_INTERVAL )); then
+    for key in "${!LOG_REPEATS[@]}"; do
+      [[ "${LOG_REPEATS[$key]}" -gt 0 ]] && log_format "${key%% *}" "${key#* }" "${LOG_REPEATS[$key]}"
+    done
+    LOG_REPEATS=()
+    LOG_SUMMARY_AT="$now"
+  fi
+  log_flush
+}
+
+# On shutdown: report pending repeats and write everything out.
+log_close() {
+  local key
+  log_idle_merge
+  for key in "${!LOG_REPEATS[@]}"; do
+    [[ "${LOG_REPEATS[$key]}" -gt 0 ]] && log_format "${key%% *}" "${key#* }" "${LOG_REPEATS[$key]}"
+  done
+  LOG_REPEATS=()
+  log_flush 1
+}
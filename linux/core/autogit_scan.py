@@ -0,0 +1,1002 @@
+#!/usr/bin/env python3
+# autogit_scan.py — incremental fingerprint helper for the AutoGit daemons
+#
+# Computes the deterministic 16-digit integer that autogit.sh and
+# autosave_dirwatch.sh store next to every watched directory.  Instead of
+# re-walking and re-hashing the whole tree each cycle, the scan keeps a
+# persistent per-root index under ~/.autogit/index with the mtime of every
+# directory and the size/mtime of every file.  Directories whose mtime and
+# inode are unchanged reuse their cached listing (no readdir), and a daemon
+# restart warm-starts from the index instead of doing a cold rescan.
+#
+# Ignore globs follow gitignore semantics (`**`, `!negation`, anchored and
+# directory-only patterns) relative to each watched root, and ignored
+# directories are pruned so the scan never descends into them.
+#
+# A directory modified within RACY_NS of the scan start could gain an entry
+# later in the same timestamp tick without its mtime moving, so (like git's
+# racy index entries) its listing is stored as stale and read again by the
+# next scan.
+#
+# By default every known file is still stat'ed, because editing a file in
+# place does not bump its directory's mtime.  With --trust-dir-mtime the
+# cached file stats of unchanged directories are reused as well, which turns
+# an idle cycle into a handful of directory stats.
+#
+# All due roots of a cycle are fingerprinted by one invocation
+# (`fingerprint --labels` or `--watch-file`) on a small thread pool, so the
+# daemons fork once per cycle instead of once per root.  Digests are BLAKE2b
+# over each entry's name, size and nanosecond mtime; names are hashed along
+# the directory tree, so renames and moves change the fingerprint.
+#
+# A node's digest depends only on what is below it, so the per-directory
+# digests form a Merkle tree.  When watched roots overlap (GNOSIS,
+# GNOSIS/AUDITS, ...) only the outermost root is walked; nested roots read
+# their fingerprint from the matching node and get their index and journal
+# derived from it, so every inode is stat'ed once per invocation.  Ignore
+# rules anchored to the root would make subtrees scan differently, so
+# sharing is skipped when such rules are present.
+#
+# With --delta-dir, the paths that changed since the previous --delta-dir
+# scan of a root are also written out (one NUL-separated file per argument
+# position), so the commit step can stage just those instead of running
+# `git add -A`.  The delta is read from the journal up to a mark kept in the
+# index, not from this scan alone, so changes picked up in between by
+# another scanner of the same index (the fsmonitor hook, AutoSave, a manual
+# run) are still included.
+#
+# With --snapshot-dir, every root whose scan saw changes is also snapshotted
+# into the AutoSave snapshot store (see autogit_snapshot.py) from the
+# listings and change journal already in memory.
+#
+# The `policy` subcommand applies the large-file policy before a commit.
+# It reads sizes from the index the scan just saved, so it needs no walk.
+# Files over a size threshold, or with a listed extension, are either
+# skipped or copied into a content-addressed side store and replaced in the
+# commit by a small pointer file under .autogit-pointers/.  Either way the
+# original is excluded through a managed block of .git/info/exclude that is
+# rebuilt on every run, so files that shrink or vanish are released again.
+# The working tree itself is left alone.
+#
+# Every scan also appends the paths it saw change to a bounded journal in the
+# index.  The `fsmonitor` subcommand is a git core.fsmonitor hook (protocol
+# v2) that answers "what changed since token X" from that journal, so git
+# does not have to re-stat the working tree after AutoGit already has.
+# Entries the scan does not follow (ignored files and directories, symlinks)
+# are still listed in the index, and the hook always reports them ("dir/"
+# for a pruned directory), so git re-checks tracked files under ignore rules
+# itself while trusting the journal for the rest.  "/" (everything may have
+# changed) is only answered for unknown tokens and journal gaps.
+
+import argparse
+import concurrent.futures
+import hashlib
+import os
+import pickle
+import re
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows Python has no fcntl
+    fcntl = None
+
+INDEX_VERSION = 5
+JOURNAL_MAX = 50000
+# Directory mtimes this close to the scan start are not trusted next time
+# (covers 1 s NFS/FUSE and 2 s FAT timestamps).
+RACY_NS = 2_000_000_000
+POINTER_DIR = ".autogit-pointers"
+# Large-file exclusions are kept between these lines of .git/info/exclude.
+EXCLUDE_BEGIN = "# >>> autogit large files (managed, rewritten on every commit) >>>"
+EXCLUDE_END = "# <<< autogit large files <<<"
+SKIP_DIRS = (".git", POINTER_DIR)
+
+
+# --- INDEX STORAGE ------------------------------------------------------------
+def index_path(index_dir: str, root: str, ignore_key: str) -> str:
+    """Return the index file used for a root under the given ignore set."""
+    key = hashlib.sha1(f"{root}\0{ignore_key}".encode("utf-8")).hexdigest()
+    return os.path.join(index_dir, f"{key}.idx")
+
+
+def new_journal() -> dict:
+    """Return an empty change journal with a fresh identity."""
+    return {"id": uuid.uuid4().hex[:12], "seq": 0, "floor": 0, "entries": []}
+
+
+def load_index(path: str, root: str, ignore_key: str) -> tuple[dict, dict]:
+    """Load a previously saved index as (dirs, journal), or empty ones if unusable."""
+    try:
+        with open(path, "rb") as fh:
+            data = pickle.load(fh)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError):
+        return {}, new_journal()
+    if (
+        not isinstance(data, dict)
+        or data.get("version") != INDEX_VERSION
+        or data.get("root") != root
+        or data.get("ignore") != ignore_key
+    ):
+        return {}, new_journal()
+    return data.get("dirs", {}), data.get("journal") or new_journal()
+
+
+def save_index(path: str, root: str, ignore_key: str, dirs: dict, journal: dict) -> None:
+    """Atomically replace the index file for a root."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    payload = {"version": INDEX_VERSION, "root": root, "ignore": ignore_key,
+               "dirs": dirs, "journal": journal}
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".idx.")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            pickle.dump(payload, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class IndexLock:
+    """Exclusive advisory lock serialising scans of the same index file."""
+
+    def __init__(self, path: str | None):
+        self.path = f"{path}.lock" if path else None
+        self.fh = None
+
+    def __enter__(self):
+        if self.path and fcntl is not None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.fh = open(self.path, "a")
+            fcntl.flock(self.fh, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self.fh:
+            self.fh.close()
+        return False
+
+
+# --- IGNORE PATTERNS ----------------------------------------------------------
+# Compiled rules are memoised per (path, mtime, size), so a multi-root scan
+# reads and compiles the ignore file once and picks up edits immediately.
+_RULE_CACHE: dict = {}
+
+
+def _translate_glob(pattern: str) -> str:
+    """Translate a gitignore glob body into a regular expression."""
+    out: list[str] = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == "*":
+            if pattern.startswith("**", i):
+                at_start = i == 0 or pattern[i - 1] == "/"
+                j = i + 2
+                if at_start and j < n and pattern[j] == "/":
+                    out.append("(?:.*/)?")       # "**/" matches zero or more dirs
+                    i = j + 1
+                    continue
+                if at_start and j == n:
+                    out.append(".*")             # trailing "/**" matches everything inside
+                    i = j
+                    continue
+                out.append("[^/]*")              # any other "**" behaves like "*"
+                i = j
+                continue
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            j = pattern.find("]", i + 2 if pattern[i + 1:i + 2] in ("!", "^") else i + 1)
+            if j == -1:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:j]
+                if body[:1] in ("!", "^"):
+                    body = "^" + body[1:]
+                out.append("[" + body.replace("\\", "\\\\") + "]")
+                i = j
+        elif c == "\\" and i + 1 < n:
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+
+def compile_ignore_rules(lines: list[str]) -> list[tuple]:
+    """Compile gitignore-style lines into (regex, negate, dir_only, anchored) rules."""
+    rules: list[tuple] = []
+    for raw in lines:
+        line = raw.strip()
+        if not line or line.startswith("#"):
+            continue
+        negate = line.startswith("!")
+        if negate:
+            line = line[1:]
+        elif line.startswith("\\"):
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            continue
+        anchored = "/" in line
+        body = _translate_glob(line.lstrip("/"))
+        prefix = "^" if anchored else "^(?:.*/)?"
+        rules.append((re.compile(f"{prefix}{body}$"), negate, dir_only, anchored))
+    return rules
+
+
+def load_ignore_rules(ignore_file: str | None) -> tuple[list[tuple], str]:
+    """Return compiled rules and a cache key for the current ignore file."""
+    if not ignore_file:
+        return [], ""
+    try:
+        st = os.stat(ignore_file)
+    except OSError:
+        return [], ""
+    key = (ignore_file, st.st_mtime_ns, st.st_size)
+    cached = _RULE_CACHE.get(key)
+    if cached is None:
+        with open(ignore_file, "r", encoding="utf-8", errors="replace") as fh:
+            text = fh.read()
+        cached = (compile_ignore_rules(text.splitlines()), text)
+        _RULE_CACHE.clear()
+        _RULE_CACHE[key] = cached
+    return cached
+
+
+def rules_shareable(rules: list[tuple]) -> bool:
+    """Return True if the rules match the same way from any ancestor root."""
+    return all(not anchored or regex.pattern.startswith("^(?:.*/)?")
+               for regex, _negate, _dir_only, anchored in rules)
+
+
+def is_ignored(rel: str, is_dir: bool, rules: list[tuple], abs_rel: str = "") -> bool:
+    """Apply gitignore rules to a root-relative path; the last match wins.
+
+    Anchored rules are also tried against the absolute path (without its
+    leading slash) so older absolute-path entries keep working.
+    """
+    ignored = False
+    for regex, negate, dir_only, anchored in rules:
+        if dir_only and not is_dir:
+            continue
+        if regex.match(rel) or (anchored and abs_rel and regex.match(abs_rel)):
+            ignored = not negate
+    return ignored
+
+
+# --- SCANNING -----------------------------------------------------------------
+class Scan:
+    """State for one incremental scan of a single root."""
+
+    def __init__(self, root: str, old: dict, rules: list[tuple], trust_dir_mtime: bool):
+        self.root = root
+        self.old = old
+        self.new: dict = {}
+        self.rules = rules
+        self.trust = trust_dir_mtime
+        self.started = time.time_ns()
+        self.dirty = False
+        # Root-relative paths that changed since the previous scan;
+        # directories carry a trailing "/".
+        self.added: set[str] = set()
+        self.modified: set[str] = set()
+        self.deleted: set[str] = set()
+        # Work counters reported by `fingerprint --stats`.
+        self.files_seen = 0
+        self.dirs_seen = 0
+        self.dirs_read = 0
+        self.journal: dict | None = None
+        # Paths changed since the journal mark (see finish_scan), or None
+        # when that is unknown.
+        self.delta: set[str] | None = None
+
+    def record_changes(self, rel: str, prev: dict | None, files: dict, kept: list[str]) -> None:
+        """Diff one directory against its previous index entry."""
+        prefix = f"{rel}/" if rel else ""
+        if prev is None:
+            if self.old and prefix:
+                self.added.add(prefix)
+                self.added.update(prefix + name for name in files)
+            return
+        old_files = prev["f"]
+        for name, meta in files.items():
+            if name not in old_files:
+                self.added.add(prefix + name)
+            elif old_files[name] != meta:
+                self.modified.add(prefix + name)
+        self.deleted.update(prefix + name for name in old_files if name not in files)
+        self.deleted.update(f"{prefix}{name}/" for name in prev["d"] if name not in kept)
+
+    def changed_paths(self) -> set[str]:
+        """Return every path reported as added, modified or deleted."""
+        return self.added | self.modified | self.deleted
+
+    def ignored(self, rel: str, is_dir: bool) -> bool:
+        """Return True if a root-relative path is excluded by the ignore rules."""
+        if not self.rules:
+            return False
+        return is_ignored(rel, is_dir, self.rules, f"{self.root}/{rel}".lstrip("/"))
+
+    def list_dir(self, path: str, rel: str) -> tuple[dict, list[str], list[str]] | None:
+        """Read a directory from disk as (file stats, kept subdirs, unscanned names).
+
+        Ignored subdirectories are dropped here, which prunes them from the
+        walk entirely.  Unscanned names are the ignored entries and symlinks
+        the scan does not follow (directories with a trailing "/").
+        """
+        files: dict = {}
+        subdirs: list[str] = []
+        unscanned: list[str] = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    child_rel = f"{rel}/{entry.name}" if rel else entry.name
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name in SKIP_DIRS:
+                                continue
+                            if self.ignored(child_rel, True):
+                                unscanned.append(entry.name + "/")
+                            else:
+                                subdirs.append(entry.name)
+                        elif entry.is_file(follow_symlinks=False):
+                            if self.ignored(child_rel, False):
+                                unscanned.append(entry.name)
+                                continue
+                            st = entry.stat(follow_symlinks=False)
+                            files[entry.name] = (st.st_size, st.st_mtime_ns)
+                        elif entry.is_symlink():
+                            unscanned.append(entry.name)
+                    except OSError:
+                        continue
+        except OSError:
+            return None
+        self.dirs_read += 1
+        return files, subdirs, sorted(unscanned)
+
+    def restat_files(self, path: str, cached: dict) -> dict | None:
+        """Re-stat the cached file names of an unchanged directory."""
+        files: dict = {}
+        for name in cached:
+            try:
+                st = os.stat(os.path.join(path, name), follow_symlinks=False)
+            except OSError:
+                return None
+            files[name] = (st.st_size, st.st_mtime_ns)
+        return files
+
+    def visit(self, path: str, rel: str) -> str | None:
+        """Scan one directory and return its digest (None if unreadable)."""
+        try:
+            st = os.stat(path, follow_symlinks=False)
+        except OSError:
+            return None
+        prev = self.old.get(rel)
+        files = subdirs = None
+        if prev and prev["m"] == st.st_mtime_ns and prev["i"] == st.st_ino:
+            subdirs, unscanned = prev["d"], prev["u"]
+            files = prev["f"] if self.trust else self.restat_files(path, prev["f"])
+        if files is None:
+            listing = self.list_dir(path, rel)
+            if listing is None:
+                return None
+            files, subdirs, unscanned = listing
+        self.dirs_seen += 1
+        self.files_seen += len(files)
+
+        h = new_hash()
+        for name in sorted(files):
+            size, mtime = files[name]
+            h.update(f"F {name} {size} {mtime}\n".encode("utf-8", "surrogateescape"))
+        kept: list[str] = []
+        for name in sorted(subdirs):
+            child_rel = f"{rel}/{name}" if rel else name
+            child = self.visit(os.path.join(path, name), child_rel)
+            if child is None:
+                continue
+            kept.append(name)
+            h.update(f"D {name} {child}\n".encode("utf-8", "surrogateescape"))
+        digest = h.hexdigest()
+
+        # A racy mtime is stored as -1 so the next scan relists the directory.
+        mtime = -1 if st.st_mtime_ns >= self.started - RACY_NS else st.st_mtime_ns
+        entry = {"m": mtime, "i": st.st_ino, "f": files, "d": kept, "u": unscanned, "h": digest}
+        if prev != entry:
+            self.dirty = True
+            self.record_changes(rel, prev, files, kept)
+        self.new[rel] = entry
+        return digest
+
+
+def new_hash():
+    """Return the streaming digest used for directory nodes."""
+    return hashlib.blake2b(digest_size=16)
+
+
+def digits_from_digest(digest: str) -> str:
+    """Reduce a hex digest to the 16-digit integer used in the watch files."""
+    return f"{int(digest[:16], 16) % 10**16:016d}"
+
+
+def append_journal(journal: dict, paths: set[str]) -> None:
+    """Record one scan's changed paths under a new sequence number."""
+    journal["seq"] += 1
+    journal["entries"].extend((journal["seq"], p) for p in sorted(paths))
+    overflow = len(journal["entries"]) - JOURNAL_MAX
+    if overflow > 0:
+        journal["floor"] = journal["entries"][overflow - 1][0]
+        del journal["entries"][:overflow]
+
+
+def scan_root(root: str, index_dir: str | None, ignore_file: str | None,
+              trust_dir_mtime: bool = False, mark: bool = False) -> tuple[str, Scan, dict]:
+    """Scan a root incrementally; return (16 digits, scan state, journal).
+
+    With `mark`, scan.delta is filled from the journal mark (see finish_scan).
+    """
+    root = os.path.abspath(root)
+    rules, ignore_text = load_ignore_rules(ignore_file)
+    ignore_key = hashlib.sha1(ignore_text.encode("utf-8")).hexdigest()
+    path = index_path(index_dir, root, ignore_key) if index_dir else None
+
+    with IndexLock(path):
+        old, journal = load_index(path, root, ignore_key) if path else ({}, new_journal())
+        scan = Scan(root, old, rules, trust_dir_mtime)
+        digest = scan.visit(root, "") or new_hash().hexdigest()
+        finish_scan(scan, journal, path, ignore_key, mark)
+    return digits_from_digest(digest), scan, journal
+
+
+def finish_scan(scan: Scan, journal: dict, path: str | None, ignore_key: str,
+                mark: bool = False) -> None:
+    """Journal a completed scan's changes and save its index if anything moved.
+
+    With `mark`, scan.delta becomes every journaled path after the mark left
+    by the previous marking scan (None if there is none, or it fell off the
+    journal) and the mark moves to the end of the journal.
+    """
+    scan.journal = journal
+    for rel in scan.old:
+        if rel not in scan.new:
+            scan.dirty = True
+    changed = scan.changed_paths()
+    if changed:
+        append_journal(journal, changed)
+    if mark:
+        since = journal.get("mark")
+        if since is not None and since >= journal["floor"]:
+            scan.delta = {p for seq, p in journal["entries"] if seq > since}
+        if since != journal["seq"]:
+            journal["mark"] = journal["seq"]
+            scan.dirty = True
+    if path and scan.dirty:
+        try:
+            save_index(path, scan.root, ignore_key, scan.new, journal)
+        except OSError as exc:
+            print(f"autogit_scan: cannot write index {path}: {exc}", file=sys.stderr)
+
+
+def derive_root(root: str, outer: Scan, index_dir: str | None,
+                ignore_file: str | None, mark: bool = False) -> tuple[str, Scan] | None:
+    """Fingerprint a root nested in an already scanned one from its subtree.
+
+    The nested root's index and journal are rebuilt from the outer scan, so
+    its fsmonitor hook stays accurate.  Returns None if the subtree was not
+    walked (ignored or unreadable).
+    """
+    prefix = os.path.relpath(root, outer.root).replace(os.sep, "/")
+    node = outer.new.get(prefix)
+    if node is None:
+        return None
+    cut = len(prefix) + 1
+    dirs = {("" if rel == prefix else rel[cut:]): entry for rel, entry in outer.new.items()
+            if rel == prefix or rel.startswith(prefix + "/")}
+    rules, ignore_text = load_ignore_rules(ignore_file)
+    ignore_key = hashlib.sha1(ignore_text.encode("utf-8")).hexdigest()
+    path = index_path(index_dir, root, ignore_key) if index_dir else None
+
+    scan = Scan(root, {}, rules, outer.trust)
+    scan.new = dirs
+    scan.dirs_seen = len(dirs)
+    scan.files_seen = sum(len(entry["f"]) for entry in dirs.values())
+    if path:
+        with IndexLock(path):
+            scan.old, journal = load_index(path, root, ignore_key)
+            for rel, entry in dirs.items():
+                prev = scan.old.get(rel)
+                if prev != entry:
+                    scan.dirty = True
+                    scan.record_changes(rel, prev, entry["f"], entry["d"])
+            finish_scan(scan, journal, path, ignore_key, mark)
+    return digits_from_digest(node["h"]), scan
+
+
+def fingerprint(root: str, index_dir: str | None, ignore_file: str | None,
+                trust_dir_mtime: bool = False) -> str:
+    """Return the 16-digit fingerprint of a directory, updating its index."""
+    return scan_root(root, index_dir, ignore_file, trust_dir_mtime)[0]
+
+
+def watch_labels(watch_file: str) -> list[str]:
+    """Return the labels (`dir[::tags]`) of the existing roots in a watch file."""
+    labels: list[str] = []
+    try:
+        with open(watch_file, "r", encoding="utf-8", errors="surrogateescape") as fh:
+            lines = fh.read().splitlines()
+    except OSError:
+        return labels
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        label = line.split(" - [", 1)[0]
+        if label and os.path.isdir(label.split("::", 1)[0]):
+            labels.append(label)
+    return labels
+
+
+def outermost_roots(roots: list[str]) -> dict[str, str]:
+    """Map every root to the outermost listed root containing it (or itself)."""
+    tops: list[str] = []
+    owner: dict[str, str] = {}
+    for root in sorted(set(roots)):
+        for top in tops:
+            if root.startswith(top.rstrip("/") + "/"):
+                owner[root] = top
+                break
+        else:
+            tops.append(root)
+            owner[root] = root
+    return owner
+
+
+def fingerprint_many(roots: list[str], index_dir: str | None, ignore_file: str | None,
+                     trust_dir_mtime: bool = False, workers: int = 1,
+                     mark: bool = False) -> list:
+    """Scan several roots on a thread pool; return (digits, scan, microseconds) in order.
+
+    Duplicate and nested roots share the scan of their outermost root when
+    the ignore rules allow it.  An entry is None when its root could not be
+    scanned.
+    """
+    rules, _ = load_ignore_rules(ignore_file)  # compile once before the threads share the cache
+    absolute = [os.path.abspath(r) for r in roots]
+    owner = outermost_roots(absolute) if rules_shareable(rules) else {r: r for r in absolute}
+    tops = sorted(set(owner.values()))
+
+    def one(root: str):
+        start = time.perf_counter_ns()
+        try:
+            digits, scan, _ = scan_root(root, index_dir, ignore_file, trust_dir_mtime, mark)
+        except OSError as exc:
+            print(f"autogit_scan: cannot scan {root}: {exc}", file=sys.stderr)
+            return None
+        return digits, scan, (time.perf_counter_ns() - start) // 1000
+
+    if workers <= 1 or len(tops) <= 1:
+        scanned = dict(zip(tops, map(one, tops)))
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(workers, len(tops))) as pool:
+            scanned = dict(zip(tops, pool.map(one, tops)))
+
+    results: dict[str, tuple | None] = dict(scanned)
+    for root in sorted(set(absolute) - set(tops)):
+        outer = scanned[owner[root]]
+        start = time.perf_counter_ns()
+        try:
+            derived = (derive_root(root, outer[1], index_dir, ignore_file, mark)
+                       if outer else None)
+        except OSError as exc:
+            print(f"autogit_scan: cannot index {root}: {exc}", file=sys.stderr)
+            derived = None
+        if derived is None:
+            results[root] = one(root)
+            continue
+        results[root] = (*derived, (time.perf_counter_ns() - start) // 1000)
+    return [results[r] for r in absolute]
+
+
+def write_deltas(delta_dir: str, results: list, limit: int) -> None:
+    """Write each root's delta (scanned with mark=True) to <delta_dir>/<position>.
+
+    Paths are NUL-separated and stale files are removed first.  No file is
+    written when the delta is unknown (no mark yet, or the journal lost
+    entries after it), empty, or longer than `limit` paths.
+    """
+    os.makedirs(delta_dir, exist_ok=True)
+    with os.scandir(delta_dir) as it:
+        for entry in it:
+            if entry.name.isdigit():
+                os.unlink(entry.path)
+    for pos, result in enumerate(results):
+        if result is None:
+            continue
+        paths = result[1].delta
+        if not paths or len(paths) > limit:
+            continue
+        with open(os.path.join(delta_dir, str(pos)), "wb") as fh:
+            fh.write(b"".join(p.encode("utf-8", "surrogateescape") + b"\0" for p in sorted(paths)))
+
+
+def snapshot_many(store: str, results: list) -> dict[str, tuple[int, int]]:
+    """Snapshot every scanned root that changed; return {root: (microseconds, new bytes)}."""
+    try:
+        import autogit_snapshot
+    except ImportError as exc:
+        print(f"autogit_scan: snapshots unavailable: {exc}", file=sys.stderr)
+        return {}
+    taken: dict[str, tuple[int, int]] = {}
+    seen: set[str] = set()
+    for result in results:
+        if result is None or result[1].root in seen:
+            continue
+        scan = result[1]
+        seen.add(scan.root)
+        start = time.perf_counter_ns()
+        try:
+            record = autogit_snapshot.snapshot_root(store, scan.root, scan.new, scan.journal,
+                                                    bool(scan.changed_paths()))
+        except (OSError, ValueError) as exc:
+            print(f"autogit_scan: cannot snapshot {scan.root}: {exc}", file=sys.stderr)
+            continue
+        if record:
+            taken[scan.root] = ((time.perf_counter_ns() - start) // 1000, record["new_bytes"])
+    return taken
+
+
+# --- LARGE-FILE POLICY --------------------------------------------------------
+def large_files(dirs: dict, max_bytes: int, extensions: set[str]):
+    """Yield (rel path, size, mtime_ns) of indexed files the policy applies to."""
+    for rel, entry in dirs.items():
+        prefix = f"{rel}/" if rel else ""
+        for name, (size, mtime) in entry["f"].items():
+            ext = name.rsplit(".", 1)[-1].lower() if "." in name else ""
+            if (max_bytes and size > max_bytes) or ext in extensions:
+                yield prefix + name, size, mtime
+
+
+def exclude_pattern(rel: str) -> str:
+    """Return a .git/info/exclude line matching exactly one root-relative path."""
+    body = re.sub(r"([\\*?\[])", r"\\\1", rel)
+    if body.endswith(" "):
+        body = body[:-1] + "\\ "
+    return "/" + body
+
+
+def read_pointer(path: str) -> dict:
+    """Parse a pointer file into its key/value fields (empty if missing)."""
+    fields: dict = {}
+    try:
+        with open(path, "r", encoding="utf-8", errors="surrogateescape") as fh:
+            for line in fh:
+                key, _, value = line.rstrip("\n").partition(" ")
+                fields[key] = value
+    except OSError:
+        pass
+    return fields
+
+
+def store_file(src: str, store_dir: str) -> str:
+    """Copy a file into the content-addressed store; return its sha256."""
+    h = hashlib.sha256()
+    with open(src, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+    dest = os.path.join(store_dir, digest[:2], digest)
+    if not os.path.exists(dest):
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dest), prefix=".store.")
+        os.close(fd)
+        try:
+            shutil.copyfile(src, tmp)
+            os.chmod(tmp, 0o444)
+            os.replace(tmp, dest)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+    return digest
+
+
+def read_excludes(exclude_file: str) -> tuple[list[str], list[str]]:
+    """Split .git/info/exclude into (lines outside the managed block, block lines)."""
+    try:
+        with open(exclude_file, "r", encoding="utf-8", errors="surrogateescape") as fh:
+            lines = fh.read().splitlines()
+    except OSError:
+        return [], []
+    outside: list[str] = []
+    managed: list[str] = []
+    inside = False
+    for line in lines:
+        if line == EXCLUDE_BEGIN:
+            inside = True
+        elif line == EXCLUDE_END:
+            inside = False
+        else:
+            (managed if inside else outside).append(line)
+    return outside, managed
+
+
+def write_excludes(exclude_file: str, outside: list[str], managed: list[str]) -> None:
+    """Atomically rewrite .git/info/exclude with the managed block at the end."""
+    lines = list(outside)
+    if managed:
+        lines += [EXCLUDE_BEGIN, *managed, EXCLUDE_END]
+    os.makedirs(os.path.dirname(exclude_file), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(exclude_file), prefix=".exclude.")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", errors="surrogateescape") as fh:
+            fh.write("".join(f"{line}\n" for line in lines))
+        os.replace(tmp, exclude_file)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def apply_policy(root: str, dirs: dict, max_bytes: int, extensions: set[str], action: str,
+                 store_dir: str) -> tuple[list[tuple[str, str, int]], list[str]]:
+    """Skip or side-store large files; return (actions taken, pointer paths written).
+
+    The exclusions live in a managed block of .git/info/exclude that is
+    rebuilt from the current index on every run, so a file that shrinks
+    below the policy is released again ("include"; "release" when it is
+    gone, which only keeps it out of the staging delta).  Files
+    already handled (excluded, or with an up-to-date pointer) are left
+    alone, so a steady state costs one pass over the index.
+    """
+    exclude_file = os.path.join(root, ".git", "info", "exclude")
+    outside, managed = read_excludes(exclude_file)
+    excluded = set(managed)
+
+    actions: list[tuple[str, str, int]] = []
+    pointers: list[str] = []
+    wanted: list[str] = []
+    for rel, size, mtime in sorted(large_files(dirs, max_bytes, extensions)):
+        if "\n" in rel or "\t" in rel:
+            print(f"autogit_scan: cannot apply policy to {rel!r}", file=sys.stderr)
+            continue
+        pattern = exclude_pattern(rel)
+        wanted.append(pattern)
+        if action == "store":
+            pointer_rel = f"{POINTER_DIR}/{rel}"
+            pointer = os.path.join(root, pointer_rel)
+            old = read_pointer(pointer)
+            if old.get("size") == str(size) and old.get("mtime_ns") == str(mtime) and pattern in excluded:
+                continue
+            digest = store_file(os.path.join(root, rel), store_dir)
+            os.makedirs(os.path.dirname(pointer), exist_ok=True)
+            with open(pointer, "w", encoding="utf-8", errors="surrogateescape") as fh:
+                fh.write(f"autogit-pointer v1\npath {rel}\nsha256 {digest}\nsize {size}\n"
+                         f"mtime_ns {mtime}\nstore {os.path.join(store_dir, digest[:2], digest)}\n")
+            pointers.append(pointer_rel)
+        elif pattern in excluded:
+            continue
+        actions.append((action, rel, size))
+
+    # Release exclusions of files that are gone or no longer match.
+    for pattern in sorted(excluded - set(wanted)):
+        rel = re.sub(r"\\(.)", r"\1", pattern[1:])
+        kind = "include" if os.path.lexists(os.path.join(root, rel)) else "release"
+        actions.append((kind, rel, 0))
+
+    # Drop pointers whose file is gone (or no longer matches the policy).
+    keep: set[str] = set()
+    if action == "store":
+        keep = {f"{POINTER_DIR}/{rel}" for rel, _, _ in large_files(dirs, max_bytes, extensions)}
+    for base, _subdirs, names in os.walk(os.path.join(root, POINTER_DIR)):
+        for name in names:
+            pointer = os.path.join(base, name)
+            pointer_rel = os.path.relpath(pointer, root).replace(os.sep, "/")
+            if pointer_rel not in keep:
+                os.unlink(pointer)
+                pointers.append(pointer_rel)
+                actions.append(("drop", pointer_rel[len(POINTER_DIR) + 1:], 0))
+
+    if wanted != managed:
+        write_excludes(exclude_file, outside, wanted)
+    return actions, pointers
+
+
+def policy(root: str, index_dir: str, ignore_file: str | None, max_bytes: int,
+           extensions: set[str], action: str, store_dir: str, delta: str | None) -> list:
+    """Apply the large-file policy to a root from its saved index.
+
+    When a delta file is given, handled paths are removed from it and new
+    pointer files are added, so targeted staging matches the policy.
+    Pointer changes are also journaled for the fsmonitor hook.
+    """
+    root = os.path.abspath(root)
+    if not os.path.isdir(os.path.join(root, ".git")):
+        return []
+    _, ignore_text = load_ignore_rules(ignore_file)
+    ignore_key = hashlib.sha1(ignore_text.encode("utf-8")).hexdigest()
+    path = index_path(index_dir, root, ignore_key)
+    with IndexLock(path):
+        dirs, journal = load_index(path, root, ignore_key)
+        actions, pointers = apply_policy(root, dirs, max_bytes, extensions, action, store_dir)
+        if pointers:
+            # The scan never enters POINTER_DIR; journal the pointers so the
+            # fsmonitor hook reports them to git.
+            append_journal(journal, set(pointers))
+            save_index(path, root, ignore_key, dirs, journal)
+    if delta and actions and os.path.exists(delta):
+        with open(delta, "rb") as fh:
+            paths = [p for p in fh.read().split(b"\0") if p]
+        handled = {rel.encode("utf-8", "surrogateescape") for kind, rel, _ in actions
+                   if kind != "include"}
+        paths = [p for p in paths if p not in handled]
+        paths += [p.encode("utf-8", "surrogateescape") for p in pointers]
+        paths += [rel.encode("utf-8", "surrogateescape") for kind, rel, _ in actions
+                  if kind == "include"]
+        with open(delta, "wb") as fh:
+            fh.write(b"".join(p + b"\0" for p in sorted(set(paths))))
+    return actions
+
+
+# --- GIT FSMONITOR HOOK -------------------------------------------------------
+def unscanned_paths(dirs: dict) -> set[str]:
+    """Return every root-relative path the scan saw but did not follow."""
+    paths: set[str] = set()
+    for rel, entry in dirs.items():
+        prefix = f"{rel}/" if rel else ""
+        paths.update(prefix + name for name in entry["u"])
+    return paths
+
+
+def fsmonitor_query(root: str, token: str, index_dir: str, ignore_file: str | None,
+                    trust_dir_mtime: bool, full_every: int) -> tuple[str, list[str]]:
+    """Answer a v2 fsmonitor query as (new token, changed paths).
+
+    The answer is the journaled changes since the token plus every path the
+    scan does not follow (ignored entries, symlinks), which git then checks
+    itself.  A path list of ["/"] tells git to assume everything changed;
+    that is returned for unknown or expired tokens, when the journal lost
+    entries after the token, and at least every `full_every` seconds.
+    Unless AUTOGIT_FSMONITOR_FRESH is set (the daemon sets it right after
+    its own scan), the root is rescanned first so manual git commands see
+    current state.
+    """
+    root = os.path.abspath(root)
+    now = int(time.time())
+    dirs: dict = {}
+    if os.environ.get("AUTOGIT_FSMONITOR_FRESH") == "1":
+        _, ignore_text = load_ignore_rules(ignore_file)
+        ignore_key = hashlib.sha1(ignore_text.encode("utf-8")).hexdigest()
+        path = index_path(index_dir, root, ignore_key)
+        with IndexLock(path):
+            dirs, journal = load_index(path, root, ignore_key)
+    if not dirs:
+        _, scan, journal = scan_root(root, index_dir, ignore_file, trust_dir_mtime)
+        dirs = scan.new
+
+    parts = token.split(":")
+    valid = len(parts) == 4 and parts[0] == "autogit" and parts[1] == journal["id"]
+    if valid:
+        try:
+            since, full_at = int(parts[2]), int(parts[3])
+        except ValueError:
+            valid = False
+    if not valid or not journal["floor"] <= since <= journal["seq"] or now - full_at >= full_every:
+        return f"autogit:{journal['id']}:{journal['seq']}:{now}", ["/"]
+
+    paths = {p for seq, p in journal["entries"] if seq > since} | unscanned_paths(dirs)
+    return f"autogit:{journal['id']}:{journal['seq']}:{full_at}", sorted(paths)
+
+
+# --- CLI ----------------------------------------------------------------------
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="AutoGit incremental fingerprint helper")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    fp = sub.add_parser("fingerprint", help="print the 16-digit value for each directory")
+    fp.add_argument("dirs", nargs="*")
+    fp.add_argument("--labels", action="store_true",
+                    help="arguments are watch labels (dir[::tags]); print `label - [ digits ]`")
+    fp.add_argument("--watch-file", help="scan every existing root listed in this watch file")
+    fp.add_argument("--workers", type=int, default=1, help="roots scanned concurrently")
+    fp.add_argument("--delta-dir",
+                    help="write each root's paths changed since the previous --delta-dir scan "
+                         "to <dir>/<position>")
+    fp.add_argument("--delta-max", type=int, default=1000,
+                    help="skip delta files listing more paths than this")
+    fp.add_argument("--snapshot-dir",
+                    help="snapshot changed roots into this store (see autogit_snapshot.py)")
+    fp.add_argument("--index-dir", default=os.path.expanduser("~/.autogit/index"))
+    fp.add_argument("--no-index", action="store_true", help="do not read or write the index")
+    fp.add_argument("--ignore-file")
+    fp.add_argument("--trust-dir-mtime", action="store_true")
+    fp.add_argument("--stats", action="store_true",
+                    help="append files seen, dirs seen, dirs read and microseconds to each line")
+    po = sub.add_parser("policy", help="skip or side-store large files before a commit")
+    po.add_argument("--root", required=True)
+    po.add_argument("--index-dir", default=os.path.expanduser("~/.autogit/index"))
+    po.add_argument("--ignore-file")
+    po.add_argument("--max-bytes", type=int, default=0, help="size threshold (0 = none)")
+    po.add_argument("--extensions", default="", help="comma/space separated extensions")
+    po.add_argument("--action", choices=("skip", "store"), default="store")
+    po.add_argument("--store-dir", default=os.path.expanduser("~/.autogit/store"))
+    po.add_argument("--delta", help="targeted-staging delta file to keep in sync")
+    fm = sub.add_parser("fsmonitor", help="git core.fsmonitor hook (protocol v2)")
+    fm.add_argument("--root", default=".")
+    fm.add_argument("--index-dir", default=os.path.expanduser("~/.autogit/index"))
+    fm.add_argument("--ignore-file")
+    fm.add_argument("--trust-dir-mtime", action="store_true")
+    fm.add_argument("--full-every", type=int, default=3600,
+                    help="seconds between forced full refreshes")
+    fm.add_argument("version", type=int)
+    fm.add_argument("token", nargs="?", default="")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "fingerprint":
+        index_dir = None if args.no_index else args.index_dir
+        labels = list(args.dirs)
+        if args.watch_file:
+            labels += watch_labels(args.watch_file)
+        if not labels:
+            parser.error("fingerprint needs directories or --watch-file")
+        labelled = args.labels or bool(args.watch_file)
+        roots = [label.split("::", 1)[0] if labelled else label for label in labels]
+        results = fingerprint_many(roots, index_dir, args.ignore_file, args.trust_dir_mtime,
+                                   args.workers, mark=bool(args.delta_dir))
+        if args.delta_dir:
+            try:
+                write_deltas(args.delta_dir, results, args.delta_max)
+            except OSError as exc:
+                print(f"autogit_scan: cannot write deltas: {exc}", file=sys.stderr)
+        snapshots = snapshot_many(args.snapshot_dir, results) if args.snapshot_dir else {}
+        out: list[str] = []
+        for label, result in zip(labels, results):
+            if result is None:
+                out.append(f"{label} - [ ]" if labelled else "")
+                continue
+            digits, scan, us = result
+            line = f"{label} - [ {digits} ]" if labelled else digits
+            if args.stats:
+                line += f" {scan.files_seen} {scan.dirs_seen} {scan.dirs_read} {us}"
+                if args.snapshot_dir:
+                    line += " {} {}".format(*snapshots.get(scan.root, ("-", "-")))
+            out.append(line)
+        sys.stdout.write("\n".join(out) + "\n")
+    elif args.cmd == "policy":
+        extensions = {e.lower().lstrip(".") for e in re.split(r"[,\s]+", args.extensions) if e}
+        try:
+            actions = policy(args.root, args.index_dir, args.ignore_file, args.max_bytes,
+                             extensions, args.action, args.store_dir, args.delta)
+        except OSError as exc:
+            print(f"autogit_scan: policy failed for {args.root}: {exc}", file=sys.stderr)
+            return 1
+        for action, rel, size in actions:
+            print(f"{action}\t{size}\t{rel}")
+    elif args.cmd == "fsmonitor":
+        if args.version != 2:
+            return 1
+        token, paths = fsmonitor_query(args.root, args.token, args.index_dir, args.ignore_file,
+                                       args.trust_dir_mtime, args.full_every)
+        out = sys.stdout.buffer
+        out.write(token.encode("utf-8") + b"\0")
+        for p in paths:
+            out.write(p.encode("utf-8", "surrogateescape") + b"\0")
+        out.flush()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,607 @@
+#!/usr/bin/env python3
+# autogit_snapshot.py — deduplicated snapshot store for AutoSave
+#
+# autosave_dirwatch.sh only records a new 16-digit value when a watched
+# directory changes.  With SNAPSHOTS=1 (opt-in) every detected change also produces
+# an incremental snapshot of the root in a local content-addressed store
+# (~/.autogit/snapshots by default):
+#
+#   objects/xx/<digest>   file content in fixed 1 MiB chunks, BLAKE2b keyed
+#   trees/xx/<digest>     one JSON node per directory: files map to
+#                         [size, mtime_ns, inode, mode, [chunks]], subdirs
+#                         to [node digest, files, bytes] of their subtree
+#   roots/<key>/          root path, HEAD and one <id>.json record per snapshot
+#
+# Directory nodes form a Merkle tree, so a snapshot only writes the nodes on
+# the path from a changed file up to the root; every other subtree is the
+# previous snapshot's node.  Snapshots are taken inside the scan helper
+# (`autogit_scan.py fingerprint --snapshot-dir`), which already knows from
+# its change journal which paths moved since the previous snapshot and has
+# the fresh directory listings in memory.  Files are reused from the
+# previous snapshot when size, mtime and inode match, and only files that
+# changed are read, so the cost follows the changed bytes rather than the
+# size of the tree.  When the journal cannot bridge the gap (first snapshot,
+# rebuilt index) the whole tree is walked, still reusing unchanged files.
+#
+# Chunks already in the store are not written again.  Fixed-size chunks
+# dedupe appends and in-place edits; an insertion near the start of a large
+# file stores the rest of it again.  On Linux filesystems with reflinks
+# (btrfs, XFS) the source file is cloned first and chunks are cloned from
+# that copy, so no data is copied and a file rewritten mid-read cannot tear
+# the snapshot.  Without reflinks a file that changes while being read is
+# recorded with mtime 0, so the next snapshot reads it again.  `restore`
+# clones chunks back where possible and `--link` hardlinks single-chunk
+# files for read-only views.
+#
+# `prune` thins snapshots out (by default one per minute for an hour, one
+# per hour for a day, one per day for 30 days; the newest is always kept)
+# and removes unreferenced trees and chunks.  Writers hold the store lock
+# shared and the sweep holds it exclusively only after marking, so pruning
+# never stalls the 0.2 s detection cycle for long.
+
+import argparse
+import calendar
+import hashlib
+import json
+import os
+import shutil
+import stat
+import struct
+import sys
+import tempfile
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows Python has no fcntl
+    fcntl = None
+
+CHUNK_SIZE = 1 << 20
+DEFAULT_KEEP = "60:3600,3600:86400,86400:2592000"
+FICLONE = 0x40049409
+FICLONERANGE = 0x4020940D
+REFLINK = {"ok": sys.platform.startswith("linux") and fcntl is not None}
+
+
+# --- STORE --------------------------------------------------------------------
+def new_digest(data: bytes) -> str:
+    """Return the content address of a chunk or tree node."""
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+def object_path(store: str, kind: str, digest: str) -> str:
+    """Return the path of a chunk ("objects") or tree node ("trees")."""
+    return os.path.join(store, kind, digest[:2], digest)
+
+
+def root_dir(store: str, root: str) -> str:
+    """Return the directory holding a root's snapshot records."""
+    key = hashlib.sha1(root.encode("utf-8", "surrogateescape")).hexdigest()[:16]
+    return os.path.join(store, "roots", key)
+
+
+class StoreLock:
+    """Advisory store lock: shared for writers, exclusive for the sweep."""
+
+    def __init__(self, store: str, exclusive: bool = False):
+        self.path = os.path.join(store, "lock")
+        self.mode = fcntl.LOCK_EX if exclusive and fcntl else fcntl.LOCK_SH if fcntl else 0
+        self.fh = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.fh = open(self.path, "a")
+            fcntl.flock(self.fh, self.mode)
+        return self
+
+    def __exit__(self, *exc):
+        if self.fh:
+            self.fh.close()
+        return False
+
+
+class RootLock(StoreLock):
+    """Exclusive per-root lock, so one snapshotter at a time extends a root's history."""
+
+    def __init__(self, store: str, root: str):
+        super().__init__(store, exclusive=True)
+        self.path = os.path.join(root_dir(store, root), "lock")
+
+
+def reflink(src_fd: int, dst_fd: int, offset: int = 0, length: int = 0,
+            dest_offset: int = 0) -> bool:
+    """Clone a whole file (or a range of it) into dst_fd; False if unsupported."""
+    if not REFLINK["ok"]:
+        return False
+    try:
+        if offset == 0 and length == 0 and dest_offset == 0:
+            fcntl.ioctl(dst_fd, FICLONE, src_fd)
+        else:
+            fcntl.ioctl(dst_fd, FICLONERANGE,
+                        struct.pack("qQQQ", src_fd, offset, length, dest_offset))
+    except OSError:
+        REFLINK["ok"] = False
+        return False
+    return True
+
+
+def write_atomic(path: str, data: bytes, clone: tuple[int, int, int] | None = None,
+                 mode: int = 0o444) -> None:
+    """Write (or clone from (fd, offset, length)) a file via a temp file and rename."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp.")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            if clone is None or not reflink(clone[0], fh.fileno(), clone[1], clone[2]):
+                fh.write(data)
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def store_file(store: str, path: str) -> tuple[list | None, int]:
+    """Chunk one file into the store; return ([size, mtime, ino, mode, chunks], bytes written)."""
+    try:
+        fd = os.open(path, os.O_RDONLY | getattr(os, "O_NOFOLLOW", 0))
+    except OSError:
+        return None, 0
+    src, tmp, written = fd, None, 0
+    try:
+        st = os.fstat(fd)
+        if not stat.S_ISREG(st.st_mode):
+            return None, 0
+        if REFLINK["ok"]:
+            tmp_dir = os.path.join(store, "tmp")
+            os.makedirs(tmp_dir, exist_ok=True)
+            clone_fd, tmp = tempfile.mkstemp(dir=tmp_dir, prefix=".clone.")
+            if reflink(fd, clone_fd):
+                src = clone_fd
+                st = os.fstat(fd)
+            else:
+                os.close(clone_fd)
+        chunks: list[str] = []
+        offset = 0
+        while True:
+            data = os.pread(src, CHUNK_SIZE, offset)
+            if not data:
+                break
+            digest = new_digest(data)
+            dest = object_path(store, "objects", digest)
+            if not os.path.exists(dest):
+                write_atomic(dest, data, (src, offset, len(data)) if src != fd else None)
+                written += len(data)
+            chunks.append(digest)
+            offset += len(data)
+        after = os.fstat(fd)
+        torn = src == fd and (after.st_size, after.st_mtime_ns) != (offset, st.st_mtime_ns)
+        return [offset, 0 if torn else st.st_mtime_ns, st.st_ino, stat.S_IMODE(st.st_mode),
+                chunks], written
+    finally:
+        if src != fd:
+            os.close(src)
+        os.close(fd)
+        if tmp:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+
+def read_tree(store: str, digest: str | None) -> dict:
+    """Load a directory node (an empty one for None)."""
+    if not digest:
+        return {"f": {}, "d": {}}
+    with open(object_path(store, "trees", digest), "rb") as fh:
+        return json.loads(fh.read())
+
+
+def write_tree(store: str, node: dict) -> str:
+    """Store a directory node and return its digest."""
+    data = json.dumps(node, sort_keys=True, separators=(",", ":")).encode("ascii")
+    digest = new_digest(data)
+    path = object_path(store, "trees", digest)
+    if not os.path.exists(path):
+        write_atomic(path, data)
+    return digest
+
+
+# --- SNAPSHOTS ----------------------------------------------------------------
+def read_record(store: str, root: str, snap_id: str) -> dict:
+    """Load one snapshot record of a root."""
+    with open(os.path.join(root_dir(store, root), f"{snap_id}.json"), "r",
+              encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def head_record(store: str, root: str) -> dict | None:
+    """Return the newest snapshot record of a root, or None."""
+    try:
+        with open(os.path.join(root_dir(store, root), "HEAD"), "r", encoding="utf-8") as fh:
+            return read_record(store, root, fh.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def list_records(store: str, root: str) -> list[str]:
+    """Return a root's snapshot ids, oldest first."""
+    try:
+        names = os.listdir(root_dir(store, root))
+    except OSError:
+        return []
+    return sorted(n[:-5] for n in names if n.endswith(".json"))
+
+
+def list_roots(store: str) -> list[str]:
+    """Return every root that has a snapshot directory in the store."""
+    roots: list[str] = []
+    try:
+        keys = sorted(os.listdir(os.path.join(store, "roots")))
+    except OSError:
+        return roots
+    for key in keys:
+        try:
+            with open(os.path.join(store, "roots", key, "root"), "r", encoding="utf-8",
+                      errors="surrogateescape") as fh:
+                roots.append(fh.read().rstrip("\n"))
+        except OSError:
+            continue
+    return roots
+
+
+def affected_dirs(paths: set[str]) -> set[str]:
+    """Return every directory (root-relative) on the path to a changed entry."""
+    out: set[str] = set()
+    for p in paths:
+        rel = p.rstrip("/")
+        while rel:
+            rel = rel.rpartition("/")[0]
+            if rel in out:
+                break
+            out.add(rel)
+        out.add("")
+    return out
+
+
+class Builder:
+    """Build the tree of one snapshot from a scan's directory listings."""
+
+    def __init__(self, store: str, root: str, dirs: dict, affected: set[str] | None):
+        self.store = store
+        self.root = root
+        self.dirs = dirs
+        self.affected = affected
+        self.written = 0
+
+    def build(self, rel: str, old_digest: str | None) -> list | None:
+        """Return [digest, files, bytes] of a directory, reusing unaffected subtrees."""
+        listing = self.dirs.get(rel)
+        if listing is None:
+            return None
+        old = read_tree(self.store, old_digest)
+        path = os.path.join(self.root, rel) if rel else self.root
+        node: dict = {"f": {}, "d": {}}
+        files = size = 0
+        for name in listing["f"]:
+            prev = old["f"].get(name)
+            try:
+                st = os.lstat(os.path.join(path, name))
+            except OSError:
+                continue
+            if prev and prev[:3] == [st.st_size, st.st_mtime_ns, st.st_ino]:
+                entry = prev
+            else:
+                entry, written = store_file(self.store, os.path.join(path, name))
+                if entry is None:
+                    continue
+                self.written += written
+            node["f"][name] = entry
+            files += 1
+            size += entry[0]
+        for name in listing["d"]:
+            child_rel = f"{rel}/{name}" if rel else name
+            child = old["d"].get(name)
+            if not child or self.affected is None or child_rel in self.affected:
+                child = self.build(child_rel, child[0] if child else None)
+            if child:
+                node["d"][name] = child
+                files += child[1]
+                size += child[2]
+        return [write_tree(self.store, node), files, size]
+
+
+def snapshot_root(store: str, root: str, dirs: dict, journal: dict | None,
+                  changed: bool = True) -> dict | None:
+    """Snapshot one scanned root; return the new record, or None if nothing changed.
+
+    `dirs` is the scan index ({rel: {"f": {name: (size, mtime)}, "d": [names]}})
+    and `journal` its change journal, used to find the paths that moved
+    since the previous snapshot.  An unchanged scan only snapshots a root
+    that has none yet.
+    """
+    root = os.path.abspath(root)
+    if not changed and os.path.exists(os.path.join(root_dir(store, root), "HEAD")):
+        return None
+    # HEAD is read under the root lock, so concurrent snapshotters of the
+    # same root (sharded daemons, a manual run) chain instead of forking.
+    with StoreLock(store), RootLock(store, root):
+        head = head_record(store, root)
+        affected = None
+        if head and journal and head.get("journal", [None])[0] == journal["id"] \
+                and journal["floor"] <= head["journal"][1]:
+            if journal["seq"] == head["journal"][1]:
+                return None
+            affected = affected_dirs({p for seq, p in journal["entries"] if seq > head["journal"][1]})
+        builder = Builder(store, root, dirs, affected)
+        built = builder.build("", head["tree"] if head else None)
+        if built is None or (head and built[0] == head["tree"]):
+            return None
+        now = time.time()
+        snap_id = time.strftime("%Y%m%dT%H%M%S", time.gmtime(now)) + f".{int(now % 1 * 1e6):06d}Z"
+        record = {"id": snap_id, "root": root, "time": now, "tree": built[0],
+                  "files": built[1], "bytes": built[2], "new_bytes": builder.written,
+                  "parent": head["id"] if head else None, "full": affected is None,
+                  "journal": [journal["id"], journal["seq"]] if journal else [None, 0]}
+        rdir = root_dir(store, root)
+        if head is None:
+            write_atomic(os.path.join(rdir, "root"),
+                         (root + "\n").encode("utf-8", "surrogateescape"), mode=0o644)
+        write_atomic(os.path.join(rdir, f"{snap_id}.json"),
+                     json.dumps(record, sort_keys=True).encode("utf-8"), mode=0o644)
+        write_atomic(os.path.join(rdir, "HEAD"), snap_id.encode("ascii") + b"\n", mode=0o644)
+    return record
+
+
+# --- RETENTION ----------------------------------------------------------------
+def parse_keep(spec: str) -> list[tuple[int, int]]:
+    """Parse "interval:horizon,..." (seconds) into pairs ordered by horizon."""
+    rules: list[tuple[int, int]] = []
+    for part in spec.replace(" ", "").split(","):
+        if not part:
+            continue
+        interval, _, horizon = part.partition(":")
+        rules.append((int(interval), int(horizon)))
+    if not rules or any(i <= 0 or h <= 0 for i, h in rules):
+        raise ValueError(f"invalid retention schedule: {spec!r}")
+    return sorted(rules, key=lambda rule: rule[1])
+
+
+def snapshot_time(snap_id: str) -> float:
+    """Return the epoch time encoded in a snapshot id."""
+    return calendar.timegm(time.strptime(snap_id[:15], "%Y%m%dT%H%M%S")) + float(snap_id[15:-1])
+
+
+def thin(ids: list[str], rules: list[tuple[int, int]], now: float) -> set[str]:
+    """Return the ids a retention schedule keeps: the newest per bucket, and the newest overall."""
+    keep: set[str] = set()
+    seen: set[tuple[int, int]] = set()
+    for snap_id in sorted(ids, reverse=True):
+        when = snapshot_time(snap_id)
+        for n, (interval, horizon) in enumerate(rules):
+            if now - when <= horizon:
+                if (n, int(when // interval)) not in seen:
+                    seen.add((n, int(when // interval)))
+                    keep.add(snap_id)
+                break
+    if ids:
+        keep.add(max(ids))
+    return keep
+
+
+def mark_tree(store: str, digest: str, trees: set[str], chunks: set[str]) -> None:
+    """Add a tree and everything it references to the marked sets."""
+    stack = [digest]
+    while stack:
+        digest = stack.pop()
+        if digest in trees:
+            continue
+        trees.add(digest)
+        node = read_tree(store, digest)
+        for entry in node["f"].values():
+            chunks.update(entry[4])
+        stack.extend(child[0] for child in node["d"].values())
+
+
+def sweep(store: str, kind: str, marked: set[str]) -> tuple[int, int]:
+    """Delete unmarked files of one object kind; return (count, bytes)."""
+    count = size = 0
+    base = os.path.join(store, kind)
+    try:
+        prefixes = os.listdir(base)
+    except OSError:
+        return 0, 0
+    for prefix in prefixes:
+        with os.scandir(os.path.join(base, prefix)) as it:
+            for entry in it:
+                if entry.name in marked:
+                    continue
+                try:
+                    size += entry.stat(follow_symlinks=False).st_size
+                    os.unlink(entry.path)
+                    count += 1
+                except OSError:
+                    continue
+    return count, size
+
+
+def prune(store: str, rules: list[tuple[int, int]], now: float | None = None) -> tuple:
+    """Apply retention and sweep unreferenced data.
+
+    Returns (snapshots, trees, chunks, bytes) removed.  The mark phase runs
+    without the exclusive lock; snapshots recorded meanwhile are marked
+    again under it before anything is deleted.
+    """
+    now = time.time() if now is None else now
+    dropped = 0
+    with StoreLock(store, exclusive=True):
+        for root in list_roots(store):
+            ids = list_records(store, root)
+            keep = thin(ids, rules, now)
+            for snap_id in ids:
+                if snap_id not in keep:
+                    os.unlink(os.path.join(root_dir(store, root), f"{snap_id}.json"))
+                    dropped += 1
+    trees: set[str] = set()
+    chunks: set[str] = set()
+    marked: set[tuple[str, str]] = set()
+
+    def mark_records() -> None:
+        for root in list_roots(store):
+            for snap_id in list_records(store, root):
+                if (root, snap_id) in marked:
+                    continue
+                marked.add((root, snap_id))
+                mark_tree(store, read_record(store, root, snap_id)["tree"], trees, chunks)
+
+    mark_records()
+    with StoreLock(store, exclusive=True):
+        mark_records()
+        tree_count, _ = sweep(store, "trees", trees)
+        chunk_count, freed = sweep(store, "objects", chunks)
+        shutil.rmtree(os.path.join(store, "tmp"), ignore_errors=True)
+    return dropped, tree_count, chunk_count, freed
+
+
+# --- RESTORE ------------------------------------------------------------------
+def resolve(store: str, tree: str, subpath: str) -> tuple[str, object]:
+    """Resolve a path inside a snapshot to ("d", node digest) or ("f", file entry)."""
+    kind, value = "d", tree
+    for part in (p for p in subpath.split("/") if p):
+        node = read_tree(store, value) if kind == "d" else {"f": {}, "d": {}}
+        if part in node["d"]:
+            kind, value = "d", node["d"][part][0]
+        elif part in node["f"]:
+            kind, value = "f", node["f"][part]
+        else:
+            raise ValueError(f"not in snapshot: {subpath}")
+    return kind, value
+
+
+def restore_file(store: str, entry: list, dest: str, link: bool = False) -> None:
+    """Recreate one file from its chunks, replacing dest atomically."""
+    _size, mtime, _ino, mode, chunks = entry
+    directory = os.path.dirname(dest) or "."
+    if link and len(chunks) == 1:
+        tmp = os.path.join(directory, f".autogit-restore.{os.getpid()}")
+        try:
+            os.link(object_path(store, "objects", chunks[0]), tmp)
+            os.replace(tmp, dest)
+            return
+        except OSError:
+            pass
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".autogit-restore.")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            offset = 0
+            for digest in chunks:
+                with open(object_path(store, "objects", digest), "rb") as src:
+                    length = os.fstat(src.fileno()).st_size
+                    out.flush()
+                    if not reflink(src.fileno(), out.fileno(), 0, 0, offset):
+                        out.seek(offset)
+                        shutil.copyfileobj(src, out)
+                    offset += length
+            out.truncate(offset)
+        os.chmod(tmp, mode)
+        if mtime:
+            os.utime(tmp, ns=(mtime, mtime))
+        os.replace(tmp, dest)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def restore_tree(store: str, digest: str, dest: str, link: bool = False) -> int:
+    """Recreate a directory node below dest; return the number of files written."""
+    os.makedirs(dest, exist_ok=True)
+    node = read_tree(store, digest)
+    count = 0
+    for name, entry in node["f"].items():
+        restore_file(store, entry, os.path.join(dest, name), link)
+        count += 1
+    for name, child in node["d"].items():
+        count += restore_tree(store, child[0], os.path.join(dest, name), link)
+    return count
+
+
+def restore(store: str, root: str, snap_id: str | None, dest: str, subpath: str = "",
+            link: bool = False) -> int:
+    """Restore a snapshot (or one path in it) to dest; return files written."""
+    root = os.path.abspath(root)
+    record = read_record(store, root, snap_id) if snap_id else head_record(store, root)
+    if record is None:
+        raise ValueError(f"no snapshots of {root}")
+    kind, value = resolve(store, record["tree"], subpath)
+    if kind == "f":
+        os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+        restore_file(store, value, dest, link)
+        return 1
+    return restore_tree(store, value, dest, link)
+
+
+# --- CLI ----------------------------------------------------------------------
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="AutoSave snapshot store")
+    parser.add_argument("--store", default=os.path.expanduser("~/.autogit/snapshots"))
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sn = sub.add_parser("snapshot", help="scan roots and snapshot any that changed")
+    sn.add_argument("roots", nargs="+")
+    sn.add_argument("--index-dir", default=os.path.expanduser("~/.autogit/index"))
+    sn.add_argument("--ignore-file")
+    ls = sub.add_parser("list", help="list snapshotted roots, or the snapshots of one root")
+    ls.add_argument("--root")
+    pr = sub.add_parser("prune", help="thin out old snapshots and remove unreferenced data")
+    pr.add_argument("--keep", default=DEFAULT_KEEP,
+                    help="interval:horizon pairs in seconds (default: %(default)s)")
+    rs = sub.add_parser("restore", help="restore a snapshot or a path inside it")
+    rs.add_argument("--root", required=True)
+    rs.add_argument("--snapshot", help="snapshot id (default: newest)")
+    rs.add_argument("--path", default="", help="root-relative path to restore")
+    rs.add_argument("--dest", required=True)
+    rs.add_argument("--link", action="store_true",
+                    help="hardlink single-chunk files (read-only view)")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.cmd == "snapshot":
+            import autogit_scan
+            for root in args.roots:
+                _, scan, journal = autogit_scan.scan_root(root, args.index_dir, args.ignore_file)
+                record = snapshot_root(args.store, root, scan.new, journal)
+                if record:
+                    print(f"{record['id']}\t{record['files']}\t{record['bytes']}"
+                          f"\t{record['new_bytes']}\t{record['root']}")
+        elif args.cmd == "list" and args.root:
+            root = os.path.abspath(args.root)
+            for snap_id in list_records(args.store, root):
+                record = read_record(args.store, root, snap_id)
+                print(f"{snap_id}\t{record['files']}\t{record['bytes']}\t{record['new_bytes']}")
+        elif args.cmd == "list":
+            for root in list_roots(args.store):
+                ids = list_records(args.store, root)
+                print(f"{root}\t{len(ids)}\t{ids[-1] if ids else '-'}")
+        elif args.cmd == "prune":
+            dropped, trees, chunks, freed = prune(args.store, parse_keep(args.keep))
+            if dropped or trees or chunks:
+                print(f"pruned {dropped} snapshot(s), removed {trees} tree(s) and "
+                      f"{chunks} chunk(s), freed {freed} bytes")
+        elif args.cmd == "restore":
+            count = restore(args.store, args.root, args.snapshot, args.dest, args.path,
+                            args.link)
+            print(f"restored {count} file(s) to {args.dest}")
+    except (OSError, ValueError, KeyError) as exc:
+        print(f"autogit_snapshot: {args.cmd} failed: {exc}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -37,6 +37,11 @@ PROFILE_DIR="$LINUX_DIR/profiles"
 GIT_SCRIPT_NAME="autogit.sh"
 GIT_WRAPPER_NAME="autogit_dirwatch.sh"
 SAVE_SCRIPT_NAME="autosave_dirwatch.sh"
+SCAN_HELPER_NAME="autogit_scan.py"
+METRICS_HELPER_NAME="autogit_metrics.py"
+COMPACT_HELPER_NAME="autogit_compact.py"
+SNAPSHOT_HELPER_NAME="autogit_snapshot.py"
+LOG_LIB_NAME="autogit_log.sh"
 
 GIT_SERVICE_FILE="$SERVICE_DIR/autogit.service"
 SAVE_SERVICE_FILE="$SERVICE_DIR/autosave.service"
@@ -161,13 +166,25 @@ done
 require_file "$CORE_DIR/$GIT_SCRIPT_NAME"
 require_file "$WRAPPER_DIR/$GIT_WRAPPER_NAME"
 require_file "$WRAPPER_DIR/$SAVE_SCRIPT_NAME"
+require_file "$CORE_DIR/$SCAN_HELPER_NAME"
+require_file "$CORE_DIR/$METRICS_HELPER_NAME"
+require_file "$CORE_DIR/$COMPACT_HELPER_NAME"
+require_file "$CORE_DIR/$SNAPSHOT_HELPER_NAME"
+require_file "$CORE_DIR/$LOG_LIB_NAME"
 require_file "$SYSTEMD_DIR/autogit.service.tpl"
 require_file "$SYSTEMD_DIR/autosave.service.tpl"
 
 cp "$CORE_DIR/$GIT_SCRIPT_NAME" "$BIN_DIR/$GIT_SCRIPT_NAME"
 cp "$WRAPPER_DIR/$GIT_WRAPPER_NAME" "$BIN_DIR/$GIT_WRAPPER_NAME"
 cp "$WRAPPER_DIR/$SAVE_SCRIPT_NAME" "$BIN_DIR/$SAVE_SCRIPT_NAME"
-chmod +x "$BIN_DIR/$GIT_SCRIPT_NAME" "$BIN_DIR/$GIT_WRAPPER_NAME" "$BIN_DIR/$SAVE_SCRIPT_NAME"
+cp "$CORE_DIR/$SCAN_HELPER_NAME" "$BIN_DIR/$SCAN_HELPER_NAME"
+cp "$CORE_DIR/$METRICS_HELPER_NAME" "$BIN_DIR/$METRICS_HELPER_NAME"
+cp "$CORE_DIR/$COMPACT_HELPER_NAME" "$BIN_DIR/$COMPACT_HELPER_NAME"
+cp "$CORE_DIR/$SNAPSHOT_HELPER_NAME" "$BIN_DIR/$SNAPSHOT_HELPER_NAME"
+cp "$CORE_DIR/$LOG_LIB_NAME" "$BIN_DIR/$LOG_LIB_NAME"
+chmod +x "$BIN_DIR/$GIT_SCRIPT_NAME" "$BIN_DIR/$GIT_WRAPPER_NAME" "$BIN_DIR/$SAVE_SCRIPT_NAME" \
+  "$BIN_DIR/$SCAN_HELPER_NAME" "$BIN_DIR/$METRICS_HELPER_NAME" "$BIN_DIR/$COMPACT_HELPER_NAME" \
+  "$BIN_DIR/$SNAPSHOT_HELPER_NAME"
 
 cat > "$AUTOGIT_EXECUTABLE" <<EOF
 #!/usr/bin/env bash
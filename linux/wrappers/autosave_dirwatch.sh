@@ -6,9 +6,10 @@
 # derived from directory contents) but performs no Git operations.  The
 # script reads a list of watched directories from a main file,
 # computes a new hash for each directory, and writes an updated clone
-# file.  If any directory’s hash has changed, the script replaces the
-# entire main file with the clone file so the main list always
-# reflects the latest state.
+# file.  If any directory’s hash has changed, the new hashes are merged
+# into the main file under a lock so the main list always reflects the
+# latest state.  With SNAPSHOTS=1 (off by default) every change is also
+# saved as an incremental, deduplicated snapshot (see autogit_snapshot.py).
 
 set -Eeuo pipefail
 IFS=$'\n\t'
@@ -19,15 +20,73 @@ IFS=$'\n\t'
 # Adjust these variables via environment overrides if you want to use
 # different locations.  WATCH_FILE holds the primary list of watched
 # directories and their last-known hashes.  CLONE_FILE holds the
-# current cycle’s complete snapshot.  On each cycle the script will
-# write a temporary clone file and, if any hash mismatch is detected,
-# will atomically replace WATCH_FILE with the updated clone.
+# current cycle’s complete snapshot.  Changed hashes are merged into
+# WATCH_FILE in one atomic rewrite per cycle while holding
+# WATCH_LOCK_FILE, the same flock the GUI takes, so concurrent edits are
+# never lost.  Idle cycles write nothing.
 #
 WATCH_FILE="${WATCH_FILE:-$HOME/.autogit/autosave_dirs_main.txt}"
+WATCH_LOCK_FILE="${WATCH_LOCK_FILE:-${WATCH_FILE}.lock}"
 CLONE_FILE="${CLONE_FILE:-$HOME/.autogit/autosave_dirs_clone.txt}"
 LOG_FILE="${LOG_FILE:-$HOME/.autogit/dirwatch.log}"
 PID_FILE="${PID_FILE:-$HOME/.autogit/autosave.pid}"
 INTERVAL="${INTERVAL:-.2}"  # seconds between detection cycles
+# Incremental scan index shared with autogit.sh (see autogit_scan.py).
+SCAN_HELPER="${SCAN_HELPER:-$(cd "$(dirname "$0")" && pwd)/autogit_scan.py}"
+INDEX_DIR="${INDEX_DIR:-$HOME/.autogit/index}"
+SCAN_TRUST_DIR_MTIME="${SCAN_TRUST_DIR_MTIME:-0}"
+SCAN_WORKERS="${SCAN_WORKERS:-4}"   # roots scanned concurrently per cycle
+# Event mode (run-events).  WATCH_MODE=events makes `start` launch it.
+# Bursts of inotify events are coalesced per root until EVENT_DEBOUNCE
+# seconds pass without new events (or EVENT_MAX_DELAY since the first one),
+# and a full polling cycle still runs every EVENT_RESCAN seconds as a
+# safety net for events the kernel dropped.
+WATCH_MODE="${WATCH_MODE:-poll}"
+EVENT_DEBOUNCE="${EVENT_DEBOUNCE:-0.3}"
+EVENT_MAX_DELAY="${EVENT_MAX_DELAY:-2}"
+EVENT_RESCAN="${EVENT_RESCAN:-300}"
+# Snapshots (see autogit_snapshot.py), opt-in since the store grows with
+# every change.  With SNAPSHOTS=1, roots whose scan saw changes are
+# snapshotted into SNAPSHOT_DIR by the scan helper itself, and every
+# SNAPSHOT_PRUNE_INTERVAL seconds a background prune thins them out per
+# SNAPSHOT_KEEP (interval:horizon pairs in seconds: one per minute for an
+# hour, one per hour for a day, one per day for 30 days by default).
+SNAPSHOTS="${SNAPSHOTS:-0}"
+SNAPSHOT_HELPER="${SNAPSHOT_HELPER:-$(cd "$(dirname "$0")" && pwd)/autogit_snapshot.py}"
+SNAPSHOT_DIR="${SNAPSHOT_DIR:-$HOME/.autogit/snapshots}"
+SNAPSHOT_KEEP="${SNAPSHOT_KEEP:-60:3600,3600:86400,86400:2592000}"
+SNAPSHOT_PRUNE_INTERVAL="${SNAPSHOT_PRUNE_INTERVAL:-300}"
+# Cycle metrics (see autogit_metrics.py), buffered in memory and merged into
+# METRICS_DIR/autosave.{json,prom} every METRICS_FLUSH_INTERVAL seconds.
+METRICS="${METRICS:-1}"
+METRICS_HELPER="${METRICS_HELPER:-$(cd "$(dirname "$0")" && pwd)/autogit_metrics.py}"
+METRICS_DIR="${METRICS_DIR:-$HOME/.autogit/metrics}"
+METRICS_FLUSH_INTERVAL="${METRICS_FLUSH_INTERVAL:-15}"
+# Logging (see autogit_log.sh): lines are batched every LOG_FLUSH_INTERVAL
+# seconds, repeated idle lines are summarised every LOG_SUMMARY_INTERVAL
+# seconds, and the log rotates at LOG_MAX_BYTES keeping LOG_KEEP files for at
+# most LOG_MAX_AGE_DAYS days. LOG_FORMAT=json writes JSON lines.
+LOG_FORMAT="${LOG_FORMAT:-text}"
+LOG_FLUSH_INTERVAL="${LOG_FLUSH_INTERVAL:-5}"
+LOG_SUMMARY_INTERVAL="${LOG_SUMMARY_INTERVAL:-600}"
+LOG_MAX_BYTES="${LOG_MAX_BYTES:-5242880}"
+LOG_KEEP="${LOG_KEEP:-5}"
+LOG_MAX_AGE_DAYS="${LOG_MAX_AGE_DAYS:-30}"
+AUTOGIT_LOG_LIB="${AUTOGIT_LOG_LIB:-$(cd "$(dirname "$0")" && pwd)/autogit_log.sh}"
+LOG_TAG="autosave"
+if [[ -f "$AUTOGIT_LOG_LIB" ]]; then
+  # shellcheck source=autogit_log.sh
+  source "$AUTOGIT_LOG_LIB"
+else
+  # Minimal unbuffered fallback when the library is not installed alongside.
+  log_msg() {
+    local ts; printf -v ts '%(%Y-%m-%d %H:%M:%S)T' -1
+    printf '%s %s\n' "$ts" "$2" >> "$LOG_FILE"
+  }
+  log_idle() { log_msg "$@"; }
+  log_tick() { :; }
+  log_close() { :; }
+fi
 SCRIPT_NAME="$(basename "$0")"
 
 # ---------------------------------------------------------------------------
@@ -35,12 +94,19 @@ SCRIPT_NAME="$(basename "$0")"
 # directories are created as needed.  An empty main file is created if
 # none exists.
 ensure_paths() {
+  local f
   mkdir -p "$(dirname "$WATCH_FILE")"
-  touch "$WATCH_FILE" "$CLONE_FILE" "$LOG_FILE"
+  # Create missing files only; touching would bump mtimes every start
+  for f in "$WATCH_FILE" "$CLONE_FILE" "$LOG_FILE"; do
+    [[ -e "$f" ]] || : > "$f"
+  done
 }
 
+# Messages carry their level as a "[LEVEL] " prefix.
 log_line() {
-  printf '%s %s\n' "$(date '+%Y-%m-%d %H:%M:%S')" "$1" >> "$LOG_FILE"
+  local level="INFO"
+  [[ "$1" =~ ^\[([A-Z]+)\] ]] && level="${BASH_REMATCH[1]}"
+  log_msg "$level" "$1"
 }
 
 is_process_running() {
@@ -70,14 +136,22 @@ clear_pid() {
 }
 
 # ---------------------------------------------------------------------------
-# Compute a deterministic 16-digit integer based on directory metadata.
-# This function hashes the size and mtime of all files under the
-# directory (excluding any .git folder), produces a SHA-256, encodes
-# it with base64, extracts digits, and pads/truncates to 16 digits.
+# Compute deterministic 16-digit integers based on directory metadata.
+# When python3 and autogit_scan.py are available, all roots of a cycle are
+# fingerprinted by one helper invocation from the incremental scan index,
+# which skips re-reading unchanged directories and survives restarts.
+# Otherwise (no python3 or helper at all) calc_int_for_dir hashes the relative path, size and mtime of
+# all files under the directory (excluding any .git folder), produces a
+# SHA-256, encodes it with base64, extracts digits, and pads/truncates to
+# 16 digits.
+have_scan_helper() {
+  [[ -f "$SCAN_HELPER" ]] && command -v python3 >/dev/null 2>&1
+}
+
 calc_int_for_dir() {
   local dir="$1"
   local raw digits
-  raw="$(find "$dir" -type f -not -path '*/.git/*' -printf '%s %T@ ' 2>/dev/null | sha256sum | base64 || true)"
+  raw="$(find "$dir" -type f -not -path '*/.git/*' -printf '%P %s %T@\n' 2>/dev/null | sort | sha256sum | base64 || true)"
   digits="$(printf '%s' "$raw" | tr -dc '0-9' | head -c 16)"
   while [ "${#digits}" -lt 16 ]; do
     digits="0$digits"
@@ -85,36 +159,221 @@ calc_int_for_dir() {
   printf '%s\n' "$digits"
 }
 
+# Fill SCAN_RESULTS[i] with "<16 digits> [<files> <dirs> <dirs read>] <us>
+# [<snapshot us> <snapshot bytes>]" for every directory in SCAN_DIRS, in
+# order.  The snapshot fields are "-" when no snapshot was taken.
+scan_dirs() {
+  local out=() line rest dir start
+  SCAN_RESULTS=()
+  [[ "${#SCAN_DIRS[@]}" -gt 0 ]] || return 0
+  if have_scan_helper; then
+    local helper_args=(fingerprint --labels --stats --workers "$SCAN_WORKERS" --index-dir "$INDEX_DIR")
+    [[ "$SCAN_TRUST_DIR_MTIME" == "1" ]] && helper_args+=(--trust-dir-mtime)
+    [[ "$SNAPSHOTS" == "1" ]] && helper_args+=(--snapshot-dir "$SNAPSHOT_DIR")
+    mapfile -t out < <(python3 "$SCAN_HELPER" "${helper_args[@]}" "${SCAN_DIRS[@]}" 2>>"$LOG_FILE" || true)
+    # find would produce different digits, so a root the helper did not
+    # report gets an empty result and keeps its stored value.
+    local -A reported=()
+    for line in "${out[@]}"; do
+      rest="${line##* - \[ }"
+      dir="${line%% - \[ *}"
+      [[ -n "$dir" && "$rest" == *" ] "* ]] && reported["$dir"]="${rest%% ]*} ${rest#* ] }"
+    done
+    for dir in "${SCAN_DIRS[@]}"; do
+      SCAN_RESULTS+=("${reported[$dir]:-}")
+    done
+    [[ "${#out[@]}" -eq "${#SCAN_DIRS[@]}" ]] ||
+      log_line "[WARN] Scan helper reported ${#out[@]} of ${#SCAN_DIRS[@]} roots; the rest keep their stored values"
+    return 0
+  fi
+  for dir in "${SCAN_DIRS[@]}"; do
+    now_us; start="$NOW_US"
+    line="$(calc_int_for_dir "$dir")"
+    now_us
+    SCAN_RESULTS+=("$line $(( NOW_US - start ))")
+  done
+}
+
+# ---------------------------------------------------------------------------
+# Metrics.  metric() appends one observation line for autogit_metrics.py
+# to METRICS_BUF; metrics_flush hands the buffer over at most once per
+# METRICS_FLUSH_INTERVAL seconds so fast polling stays cheap.
+METRICS_BUF=""
+METRICS_FLUSHED_AT=0
+
+# Set NOW_US to microseconds since the epoch without forking.
+now_us() {
+  NOW_US="${EPOCHREALTIME/[.,]/}"
+  [[ -n "$NOW_US" ]] || NOW_US="$(date +%s%6N)"
+}
+
+us_to_seconds() {
+  printf -v "$1" '%d.%06d' $(( $2 / 1000000 )) $(( $2 % 1000000 ))
+}
+
+metric() {
+  [[ "$METRICS" == "1" ]] || return 0
+  local IFS=$'\t'
+  METRICS_BUF+="$*"$'\n'
+}
+
+metrics_flush() {
+  local force="${1:-0}" now
+  [[ "$METRICS" == "1" && -n "$METRICS_BUF" ]] || return 0
+  printf -v now '%(%s)T' -1
+  [[ "$force" == "1" ]] || (( now - METRICS_FLUSHED_AT >= METRICS_FLUSH_INTERVAL )) || return 0
+  METRICS_FLUSHED_AT="$now"
+  if [[ -f "$METRICS_HELPER" ]] && command -v python3 >/dev/null 2>&1; then
+    printf '%s' "$METRICS_BUF" | python3 "$METRICS_HELPER" record --daemon autosave \
+      --state "$METRICS_DIR/autosave.json" --prom "$METRICS_DIR/autosave.prom" 2>>"$LOG_FILE" ||
+      log_line "[WARN] Metrics flush failed"
+  fi
+  METRICS_BUF=""
+}
+
+# record_scan_metrics <dir> <digits> "[<files> <dirs> <dirs read>] <us> [<snap us> <snap bytes>]"
+record_scan_metrics() {
+  local dir="$1" digits="$2" secs files dirs read_dirs us snap_us snap_bytes
+  IFS=' ' read -r files dirs read_dirs us snap_us snap_bytes <<< "$3"
+  [[ -z "$us" ]] && { us="$files"; files=""; read_dirs=""; }
+  if [[ "$snap_us" =~ ^[0-9]+$ ]]; then
+    us_to_seconds secs "$snap_us"
+    metric h autogit_snapshot_duration_seconds "$secs" "root=$dir"
+    metric c autogit_snapshots_total 1 "root=$dir"
+    metric c autogit_snapshot_bytes_total "$snap_bytes" "root=$dir"
+    log_line "[SNAPSHOT] $dir ($snap_bytes new bytes in ${secs}s)"
+  fi
+  us_to_seconds secs "$us"
+  metric h autogit_scan_duration_seconds "$secs" "root=$dir"
+  if [[ -n "$read_dirs" ]]; then
+    metric g autogit_scan_files "$files" "root=$dir"
+    metric g autogit_scan_dirs "$dirs" "root=$dir"
+    metric g autogit_scan_dirs_read "$read_dirs" "root=$dir"
+  fi
+  metric i autogit_root_fingerprint "$digits" "root=$dir"
+}
+
 # ---------------------------------------------------------------------------
-# Write a line to the new clone snapshot.  Called by single_cycle().
+# Thin out old snapshots in the background at most every
+# SNAPSHOT_PRUNE_INTERVAL seconds.  The prune only holds the store lock
+# exclusively for its sweep, so cycles keep snapshotting meanwhile.
+SNAPSHOT_PRUNED_AT=0
+SNAPSHOT_PRUNE_PID=""
+
+snapshot_prune_if_due() {
+  local now
+  [[ "$SNAPSHOTS" == "1" && -f "$SNAPSHOT_HELPER" ]] || return 0
+  printf -v now '%(%s)T' -1
+  (( now - SNAPSHOT_PRUNED_AT >= SNAPSHOT_PRUNE_INTERVAL )) || return 0
+  [[ -n "$SNAPSHOT_PRUNE_PID" ]] && kill -0 "$SNAPSHOT_PRUNE_PID" 2>/dev/null && return 0
+  command -v python3 >/dev/null 2>&1 || return 0
+  SNAPSHOT_PRUNED_AT="$now"
+  (
+    out="$(python3 "$SNAPSHOT_HELPER" --store "$SNAPSHOT_DIR" prune --keep "$SNAPSHOT_KEEP" 2>>"$LOG_FILE")" ||
+      { log_line "[WARN] Snapshot prune failed"; exit 0; }
+    [[ -z "$out" ]] || log_line "[SNAPSHOT] $out"
+  ) &
+  SNAPSHOT_PRUNE_PID=$!
+}
+
+# Snapshots are taken by the scan helper, so the find fallback takes none.
+warn_if_no_snapshots() {
+  [[ "$SNAPSHOTS" == "1" ]] || return 0
+  have_scan_helper || log_line "[WARN] Snapshots need python3 and $SCAN_HELPER; none will be taken"
+}
+
+# ---------------------------------------------------------------------------
+# Append a line to the in-memory clone snapshot.  Called by single_cycle().
+CLONE_CONTENT=""
+LAST_CLONE_CONTENT=""
+LAST_CLONE_LOADED=0
+declare -A MAIN_UPDATES=()
+
 update_clone_line() {
   local dir="$1" new_int="$2"
-  printf '%s - [ %s ]\n' "$dir" "$new_int" >> "$CLONE_TMP"
+  CLONE_CONTENT+="${dir} - [ ${new_int} ]"$'\n'
 }
 
 # ---------------------------------------------------------------------------
-# Determine whether the main file differs from the new clone.  If any
-# difference exists, atomically replace the main file with the clone
-# snapshot.  This ensures the main file always reflects the current
-# state without partial updates.
-update_main_if_needed() {
-  # If main and clone are identical, do nothing
-  if cmp -s "$CLONE_TMP" "$WATCH_FILE"; then
+# Write CLONE_FILE only when the snapshot differs from the last one.
+write_clone_if_changed() {
+  if [[ "$LAST_CLONE_LOADED" -eq 0 ]]; then
+    [[ -f "$CLONE_FILE" ]] && LAST_CLONE_CONTENT="$(< "$CLONE_FILE")"$'\n'
+    LAST_CLONE_LOADED=1
+  fi
+  [[ "$CLONE_CONTENT" == "$LAST_CLONE_CONTENT" ]] && return 0
+  local tmp
+  tmp="$(mktemp -p "$(dirname "$CLONE_FILE")" autosave_clone.XXXXXX)"
+  printf '%s' "$CLONE_CONTENT" > "$tmp"
+  mv "$tmp" "$CLONE_FILE"
+  LAST_CLONE_CONTENT="$CLONE_CONTENT"
+}
+
+# ---------------------------------------------------------------------------
+# Run a command while holding the watch-file lock shared with the GUI.
+# Without flock(1) (stock macOS) the command runs unlocked.
+with_watch_lock() {
+  if ! command -v flock >/dev/null 2>&1; then
+    "$@"
     return
   fi
-  mv "$CLONE_TMP" "$WATCH_FILE"
-  cp "$WATCH_FILE" "$CLONE_FILE"
-  log_line "[REPLACED] Updated $WATCH_FILE from new clone"
+  local fd rc=0
+  exec {fd}>>"$WATCH_LOCK_FILE"
+  flock -x "$fd"
+  "$@" || rc=$?
+  exec {fd}>&-
+  return "$rc"
+}
+
+# ---------------------------------------------------------------------------
+# Merge the hashes queued in MAIN_UPDATES into the current WATCH_FILE.
+# The file is re-read under the lock, so entries the GUI added or removed
+# during the cycle are kept as they are now.
+apply_main_updates_locked() {
+  local line trimmed label base_dir tmp out="" written=0
+  local -a lines=()
+  mapfile -t lines < "$WATCH_FILE" || true
+  for line in "${lines[@]}"; do
+    trimmed="${line#${line%%[![:space:]]*}}"
+    trimmed="${trimmed%${trimmed##*[![:space:]]}}"
+    label="${trimmed%% - [*}"
+    base_dir="${label%%::*}"
+    if [[ -n "$trimmed" && "$trimmed" != \#* && -n "${MAIN_UPDATES[$base_dir]+x}" ]]; then
+      out+="${label} - [ ${MAIN_UPDATES[$base_dir]} ]"$'\n'
+      written=$((written + 1))
+    else
+      out+="$line"$'\n'
+    fi
+  done
+  [[ "$written" -gt 0 ]] || return 0
+  tmp="$(mktemp -p "$(dirname "$WATCH_FILE")" autosave_main.XXXXXX)"
+  printf '%s' "$out" > "$tmp"
+  mv "$tmp" "$WATCH_FILE"
+  log_line "[UPDATED] Wrote $written change(s) to $WATCH_FILE"
+}
+
+update_main_if_needed() {
+  [[ "${#MAIN_UPDATES[@]}" -gt 0 ]] || return 0
+  with_watch_lock apply_main_updates_locked
+  MAIN_UPDATES=()
 }
 
 # ---------------------------------------------------------------------------
 # Process one full detection cycle.  Read each non-comment line from
-# WATCH_FILE, compute its new integer, append the line to the clone
-# snapshot, and track if any hash mismatches occur.
+# WATCH_FILE, fingerprint all roots with one scan_dirs call, append the
+# lines to the clone snapshot, and track if any hash mismatches occur.  When SCAN_ONLY holds
+# any directories (event mode), every other entry is copied through with
+# its stored hash instead of being rescanned.
+declare -A SCAN_ONLY=()
+SCAN_DIRS=(); SCAN_RESULTS=()
+
 single_cycle() {
-  : > "$CLONE_TMP"
+  CLONE_CONTENT=""
   mapfile -t lines < "$WATCH_FILE" || true
-  local changes=0
+  local changes=0 scanned=0 cycle_start result secs i
+  local entries=() labels=() olds=()
+  now_us; cycle_start="$NOW_US"
+  SCAN_DIRS=()
   for line in "${lines[@]}"; do
     # Trim whitespace
     local trimmed="${line#${line%%[![:space:]]*}}"
@@ -124,8 +383,8 @@ single_cycle() {
     local label base_dir old_int
     if [[ "$trimmed" == *" - ["* ]]; then
       label="${trimmed%% - [*}"
-      old_int="$(printf '%s\n' "$trimmed" | grep -oE '\[[0-9]{1,16}\]' | tr -dc '0-9' || true)"
-      [[ -z "$old_int" ]] && old_int="0000000000000000"
+      old_int="0000000000000000"
+      [[ "$trimmed" =~ \[[[:space:]]*([0-9]{1,16})[[:space:]]*\] ]] && old_int="${BASH_REMATCH[1]}"
     else
       label="$trimmed"
       old_int="0000000000000000"
@@ -135,41 +394,226 @@ single_cycle() {
     base_dir="${label%%::*}"
     # Only process existing directories
     [[ -d "$base_dir" ]] || continue
-    local new_int
-    new_int="$(calc_int_for_dir "$base_dir")"
+    # Entries that are not rescanned keep their line (empty label marks them).
+    if [[ "${#SCAN_ONLY[@]}" -gt 0 && -z "${SCAN_ONLY[$base_dir]:-}" ]]; then
+      entries+=("$trimmed"); labels+=(""); olds+=("")
+      continue
+    fi
+    entries+=("${#SCAN_DIRS[@]}"); labels+=("$label"); olds+=("$old_int")
+    SCAN_DIRS+=("$base_dir")
+  done
+  scan_dirs
+  for i in "${!entries[@]}"; do
+    if [[ -z "${labels[$i]}" ]]; then
+      CLONE_CONTENT+="${entries[$i]}"$'\n'
+      continue
+    fi
+    local label="${labels[$i]}" old_int="${olds[$i]}" base_dir new_int
+    base_dir="${SCAN_DIRS[${entries[$i]}]}"
+    result="${SCAN_RESULTS[${entries[$i]}]:-}"
+    new_int="${result%% *}"
+    if [[ ! "$new_int" =~ ^[0-9]{16}$ ]]; then
+      log_line "[WARN] Failed to hash metadata for $base_dir"
+      CLONE_CONTENT+="${label} - [ ${old_int} ]"$'\n'
+      continue
+    fi
+    scanned=$((scanned + 1))
+    record_scan_metrics "$base_dir" "$new_int" "${result#"$new_int" }"
     update_clone_line "$label" "$new_int"
     if [[ "$new_int" != "$old_int" ]]; then
       changes=$((changes + 1))
+      metric c autogit_root_changes_total 1 "root=$base_dir"
+      MAIN_UPDATES["$base_dir"]="$new_int"
       log_line "[CHANGE] $base_dir: $old_int -> $new_int"
     fi
   done
-  # Replace main file if any changes detected
+  # Merge changed hashes into the main file, then refresh the clone
   update_main_if_needed
-  log_line "[INFO] Cycle complete (changes=$changes)"
+  write_clone_if_changed
+  snapshot_prune_if_due
+  now_us; us_to_seconds secs $(( NOW_US - cycle_start ))
+  metric h autogit_cycle_duration_seconds "$secs"
+  metric c autogit_cycles_total 1
+  metric g autogit_cycle_scanned_roots "$scanned"
+  metric g autogit_cycle_changed_roots "$changes"
+  metrics_flush
+  if [[ "$changes" -gt 0 ]]; then
+    log_line "[INFO] Cycle complete (changes=$changes)"
+  else
+    log_idle INFO "[INFO] Cycle complete (changes=0)"
+  fi
+  log_tick
 }
 
 # ---------------------------------------------------------------------------
 # Run detection cycles indefinitely at INTERVAL seconds.  A temporary
 # clone file is created for each cycle.  The log captures both
 # replacements and normal cycle completions.
+poll_forever() {
+  while true; do
+    single_cycle
+    sleep "$INTERVAL"
+  done
+}
+
 run_loop() {
   ensure_paths
   write_pid
-  trap 'clear_pid' EXIT INT TERM
+  trap 'metrics_flush 1; log_close; clear_pid' EXIT INT TERM
   log_line "[INFO] AutoSave loop started (PID $$, interval ${INTERVAL}s)"
-  while true; do
-    CLONE_TMP="$(mktemp -p "$(dirname "$CLONE_FILE")" autosave_clone.XXXXXX)"
-    single_cycle
-    rm -f "$CLONE_TMP" 2>/dev/null || true
+  warn_if_no_snapshots
+  poll_forever
+}
+
+# ---------------------------------------------------------------------------
+# Event-driven mode.  Recursive inotify watches are placed on every
+# directory in WATCH_FILE; events are mapped back to their root(s) and the
+# 16-digit value is recomputed only for roots that saw activity.
+read_watch_roots() {
+  local line trimmed label
+  local -a lines=()
+  WATCH_ROOTS=()
+  mapfile -t lines < "$WATCH_FILE" || true
+  for line in "${lines[@]}"; do
+    trimmed="${line#${line%%[![:space:]]*}}"
+    trimmed="${trimmed%${trimmed##*[![:space:]]}}"
+    [[ -z "$trimmed" || "$trimmed" == \#* ]] && continue
+    label="${trimmed%% - [*}"
+    label="${label%%::*}"
+    [[ -d "$label" ]] && WATCH_ROOTS+=("${label%/}")
+  done
+}
+
+# Set NOW_MS without forking (this runs on every event).
+now_ms() {
+  local t="${EPOCHREALTIME/[.,]/}"
+  NOW_MS=$((t / 1000))
+}
+
+seconds_to_ms() {
+  awk -v s="$1" 'BEGIN { printf "%d\n", s * 1000 }'
+}
+
+# Scan only the roots collected in SCAN_ONLY, then clear the set.
+flush_pending_roots() {
+  [[ "${#SCAN_ONLY[@]}" -gt 0 ]] || return 0
+  single_cycle
+  SCAN_ONLY=()
+}
+
+# Watch the current root set until it changes (returns 0) or inotify
+# cannot be used (returns 1).
+watch_roots_events() {
+  local marker="$1"
+  read_watch_roots
+  if [[ "${#WATCH_ROOTS[@]}" -eq 0 ]]; then
     sleep "$INTERVAL"
+    [[ "$WATCH_FILE" -nt "$marker" ]] && touch "$marker"
+    return 0
+  fi
+
+  local errlog; errlog="$(mktemp -p "$(dirname "$CLONE_FILE")" autosave_inotify.XXXXXX)"
+  coproc INOTIFY {
+    exec inotifywait -m -r --format '%w%f' --exclude '/\.git(/|$)' \
+      -e modify,attrib,close_write,create,delete,move "${WATCH_ROOTS[@]}" 2>"$errlog"
+  }
+  local ino_pid="$INOTIFY_PID" ino_fd="${INOTIFY[0]}"
+
+  # Wait until the watches are in place, or inotifywait gives up.
+  while kill -0 "$ino_pid" 2>/dev/null && ! grep -q 'Watches established' "$errlog"; do
+    sleep 0.1
+  done
+  if ! kill -0 "$ino_pid" 2>/dev/null; then
+    log_line "[WARN] inotify setup failed: $(tr '\n' ' ' < "$errlog")"
+    rm -f "$errlog"
+    return 1
+  fi
+  log_line "[INFO] Watching ${#WATCH_ROOTS[@]} root(s) via inotify"
+
+  local debounce_ms max_delay_ms rescan_ms first_ms=0 last_ms=0 rescan_at path root now rc timeout
+  debounce_ms="$(seconds_to_ms "$EVENT_DEBOUNCE")"
+  max_delay_ms="$(seconds_to_ms "$EVENT_MAX_DELAY")"
+  rescan_ms="$(seconds_to_ms "$EVENT_RESCAN")"
+  now_ms; rescan_at=$(( NOW_MS + rescan_ms ))
+
+  while true; do
+    # Sleep in long ticks while idle; only poll at debounce speed when
+    # there is something pending.
+    timeout=5
+    [[ "${#SCAN_ONLY[@]}" -gt 0 ]] && timeout="$EVENT_DEBOUNCE"
+    if IFS= read -r -t "$timeout" -u "$ino_fd" path; then
+      for root in "${WATCH_ROOTS[@]}"; do
+        [[ "$path" == "$root" || "$path" == "$root"/* ]] && SCAN_ONLY["$root"]=1
+      done
+      now_ms; now="$NOW_MS"
+      [[ "$first_ms" -eq 0 ]] && first_ms="$now"
+      last_ms="$now"
+      # Keep coalescing unless continuous writes exceed the max delay.
+      (( now - first_ms < max_delay_ms )) && continue
+    else
+      rc=$?
+      log_tick
+      if [[ "$rc" -le 128 ]]; then
+        # EOF: inotifywait exited (e.g. watch limit hit on a new subtree).
+        log_line "[WARN] inotifywait exited: $(tr '\n' ' ' < "$errlog")"
+        rm -f "$errlog"
+        flush_pending_roots
+        return 1
+      fi
+    fi
+
+    now_ms; now="$NOW_MS"
+    if [[ "${#SCAN_ONLY[@]}" -gt 0 ]] &&
+       (( now - last_ms >= debounce_ms || now - first_ms >= max_delay_ms )); then
+      flush_pending_roots
+      first_ms=0; last_ms=0
+    fi
+    if (( now >= rescan_at )); then
+      single_cycle
+      rescan_at=$(( now + rescan_ms ))
+    fi
+    if [[ "$WATCH_FILE" -nt "$marker" ]]; then
+      touch "$marker"
+      local previous=("${WATCH_ROOTS[@]}")
+      read_watch_roots
+      if [[ "${previous[*]}" != "${WATCH_ROOTS[*]}" ]]; then
+        log_line "[INFO] Watch list changed; re-establishing inotify watches"
+        kill "$ino_pid" 2>/dev/null || true
+        wait "$ino_pid" 2>/dev/null || true
+        rm -f "$errlog"
+        flush_pending_roots
+        return 0
+      fi
+    fi
   done
 }
 
+run_events() {
+  ensure_paths
+  write_pid
+  trap 'metrics_flush 1; log_close; clear_pid' EXIT INT TERM
+  if ! command -v inotifywait >/dev/null 2>&1; then
+    log_line "[WARN] inotifywait not found (install inotify-tools); falling back to polling"
+    poll_forever
+  fi
+  log_line "[INFO] AutoSave event watcher started (PID $$, debounce ${EVENT_DEBOUNCE}s)"
+  warn_if_no_snapshots
+
+  local marker; marker="$(mktemp -p "$(dirname "$CLONE_FILE")" autosave_events.XXXXXX)"
+  # Catch up on anything that changed while the watcher was down.
+  single_cycle
+  touch "$marker"
+
+  while watch_roots_events "$marker"; do :; done
+  rm -f "$marker"
+  log_line "[WARN] inotify watches unavailable; falling back to polling every ${INTERVAL}s"
+  poll_forever
+}
+
 run_once() {
   ensure_paths
-  CLONE_TMP="$(mktemp -p "$(dirname "$CLONE_FILE")" autosave_clone.XXXXXX)"
   single_cycle
-  rm -f "$CLONE_TMP" 2>/dev/null || true
+  metrics_flush 1
 }
 
 start_service() {
@@ -178,8 +622,19 @@ start_service() {
     echo "AutoSave watcher already running (PID $(cat "$PID_FILE"))"
     return 0
   fi
-  nohup env WATCH_FILE="$WATCH_FILE" CLONE_FILE="$CLONE_FILE" LOG_FILE="$LOG_FILE" \
-    PID_FILE="$PID_FILE" INTERVAL="$INTERVAL" "$0" run-loop >/dev/null 2>&1 &
+  local run_cmd="run-loop"
+  [[ "$WATCH_MODE" == "events" ]] && run_cmd="run-events"
+  nohup env WATCH_FILE="$WATCH_FILE" WATCH_LOCK_FILE="$WATCH_LOCK_FILE" CLONE_FILE="$CLONE_FILE" LOG_FILE="$LOG_FILE" \
+    PID_FILE="$PID_FILE" INTERVAL="$INTERVAL" SCAN_HELPER="$SCAN_HELPER" \
+    INDEX_DIR="$INDEX_DIR" SCAN_TRUST_DIR_MTIME="$SCAN_TRUST_DIR_MTIME" SCAN_WORKERS="$SCAN_WORKERS" \
+    EVENT_DEBOUNCE="$EVENT_DEBOUNCE" EVENT_MAX_DELAY="$EVENT_MAX_DELAY" EVENT_RESCAN="$EVENT_RESCAN" \
+    SNAPSHOTS="$SNAPSHOTS" SNAPSHOT_HELPER="$SNAPSHOT_HELPER" SNAPSHOT_DIR="$SNAPSHOT_DIR" \
+    SNAPSHOT_KEEP="$SNAPSHOT_KEEP" SNAPSHOT_PRUNE_INTERVAL="$SNAPSHOT_PRUNE_INTERVAL" \
+    METRICS="$METRICS" METRICS_HELPER="$METRICS_HELPER" METRICS_DIR="$METRICS_DIR" \
+    METRICS_FLUSH_INTERVAL="$METRICS_FLUSH_INTERVAL" AUTOGIT_LOG_LIB="$AUTOGIT_LOG_LIB" \
+    LOG_FORMAT="$LOG_FORMAT" LOG_FLUSH_INTERVAL="$LOG_FLUSH_INTERVAL" \
+    LOG_SUMMARY_INTERVAL="$LOG_SUMMARY_INTERVAL" LOG_MAX_BYTES="$LOG_MAX_BYTES" LOG_KEEP="$LOG_KEEP" \
+    LOG_MAX_AGE_DAYS="$LOG_MAX_AGE_DAYS" "$0" "$run_cmd" >/dev/null 2>&1 &
   echo "AutoSave watcher started (PID $!)"
 }
 
@@ -209,14 +664,20 @@ status_service() {
 # CLI dispatch.
 usage() {
   cat <<EOF
-Usage: $SCRIPT_NAME [options] <start|stop|status|run-loop|run-once>
+Usage: $SCRIPT_NAME [options] <start|stop|status|run-loop|run-events|run-once>
 
 Options:
   -i, --interval <seconds>  Override cycle interval (default: ${INTERVAL})
+  -d, --debounce <seconds>  Event coalescing window for run-events (default: ${EVENT_DEBOUNCE})
   -h, --help                Show this help message
 
 Environment overrides:
-  WATCH_FILE, CLONE_FILE, LOG_FILE, PID_FILE, INTERVAL
+  WATCH_FILE, WATCH_LOCK_FILE, CLONE_FILE, LOG_FILE, PID_FILE, INTERVAL,
+  SCAN_HELPER, INDEX_DIR, SCAN_TRUST_DIR_MTIME, SCAN_WORKERS, WATCH_MODE,
+  EVENT_DEBOUNCE, EVENT_MAX_DELAY, EVENT_RESCAN, SNAPSHOTS, SNAPSHOT_HELPER,
+  SNAPSHOT_DIR, SNAPSHOT_KEEP, SNAPSHOT_PRUNE_INTERVAL, METRICS, METRICS_HELPER,
+  METRICS_DIR, METRICS_FLUSH_INTERVAL, AUTOGIT_LOG_LIB, LOG_FORMAT, LOG_FLUSH_INTERVAL,
+  LOG_SUMMARY_INTERVAL, LOG_MAX_BYTES, LOG_KEEP, LOG_MAX_AGE_DAYS
 EOF
 }
 
@@ -225,7 +686,7 @@ parse_args_and_dispatch() {
   while [[ "$idx" -lt "$count" ]]; do
     local token="${args[$idx]}"
     case "$token" in
-      start|stop|status|run-loop|run-once)
+      start|stop|status|run-loop|run-events|run-once)
         cmd="$token"
         idx=$((idx + 1))
         break
@@ -238,6 +699,14 @@ parse_args_and_dispatch() {
         fi
         INTERVAL="${args[$idx]}"
         ;;
+      -d|--debounce)
+        idx=$((idx + 1))
+        if [[ "$idx" -ge "$count" ]]; then
+          echo "Missing value for $token" >&2
+          exit 1
+        fi
+        EVENT_DEBOUNCE="${args[$idx]}"
+        ;;
       -h|--help)
         usage
         exit 0
@@ -256,11 +725,13 @@ parse_args_and_dispatch() {
     exit 1
   fi
 
+  trap 'log_close' EXIT
   case "$cmd" in
     start)    start_service ;;
     stop)     stop_service ;;
     status)   status_service ;;
     run-loop) run_loop ;;
+    run-events) run_events ;;
     run-once) run_once ;;
     *) usage; exit 1 ;;
   esac
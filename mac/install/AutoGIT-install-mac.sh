@@ -40,6 +40,11 @@ PROFILE_DIR="$MAC_DIR/profiles"
 GIT_SCRIPT_SRC="$REPO_ROOT/autogit.sh"
 GIT_WRAPPER_SRC="$REPO_ROOT/autogit_dirwatch.sh"
 SAVE_SCRIPT_SRC="$REPO_ROOT/autosave_dirwatch.sh"
+SCAN_HELPER_SRC="$REPO_ROOT/autogit_scan.py"
+METRICS_HELPER_SRC="$REPO_ROOT/autogit_metrics.py"
+COMPACT_HELPER_SRC="$REPO_ROOT/autogit_compact.py"
+SNAPSHOT_HELPER_SRC="$REPO_ROOT/autogit_snapshot.py"
+LOG_LIB_SRC="$REPO_ROOT/autogit_log.sh"
 
 AUTOGIT_PLIST="$LAUNCH_AGENTS_DIR/com.autogit.agent.plist"
 AUTOSAVE_PLIST="$LAUNCH_AGENTS_DIR/com.autosave.agent.plist"
@@ -216,13 +221,25 @@ done
 require_file "$GIT_SCRIPT_SRC"
 require_file "$GIT_WRAPPER_SRC"
 require_file "$SAVE_SCRIPT_SRC"
+require_file "$SCAN_HELPER_SRC"
+require_file "$METRICS_HELPER_SRC"
+require_file "$COMPACT_HELPER_SRC"
+require_file "$SNAPSHOT_HELPER_SRC"
+require_file "$LOG_LIB_SRC"
 require_file "$LAUNCHD_TPL_DIR/com.autogit.agent.plist.tpl"
 require_file "$LAUNCHD_TPL_DIR/com.autosave.agent.plist.tpl"
 
 cp "$GIT_SCRIPT_SRC" "$BIN_DIR/autogit.sh"
 cp "$GIT_WRAPPER_SRC" "$BIN_DIR/autogit_dirwatch.sh"
 cp "$SAVE_SCRIPT_SRC" "$BIN_DIR/autosave_dirwatch.sh"
-chmod +x "$BIN_DIR/autogit.sh" "$BIN_DIR/autogit_dirwatch.sh" "$BIN_DIR/autosave_dirwatch.sh"
+cp "$SCAN_HELPER_SRC" "$BIN_DIR/autogit_scan.py"
+cp "$METRICS_HELPER_SRC" "$BIN_DIR/autogit_metrics.py"
+cp "$COMPACT_HELPER_SRC" "$BIN_DIR/autogit_compact.py"
+cp "$SNAPSHOT_HELPER_SRC" "$BIN_DIR/autogit_snapshot.py"
+cp "$LOG_LIB_SRC" "$BIN_DIR/autogit_log.sh"
+chmod +x "$BIN_DIR/autogit.sh" "$BIN_DIR/autogit_dirwatch.sh" "$BIN_DIR/autosave_dirwatch.sh" \
+  "$BIN_DIR/autogit_scan.py" "$BIN_DIR/autogit_metrics.py" "$BIN_DIR/autogit_compact.py" \
+  "$BIN_DIR/autogit_snapshot.py"
 
 cat > "$AUTOGIT_EXECUTABLE" <<EOF
 #!/usr/bin/env bash
@@ -0,0 +1,124 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def write(path, text="", mtime=None):
+    """Create or overwrite a file (and its parents), optionally pinning its mtime."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as fh:
+        fh.write(text)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def git(repo, *args, env=None):
+    """Run git in a repository and return its stripped stdout."""
+    full_env = {**os.environ, "GIT_CONFIG_NOSYSTEM": "1", "HOME": str(repo),
+                "GIT_AUTHOR_NAME": "t", "GIT_AUTHOR_EMAIL": "t@example.com",
+                "GIT_COMMITTER_NAME": "t", "GIT_COMMITTER_EMAIL": "t@example.com",
+                **(env or {})}
+    out = subprocess.run(["git", "-C", str(repo), *args], check=True,
+                         capture_output=True, text=True, env=full_env)
+    return out.stdout.strip()
+
+
+@pytest.fixture
+def repo(tmp_path):
+    """An empty git repository on branch main."""
+    path = tmp_path / "repo"
+    path.mkdir()
+    git(path, "init", "-q", "-b", "main")
+    return path
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Sandbox:
+    """A throwaway HOME with watch files, watched roots and local bare remotes."""
+
+    def __init__(self, home):
+        self.home = home
+        self.state = home / ".autogit"
+        self.state.mkdir()
+        (self.state / "ignore_globs.txt").write_text("node_modules/\n")
+        self.env = {**os.environ, "HOME": str(home), "GIT_CONFIG_NOSYSTEM": "1",
+                    "GIT_CONFIG_GLOBAL": str(home / ".gitconfig"),
+                    "TOKEN_FILE": str(home / "no_token"), "METRICS": "0",
+                    "PUSH_MIN_INTERVAL": "0"}
+
+    def add_root(self, name, watch="dirs_main.txt", remote=True, tags=""):
+        root = self.home / "roots" / name
+        write(str(root / "README.txt"), name)
+        git(root, "init", "-q", "-b", "main")
+        if remote:
+            bare = self.home / "remotes" / f"{name}.git"
+            git(self.home, "init", "-q", "--bare", "-b", "main", str(bare))
+            git(root, "remote", "add", "origin", str(bare))
+        with open(self.state / watch, "a", encoding="utf-8") as fh:
+            fh.write(f"{root}{tags}\n")
+        return root
+
+    def run(self, script, *args, check=True, **env):
+        """Run a daemon script (autogit.sh, autosave_dirwatch.sh) synchronously."""
+        proc = subprocess.run(["bash", os.path.join(REPO_ROOT, script), *args],
+                              env={**self.env, **env}, capture_output=True, text=True,
+                              timeout=120)
+        if check and proc.returncode != 0:
+            raise AssertionError(f"{script} {args} failed: {proc.stderr}")
+        return proc
+
+    def daemon(self, script, *args, **env):
+        """Start a daemon in the background; the context stops it again."""
+        sandbox = self
+
+        class Running:
+            def __enter__(self):
+                sandbox.run(script, *args, "start", **env)
+                return self
+
+            def __exit__(self, *exc):
+                sandbox.run(script, "stop", check=False)
+
+        return Running()
+
+    def watched(self, watch="dirs_main.txt"):
+        """Return {label: digits} from a watch file."""
+        out = {}
+        for line in (self.state / watch).read_text().splitlines():
+            label, _, rest = line.partition(" - [")
+            out[label] = rest.strip(" ]")
+        return out
+
+    def log(self, name="auto_git.log"):
+        path = self.state / name
+        return path.read_text() if path.exists() else ""
+
+
+@pytest.fixture
+def sandbox(tmp_path):
+    return Sandbox(tmp_path)
+
+
+def wait_for(predicate, timeout=20.0, step=0.2):
+    """Poll until predicate() is true; return whether it became true in time."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(step)
+    return predicate()
+
+
+def commits(repo, ref="HEAD"):
+    """Return the number of commits reachable from ref (0 for an unborn branch)."""
+    try:
+        return int(git(repo, "rev-list", "--count", ref))
+    except subprocess.CalledProcessError:
+        return 0
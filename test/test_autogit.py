@@ -0,0 +1,338 @@
+import http.server
+import json
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+from conftest import REPO_ROOT, commits, git, wait_for, write
+
+
+def test_run_once_commits_and_pushes_changes(sandbox):
+    root = sandbox.add_root("a")
+    sandbox.run("autogit.sh", "run-once")
+    assert commits(root) == 1
+    assert commits(sandbox.home / "remotes" / "a.git", "main") == 1
+
+    sandbox.run("autogit.sh", "run-once")
+    assert commits(root) == 1
+
+    write(str(root / "notes.txt"), "new")
+    sandbox.run("autogit.sh", "run-once")
+    assert commits(root) == 2
+    assert commits(sandbox.home / "remotes" / "a.git", "main") == 2
+
+
+def test_roots_missing_from_helper_output_keep_their_value(sandbox, tmp_path):
+    a, b = sandbox.add_root("a"), sandbox.add_root("b")
+    sandbox.run("autogit.sh", "run-once")
+    before = sandbox.watched()
+
+    # A helper that drops the line for root b, as a partial failure would.
+    flaky = tmp_path / "flaky_scan.py"
+    flaky.write_text(
+        "import subprocess, sys\n"
+        f"out = subprocess.run([sys.executable, {os.path.join(REPO_ROOT, 'autogit_scan.py')!r},"
+        " *sys.argv[1:]], capture_output=True, text=True).stdout\n"
+        f"sys.stdout.write(''.join(l for l in out.splitlines(True) if not l.startswith({str(b)!r})))\n")
+    write(str(a / "x.txt"), "x")
+    write(str(b / "y.txt"), "y")
+    sandbox.run("autogit.sh", "run-once", SCAN_HELPER=str(flaky))
+    after = sandbox.watched()
+    assert after[str(b)] == before[str(b)]
+    assert after[str(a)] != before[str(a)]
+    assert (commits(a), commits(b)) == (2, 1)
+    assert sandbox.watched("dirs_clone.txt") == after
+    assert "reported 1 of 2 roots" in sandbox.log()
+
+    sandbox.run("autogit.sh", "run-once")
+    assert commits(b) == 2
+    assert "y.txt" in git(b, "ls-files").split()
+
+
+def test_settle_window_waits_for_quiet_roots(sandbox):
+    root = sandbox.add_root("a")
+    quick = sandbox.add_root("b", tags="::settle=0")
+    sandbox.run("autogit.sh", "run-once")
+    with sandbox.daemon("autogit.sh", "-i", "1", SETTLE_WINDOW="4"):
+        time.sleep(1.5)
+        changed = time.monotonic()
+        write(str(root / "x.txt"), "x")
+        write(str(quick / "x.txt"), "x")
+        assert wait_for(lambda: commits(quick) == 2, 10)
+        assert commits(root) == 1
+        assert wait_for(lambda: commits(root) == 2, 20)
+        assert time.monotonic() - changed >= 4
+
+
+def push_state_path(sandbox, root):
+    name = str(root).replace("%", "%25").replace("/", "%2F")
+    return sandbox.state / "push_state" / f"{name}.state"
+
+
+def push_state(sandbox, root):
+    """Return a repo's push state file as a {key: value} dict."""
+    text = push_state_path(sandbox, root).read_text()
+    return dict(line.split("=", 1) for line in text.splitlines())
+
+
+def retry_now(sandbox, root):
+    """Make a backed-off push due immediately."""
+    path = push_state_path(sandbox, root)
+    lines = [l if not l.startswith("next_try=") else "next_try=0"
+             for l in path.read_text().splitlines()]
+    path.write_text("\n".join(lines) + "\n")
+
+
+def test_pushes_coalesce_within_the_minimum_interval(sandbox):
+    root = sandbox.add_root("a")
+    remote = sandbox.home / "remotes" / "a.git"
+    sandbox.run("autogit.sh", "run-once", PUSH_MIN_INTERVAL="3600")
+    assert commits(remote, "main") == 1
+
+    for n in range(2):
+        write(str(root / f"{n}.txt"), str(n))
+        sandbox.run("autogit.sh", "run-once", PUSH_MIN_INTERVAL="3600")
+    assert (commits(root), commits(remote, "main")) == (3, 1)
+    assert push_state(sandbox, root)["pending"] == "1"
+    assert "Unpushed repos: 1" in sandbox.run("autogit.sh", "status").stdout
+
+    # No new change: the next cycle flushes both commits in one push.
+    sandbox.run("autogit.sh", "run-once")
+    assert commits(remote, "main") == 3
+    assert push_state(sandbox, root)["pending"] == "0"
+
+
+def test_failed_pushes_back_off_exponentially(sandbox):
+    root = sandbox.add_root("a")
+    remote = sandbox.home / "remotes" / "a.git"
+    moved = sandbox.home / "remotes" / "away.git"
+    remote.rename(moved)
+    env = {"PUSH_BACKOFF_BASE": "100", "PUSH_BACKOFF_MAX": "1000"}
+
+    started = int(time.time())
+    sandbox.run("autogit.sh", "run-once", **env)
+    state = push_state(sandbox, root)
+    assert (state["failures"], state["pending"]) == ("1", "1")
+    assert 100 <= int(state["next_try"]) - started <= 126
+    assert "git push failed" in sandbox.log()
+
+    # Not due yet: the new commit queues behind the backoff.
+    write(str(root / "x.txt"), "x")
+    sandbox.run("autogit.sh", "run-once", **env)
+    assert commits(root) == 2
+    assert push_state(sandbox, root)["failures"] == "1"
+
+    # Make the retry due; the second failure doubles the delay.
+    retry_now(sandbox, root)
+    started = int(time.time())
+    sandbox.run("autogit.sh", "run-once", **env)
+    state = push_state(sandbox, root)
+    assert state["failures"] == "2"
+    assert 200 <= int(state["next_try"]) - started <= 251
+
+    moved.rename(remote)
+    retry_now(sandbox, root)
+    sandbox.run("autogit.sh", "run-once", **env)
+    state = push_state(sandbox, root)
+    assert (state["failures"], state["pending"]) == ("0", "0")
+    assert commits(remote, "main") == 2
+
+
+@pytest.fixture
+def github_api():
+    """A local stand-in for the GitHub repos API that records its requests."""
+    requests, existing = [], set()
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests.append(("GET", self.path, self.headers.get("If-None-Match")))
+            name = self.path.rsplit("/", 1)[-1]
+            if name not in existing:
+                self.send_response(404)
+            elif self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+            else:
+                self.send_response(200)
+                self.send_header("ETag", '"v1"')
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            requests.append(("POST", self.path, None))
+            existing.add(json.loads(body)["name"])
+            self.send_response(201)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.requests = requests
+    server.url = f"http://127.0.0.1:{server.server_port}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_repo_checks_are_cached_and_revalidated(sandbox, github_api):
+    root = sandbox.add_root("a")
+    remote = sandbox.home / "remotes" / "a.git"
+    (sandbox.home / "token").write_text("secret\n")
+    # Pushes to the GitHub URL the script configures land in the local bare repo.
+    git(sandbox.home, "config", "--file", str(sandbox.home / ".gitconfig"),
+        f"url.{sandbox.home / 'remotes'}/.insteadOf", "https://github.com/u/")
+    env = {"TOKEN_FILE": str(sandbox.home / "token"), "API_URL": github_api.url,
+           "GIT_USER": "u", "PRESERVE_EXISTING_REMOTE": "0", "no_proxy": "*"}
+    cache = sandbox.state / "repo_cache.tsv"
+
+    sandbox.run("autogit.sh", "run-once", **env)
+    assert github_api.requests == [("GET", "/repos/u/a", None), ("POST", "/user/repos", None)]
+    assert cache.read_text().split("\t")[0] == f"{github_api.url}/u/a"
+    assert git(root, "remote", "get-url", "origin") == "https://github.com/u/a.git"
+    assert commits(remote, "main") == 1
+
+    # Cached: the next commit makes no API request.
+    write(str(root / "x.txt"), "x")
+    sandbox.run("autogit.sh", "run-once", **env)
+    assert len(github_api.requests) == 2
+    assert commits(remote, "main") == 2
+
+    # Expired: revalidated, then revalidated conditionally with the ETag.
+    for n in range(2):
+        write(str(root / f"{n}.txt"), str(n))
+        sandbox.run("autogit.sh", "run-once", REPO_CACHE_TTL="0", **env)
+    assert github_api.requests[2:] == [("GET", "/repos/u/a", None),
+                                       ("GET", "/repos/u/a", '"v1"')]
+    assert cache.read_text().rstrip("\n").endswith('\t"v1"')
+    assert commits(remote, "main") == 4
+
+
+def test_entries_are_scanned_on_their_own_schedule(sandbox):
+    fast = sandbox.add_root("fast")
+    slow = sandbox.add_root("slow", tags="::every=3600")
+    cold = sandbox.add_root("cold", tags="::cold")
+    (sandbox.state / "schedule.conf").write_text("# tag every priority\ncold 3600\n")
+    sandbox.run("autogit.sh", "run-once")
+    with sandbox.daemon("autogit.sh", "-i", "1"):
+        time.sleep(2)   # the first cycle scans every entry
+        for root in (fast, slow, cold):
+            write(str(root / "x.txt"), "x")
+        assert wait_for(lambda: commits(fast) == 2, 10)
+        time.sleep(2)
+        assert (commits(slow), commits(cold)) == (1, 1)
+
+
+def test_higher_priority_entries_are_scanned_first(sandbox):
+    low = sandbox.add_root("low")
+    high = sandbox.add_root("high", tags="::priority=5")
+    sandbox.run("autogit.sh", "run-once")
+    write(str(low / "x.txt"), "x")
+    write(str(high / "x.txt"), "x")
+    sandbox.run("autogit.sh", "run-once", SCHEDULE_MAX_PER_CYCLE="1")
+    assert (commits(low), commits(high)) == (1, 2)
+
+
+def hold_pushes(remote, flag):
+    """Make pushes to a bare remote hang while the flag file exists."""
+    hook = remote / "hooks" / "pre-receive"
+    hook.write_text(f"#!/bin/sh\nwhile [ -e {flag} ]; do sleep 0.1; done\n")
+    hook.chmod(0o755)
+
+
+def test_slow_pushes_do_not_hold_up_other_roots(sandbox, tmp_path):
+    slow, quick = sandbox.add_root("slow"), sandbox.add_root("quick")
+    sandbox.run("autogit.sh", "run-once")
+    flag = tmp_path / "hold"
+    flag.touch()
+    hold_pushes(sandbox.home / "remotes" / "slow.git", flag)
+    with sandbox.daemon("autogit.sh", "-i", "1", GIT_WORKERS="2"):
+        write(str(slow / "1.txt"), "1")
+        assert wait_for(lambda: commits(slow) == 2, 10)
+        # Later changes coalesce into one pending commit behind the stuck push.
+        for n in (2, 3):
+            write(str(slow / f"{n}.txt"), str(n))
+            time.sleep(1.5)
+        write(str(quick / "x.txt"), "x")
+        assert wait_for(lambda: commits(sandbox.home / "remotes" / "quick.git", "main") == 2, 10)
+        assert commits(slow) == 2
+
+        flag.unlink()
+        assert wait_for(lambda: commits(sandbox.home / "remotes" / "slow.git", "main") == 3, 10)
+        assert commits(slow) == 3
+        assert "3.txt" in git(slow, "ls-files").split()
+    assert wait_for(lambda: not any((sandbox.state / "jobs").iterdir()), 10)
+
+
+def test_stuck_git_jobs_are_stopped(sandbox, tmp_path):
+    root = sandbox.add_root("a")
+    sandbox.run("autogit.sh", "run-once")
+    flag = tmp_path / "hold"
+    flag.touch()
+    hold_pushes(sandbox.home / "remotes" / "a.git", flag)
+    with sandbox.daemon("autogit.sh", "-i", "1", GIT_JOB_TIMEOUT="2"):
+        write(str(root / "x.txt"), "x")
+        assert wait_for(lambda: "still running after 2s" in sandbox.log(), 15)
+        assert push_state(sandbox, root)["pending"] == "1"
+        flag.unlink()
+
+
+def test_commits_queue_locally_while_the_remote_is_unreachable(sandbox):
+    root = sandbox.add_root("a")
+    remote = sandbox.home / "remotes" / "a.git"
+    sandbox.run("autogit.sh", "run-once")
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    # The host:port decides reachability; pushes land in the local bare repo.
+    url = f"https://127.0.0.1:{port}/"
+    git(root, "remote", "set-url", "origin", f"{url}a.git")
+    git(sandbox.home, "config", "--file", str(sandbox.home / ".gitconfig"),
+        f"url.{sandbox.home / 'remotes'}/.insteadOf", url)
+    remote.rename(sandbox.home / "remotes" / "away.git")
+
+    with sandbox.daemon("autogit.sh", "-i", "1", REACH_PROBE_INTERVAL="1"):
+        write(str(root / "1.txt"), "1")
+        assert wait_for(lambda: "unreachable; pausing pushes" in sandbox.log(), 15)
+        write(str(root / "2.txt"), "2")
+        assert wait_for(lambda: commits(root) == 3, 10)
+        time.sleep(1.5)
+        state = push_state(sandbox, root)
+        assert (state["pending"], state["failures"]) == ("1", "1")
+
+        (sandbox.home / "remotes" / "away.git").rename(remote)
+        with socket.socket() as listener:
+            listener.bind(("127.0.0.1", port))
+            listener.listen()
+            assert wait_for(lambda: commits(remote, "main") == 3, 15)
+        assert "reachable again; flushing 1 unpushed repo(s)" in sandbox.log()
+        assert push_state(sandbox, root)["pending"] == "0"
+
+
+def test_shards_split_the_roots_and_cover_for_each_other(sandbox):
+    roots = [sandbox.add_root(name) for name in "abcdef"]
+    sandbox.run("autogit.sh", "run-once")
+    with sandbox.daemon("autogit.sh", "-i", "1", SHARDS="2"):
+        assert wait_for(lambda: "2/2 instance(s) running, 6 root(s)"
+                        in sandbox.run("autogit.sh", "status").stdout, 15)
+        for root in roots:
+            write(str(root / "x.txt"), "x")
+        assert wait_for(lambda: all(commits(root) == 2 for root in roots), 15)
+        time.sleep(1.5)
+        assert all(commits(root) == 2 for root in roots)
+
+        # Shard 1 dies; shard 0 takes over its roots.
+        pid = int((sandbox.state / "auto_git.1.pid").read_text())
+        os.kill(pid, 9)
+        assert wait_for(lambda: "now covering shard(s) 0, 1" in sandbox.log("auto_git.0.log"), 15)
+        status = sandbox.run("autogit.sh", "status").stdout
+        assert "shard 1: not running (covered by shard 0)" in status
+        for root in roots:
+            write(str(root / "y.txt"), "y")
+        assert wait_for(lambda: all(commits(root) == 3 for root in roots), 15)
+    assert wait_for(lambda: "AutoGit not running" in sandbox.run("autogit.sh", "status").stdout, 10)
@@ -0,0 +1,117 @@
+import time
+
+import pytest
+
+import autogit_compact as compact_mod
+from conftest import git, write
+
+DAY1 = 1_700_006_400          # 2023-11-15 00:00 UTC
+DAY2 = DAY1 + 86400
+HORIZON = DAY2 + 86400
+
+
+@pytest.fixture(autouse=True)
+def utc(monkeypatch):
+    monkeypatch.setenv("TZ", "UTC")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def commit(repo, when, message, name="f.txt"):
+    write(str(repo / name), f"{message} {when}\n")
+    git(repo, "add", "-A")
+    stamp = f"@{when} +0000"
+    git(repo, "commit", "-q", "-m", message,
+        env={"GIT_AUTHOR_DATE": stamp, "GIT_COMMITTER_DATE": stamp})
+
+
+def auto(repo, when):
+    commit(repo, when, f"Auto backup: {when}")
+
+
+@pytest.fixture
+def history(repo):
+    """13 first-parent commits: auto runs around a manual commit and a merge."""
+    for minute in (5, 20, 40):
+        auto(repo, DAY1 + 10 * 3600 + minute * 60)
+    auto(repo, DAY1 + 11 * 3600 + 600)
+    commit(repo, DAY1 + 12 * 3600, "manual change")
+    auto(repo, DAY1 + 12 * 3600 + 1800)
+    auto(repo, DAY1 + 12 * 3600 + 2700)
+    auto(repo, DAY2 + 9 * 3600)
+    git(repo, "checkout", "-q", "-b", "side")
+    commit(repo, DAY2 + 9 * 3600 + 60, "side work", name="side.txt")
+    git(repo, "checkout", "-q", "main")
+    stamp = f"@{DAY2 + 10 * 3600} +0000"
+    git(repo, "merge", "-q", "--no-ff", "-m", "merge side", "side",
+        env={"GIT_AUTHOR_DATE": stamp, "GIT_COMMITTER_DATE": stamp})
+    auto(repo, DAY2 + 11 * 3600)
+    auto(repo, DAY2 + 11 * 3600 + 1800)
+    now = int(time.time())
+    auto(repo, now - 60)
+    auto(repo, now)
+    return repo
+
+
+def subjects(repo, tip):
+    return git(repo, "log", "--first-parent", "--format=%s", tip).splitlines()[::-1]
+
+
+@pytest.mark.parametrize("granularity, expected", [
+    ("hourly", [
+        "Auto backup: 2023-11-15 10:00 (squashed 3 commits)",
+        f"Auto backup: {DAY1 + 11 * 3600 + 600}",
+        "manual change",
+        "Auto backup: 2023-11-15 12:00 (squashed 2 commits)",
+        f"Auto backup: {DAY2 + 9 * 3600}",
+        "merge side",
+        "Auto backup: 2023-11-16 11:00 (squashed 2 commits)",
+    ]),
+    ("daily", [
+        "Auto backup: 2023-11-15 (squashed 4 commits)",
+        "manual change",
+        "Auto backup: 2023-11-15 (squashed 2 commits)",
+        f"Auto backup: {DAY2 + 9 * 3600}",
+        "merge side",
+        "Auto backup: 2023-11-16 (squashed 2 commits)",
+    ]),
+])
+def test_compact_squashes_runs_per_bucket(history, granularity, expected):
+    repo = str(history)
+    old_tip = git(history, "rev-parse", "main")
+    tip, new_tip, before, after = compact_mod.compact(repo, "main", HORIZON, granularity)
+
+    assert tip == old_tip and new_tip != old_tip
+    assert before == 13 and after == len(expected) + 2
+    assert subjects(history, new_tip)[:-2] == expected
+    assert git(history, "rev-parse", "main") == old_tip
+    assert git(history, "rev-parse", f"{new_tip}^{{tree}}") == git(history, "rev-parse", "main^{tree}")
+    git(history, "fsck", "--no-dangling")
+
+
+def test_compact_keeps_merges_and_squashed_metadata(history):
+    _, new_tip, _, _ = compact_mod.compact(str(history), "main", HORIZON, "hourly")
+    merge = git(history, "log", "--first-parent", "--merges", "--format=%H", new_tip)
+    assert git(history, "rev-parse", f"{merge}^2") == git(history, "rev-parse", "side")
+    assert git(history, "log", "-1", "--format=%ct", f"{merge}") == str(DAY2 + 10 * 3600)
+
+    first = git(history, "rev-list", "--first-parent", "--max-parents=0", new_tip)
+    assert git(history, "log", "-1", "--format=%ct %s", first).startswith(
+        f"{DAY1 + 10 * 3600 + 2400} Auto backup: 2023-11-15 10:00")
+    assert git(history, "diff", f"{first}", "main~10", "--stat") == ""
+
+
+def test_compact_without_old_runs_leaves_the_branch_alone(history):
+    old_tip = git(history, "rev-parse", "main")
+    assert compact_mod.compact(str(history), "main", DAY1, "daily") == (old_tip, old_tip, 13, 13)
+
+
+def test_dry_run_counts_without_writing(history):
+    before_objects = git(history, "count-objects")
+    tip, new_tip, before, after = compact_mod.compact(str(history), "main", HORIZON, "daily",
+                                                      dry_run=True)
+    assert new_tip == "0" * 40
+    assert (before, after) == (13, 8)
+    assert git(history, "count-objects") == before_objects
@@ -0,0 +1,107 @@
+import os
+import time
+
+import pytest
+
+import autogit_scan as scan
+from conftest import git, write
+
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    monkeypatch.delenv("AUTOGIT_FSMONITOR_FRESH", raising=False)
+    path = tmp_path / "root"
+    write(str(path / "a.txt"), "a")
+    return path
+
+
+def query(root, index_dir, token, ignore_file=None, full_every=3600):
+    return scan.fsmonitor_query(str(root), token, str(index_dir), ignore_file, False, full_every)
+
+
+def test_unknown_token_reports_everything(root, tmp_path):
+    token, paths = query(root, tmp_path / "idx", "")
+    assert paths == ["/"]
+    prefix, journal_id, seq, full_at = token.split(":")
+    assert prefix == "autogit" and seq == "0"
+    assert abs(int(full_at) - time.time()) < 5
+
+
+def test_valid_token_reports_only_newer_changes(root, tmp_path):
+    idx = tmp_path / "idx"
+    token, _ = query(root, idx, "")
+    write(str(root / "b.txt"), "b")
+    token, paths = query(root, idx, token)
+    assert paths == ["b.txt"]
+
+    write(str(root / "sub" / "c.txt"), "c")
+    newer, paths = query(root, idx, token)
+    assert paths == ["sub/", "sub/c.txt"]
+    assert newer.split(":")[3] == token.split(":")[3]
+
+    assert query(root, idx, newer)[1] == []
+
+
+def test_foreign_malformed_and_future_tokens_report_everything(root, tmp_path):
+    idx = tmp_path / "idx"
+    token, _ = query(root, idx, "")
+    _, journal_id, seq, full_at = token.split(":")
+    now = int(time.time())
+    for bad in (f"autogit:someoneelse:{seq}:{now}", f"autogit:{journal_id}:x:{now}",
+                f"autogit:{journal_id}:{int(seq) + 5}:{now}", "1:2", "autogit"):
+        assert query(root, idx, bad)[1] == ["/"], bad
+
+
+def test_tokens_older_than_the_journal_floor_report_everything(root, tmp_path, monkeypatch):
+    monkeypatch.setattr(scan, "JOURNAL_MAX", 2)
+    idx = tmp_path / "idx"
+    token, _ = query(root, idx, "")
+    for i in range(3):
+        write(str(root / f"n{i}.txt"), str(i))
+        query(root, idx, token)
+    assert query(root, idx, token)[1] == ["/"]
+
+
+def test_expired_tokens_force_a_full_refresh(root, tmp_path):
+    idx = tmp_path / "idx"
+    token, _ = query(root, idx, "")
+    _, journal_id, seq, _ = token.split(":")
+    stale = f"autogit:{journal_id}:{seq}:{int(time.time()) - 100}"
+    fresh_token, paths = query(root, idx, stale, full_every=60)
+    assert paths == ["/"]
+    assert int(fresh_token.split(":")[3]) > int(stale.split(":")[3])
+
+
+def test_ignore_rules_report_unscanned_paths_instead_of_everything(root, tmp_path):
+    idx = tmp_path / "idx"
+    ignore = tmp_path / "ignore"
+    ignore.write_text("node_modules/\n*.log\n")
+    write(str(root / "node_modules" / "pkg" / "index.js"), "js")
+    write(str(root / "src" / "debug.log"), "log")
+    os.symlink("a.txt", root / "link")
+    token, paths = query(root, idx, "", str(ignore))
+    assert paths == ["/"]
+
+    write(str(root / "b.txt"), "b")
+    token, paths = query(root, idx, token, str(ignore))
+    assert paths == ["b.txt", "link", "node_modules/", "src/debug.log"]
+    assert query(root, idx, token, str(ignore))[1] == ["link", "node_modules/", "src/debug.log"]
+
+
+def test_git_sees_tracked_files_under_ignored_directories(repo, tmp_path):
+    helper = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          "autogit_scan.py")
+    ignore = tmp_path / "ignore"
+    ignore.write_text("vendor/\n")
+    write(str(repo / "a.txt"), "a")
+    write(str(repo / "vendor" / "lib.js"), "v1")
+    git(repo, "add", "-A")
+    git(repo, "commit", "-q", "-m", "init")
+    git(repo, "config", "core.fsmonitor",
+        f"python3 {helper} fsmonitor --root {repo} --index-dir {tmp_path / 'idx'} "
+        f"--ignore-file {ignore}")
+    git(repo, "config", "core.fsmonitorHookVersion", "2")
+    assert git(repo, "status", "--porcelain") == ""
+
+    write(str(repo / "vendor" / "lib.js"), "v2")
+    assert git(repo, "status", "--porcelain") == "M vendor/lib.js"
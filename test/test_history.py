@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+import autogit_scan as scan
+import autogit_snapshot as snap
+from conftest import git, write
+
+add_dir = pytest.importorskip("add_dir")  # needs tkinter, but no display
+
+
+def test_decode_preview_marks_binary_and_truncated_data():
+    assert add_dir.decode_preview(b"a\0b", 3) == "(binary file, 3 bytes)"
+    assert add_dir.decode_preview(b"abc", 3) == "abc"
+    assert add_dir.decode_preview(b"abc", 10).endswith("(7 more bytes not shown)")
+
+
+def test_git_history_pages_browses_and_restores(repo):
+    write(str(repo / "notes.txt"), "one\n")
+    git(repo, "add", "-A")
+    git(repo, "commit", "-q", "-m", "Auto backup: first")
+    write(str(repo / "notes.txt"), "two\n")
+    write(str(repo / "dir" / "x.bin"), "\0\0")
+    git(repo, "add", "-A")
+    git(repo, "commit", "-q", "-m", "Auto backup: second")
+
+    history = add_dir.GitHistory(str(repo))
+    points = history.page(0, 10)
+    assert [label.split("  ")[2] for _, label in points] == ["Auto backup: second",
+                                                              "Auto backup: first"]
+    assert history.page(1, 10)[0][0] == points[1][0]
+
+    newest, oldest = points[0][0], points[1][0]
+    assert sorted(history.children(newest, "")) == [("dir", True, 0), ("notes.txt", False, 4)]
+    assert history.read(oldest, "notes.txt", 100) == "one\n"
+    assert history.read(newest, "dir/x.bin", 100) == "(binary file, 2 bytes)"
+    assert "+two" in history.diff(newest, "notes.txt", 10000)
+    assert history.diff(newest, "notes.txt", 5).endswith("(diff truncated)")
+
+    assert "from" in history.restore(oldest, "notes.txt")
+    assert (repo / "notes.txt").read_text() == "one\n"
+    with pytest.raises(ValueError):
+        history.read(newest, "missing.txt", 100)
+
+
+def test_snapshot_history_browses_and_restores(tmp_path, monkeypatch):
+    store = str(tmp_path / "store")
+    monkeypatch.setattr(add_dir, "SNAPSHOT_DIR", store)
+    root = tmp_path / "root"
+    write(str(root / "sub" / "notes.txt"), "one\n")
+
+    def take():
+        _, state, journal = scan.scan_root(str(root), str(tmp_path / "idx"), None)
+        return snap.snapshot_root(store, str(root), state.new, journal, True)["id"]
+
+    first = take()
+    write(str(root / "sub" / "notes.txt"), "two\n")
+    second = take()
+
+    history = add_dir.SnapshotHistory(str(root))
+    assert [p for p, _ in history.page(0, 10)] == [second, first]
+    assert history.children(second, "") == [("sub", True, 4)]
+    assert history.children(second, "sub") == [("notes.txt", False, 4)]
+    assert history.read(first, "sub/notes.txt", 100) == "one\n"
+    assert "-one\n+two" in history.diff(second, "sub/notes.txt", 100)
+    assert history.diff(first, "sub/notes.txt", 100).startswith("(oldest snapshot")
+    with pytest.raises(ValueError):
+        history.read(second, "sub", 100)
+
+    os.unlink(root / "sub" / "notes.txt")
+    assert history.restore(first, "sub") == f"Restored 1 file(s) to {root}/sub"
+    assert (root / "sub" / "notes.txt").read_text() == "one\n"
@@ -0,0 +1,76 @@
+import os
+
+import autogit_scan as scan
+from conftest import write
+
+
+def run_policy(repo, tmp_path, action, max_bytes=10, delta=None):
+    scan.scan_root(str(repo), str(tmp_path / "idx"), None)
+    return scan.policy(str(repo), str(tmp_path / "idx"), None, max_bytes, set(), action,
+                       str(tmp_path / "store"), delta)
+
+
+def excludes(repo):
+    return scan.read_excludes(str(repo / ".git" / "info" / "exclude"))
+
+
+def test_exclude_pattern_escapes_glob_characters():
+    assert scan.exclude_pattern("a/b.bin") == "/a/b.bin"
+    assert scan.exclude_pattern("x[1]*?.bin") == "/x\\[1]\\*\\?.bin"
+    assert scan.exclude_pattern("trailing ") == "/trailing\\ "
+
+
+def test_skip_keeps_user_lines_and_rebuilds_the_managed_block(repo, tmp_path):
+    exclude = repo / ".git" / "info" / "exclude"
+    write(str(exclude), "# mine\n*.swp\n")
+    write(str(repo / "big.bin"), "x" * 50)
+    write(str(repo / "small.txt"), "ok")
+
+    assert run_policy(repo, tmp_path, "skip") == [("skip", "big.bin", 50)]
+    assert excludes(repo) == (["# mine", "*.swp"], ["/big.bin"])
+    assert run_policy(repo, tmp_path, "skip") == []
+
+    write(str(repo / "big.bin"), "x")
+    assert run_policy(repo, tmp_path, "skip") == [("include", "big.bin", 0)]
+    assert excludes(repo) == (["# mine", "*.swp"], [])
+    assert exclude.read_text() == "# mine\n*.swp\n"
+
+
+def test_removed_files_are_released_and_dropped_from_the_delta(repo, tmp_path):
+    write(str(repo / "big.bin"), "x" * 50)
+    run_policy(repo, tmp_path, "skip")
+    os.unlink(repo / "big.bin")
+    delta = tmp_path / "delta"
+    delta.write_bytes(b"big.bin\0other.txt\0")
+
+    assert run_policy(repo, tmp_path, "skip", delta=str(delta)) == [("release", "big.bin", 0)]
+    assert excludes(repo)[1] == []
+    assert delta.read_bytes() == b"other.txt\0"
+
+
+def test_store_writes_pointers_and_updates_the_delta(repo, tmp_path):
+    write(str(repo / "data" / "big.bin"), "x" * 50)
+    delta = tmp_path / "delta"
+    delta.write_bytes(b"data/big.bin\0")
+
+    assert run_policy(repo, tmp_path, "store", delta=str(delta)) == [("store", "data/big.bin", 50)]
+    pointer = scan.read_pointer(str(repo / scan.POINTER_DIR / "data" / "big.bin"))
+    assert pointer["size"] == "50" and pointer["path"] == "data/big.bin"
+    with open(pointer["store"]) as fh:
+        assert fh.read() == "x" * 50
+    assert delta.read_bytes() == f"{scan.POINTER_DIR}/data/big.bin\0".encode()
+    assert excludes(repo)[1] == ["/data/big.bin"]
+
+    write(str(repo / "data" / "big.bin"), "y")
+    delta.write_bytes(b"")
+    actions = run_policy(repo, tmp_path, "store", delta=str(delta))
+    assert sorted(actions) == [("drop", "data/big.bin", 0), ("include", "data/big.bin", 0)]
+    assert not (repo / scan.POINTER_DIR / "data" / "big.bin").exists()
+    assert excludes(repo)[1] == []
+    assert sorted(delta.read_bytes().split(b"\0")[:-1]) == [
+        f"{scan.POINTER_DIR}/data/big.bin".encode(), b"data/big.bin"]
+
+
+def test_policy_ignores_directories_without_a_repository(tmp_path):
+    write(str(tmp_path / "plain" / "big.bin"), "x" * 50)
+    assert run_policy(tmp_path / "plain", tmp_path, "skip") == []
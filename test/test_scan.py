@@ -0,0 +1,252 @@
+import os
+
+import autogit_scan as scan
+from conftest import write
+
+
+def scan_once(root, index_dir, ignore_file=None, mark=False):
+    return scan.scan_root(str(root), str(index_dir), ignore_file, mark=mark)
+
+
+def test_fingerprint_is_stable_and_tracks_content(tmp_path):
+    root, idx = tmp_path / "root", tmp_path / "idx"
+    write(str(root / "a.txt"), "one", mtime=1_000_000)
+    write(str(root / "sub" / "b.txt"), "two", mtime=1_000_000)
+
+    first = scan_once(root, idx)[0]
+    assert len(first) == 16 and first.isdigit()
+    assert scan_once(root, idx)[0] == first
+
+    write(str(root / "sub" / "b.txt"), "three", mtime=1_000_001)
+    assert scan_once(root, idx)[0] != first
+
+
+def test_first_scan_reports_no_changes(tmp_path):
+    root = tmp_path / "root"
+    write(str(root / "a.txt"), "one")
+    _, state, journal = scan_once(root, tmp_path / "idx")
+    assert state.changed_paths() == set()
+    assert journal["seq"] == 0
+
+
+def test_changes_are_classified(tmp_path):
+    root, idx = tmp_path / "root", tmp_path / "idx"
+    write(str(root / "keep.txt"), "k", mtime=1_000_000)
+    write(str(root / "edit.txt"), "e", mtime=1_000_000)
+    write(str(root / "gone.txt"), "g")
+    write(str(root / "old" / "x.txt"), "x")
+    scan_once(root, idx)
+
+    write(str(root / "edit.txt"), "edited", mtime=1_000_002)
+    write(str(root / "new.txt"), "n")
+    write(str(root / "newdir" / "y.txt"), "y")
+    os.unlink(root / "gone.txt")
+    os.unlink(root / "old" / "x.txt")
+    os.rmdir(root / "old")
+
+    _, state, journal = scan_once(root, idx)
+    assert state.added == {"new.txt", "newdir/", "newdir/y.txt"}
+    assert state.modified == {"edit.txt"}
+    assert state.deleted == {"gone.txt", "old/"}
+    assert journal["seq"] == 1
+    assert {p for _, p in journal["entries"]} == state.changed_paths()
+
+
+def test_unchanged_tree_reuses_the_index(tmp_path):
+    root, idx = tmp_path / "root", tmp_path / "idx"
+    for i in range(5):
+        write(str(root / f"d{i}" / "f.txt"), str(i))
+        os.utime(root / f"d{i}", (1_000_000, 1_000_000))
+    os.utime(root, (1_000_000, 1_000_000))
+    assert scan_once(root, idx)[1].dirs_read == 6
+
+    _, state, _ = scan_once(root, idx)
+    assert state.dirs_read == 0
+    assert state.dirs_seen == 6 and state.files_seen == 5
+    assert not state.dirty
+
+
+def test_recently_modified_directories_are_listed_again(tmp_path):
+    root, idx = tmp_path / "root", tmp_path / "idx"
+    write(str(root / "a.txt"), "a")
+    pinned = os.stat(root).st_mtime_ns
+    _, state, _ = scan_once(root, idx)
+    assert state.new[""]["m"] == -1
+
+    # A file created in the same timestamp tick leaves the mtime unchanged.
+    write(str(root / "b.txt"), "b")
+    os.utime(root, ns=(pinned, pinned))
+    _, state, _ = scan_once(root, idx)
+    assert state.dirs_read == 1
+    assert state.added == {"b.txt"}
+
+    os.utime(root, (1_000_000, 1_000_000))
+    assert scan_once(root, idx)[1].new[""]["m"] == 1_000_000 * 10**9
+    assert scan_once(root, idx)[1].dirs_read == 0
+
+
+def test_index_is_discarded_for_another_root(tmp_path):
+    path = str(tmp_path / "x.idx")
+    scan.save_index(path, "/a", "", {"": {"m": 1}}, scan.new_journal())
+    assert scan.load_index(path, "/a", "")[0] == {"": {"m": 1}}
+    assert scan.load_index(path, "/b", "")[0] == {}
+    assert scan.load_index(path, "/a", "other")[0] == {}
+
+
+def test_ignore_rules_follow_gitignore_semantics():
+    rules = scan.compile_ignore_rules([
+        "# comment", "*.log", "!keep.log", "build/", "/top.txt", "docs/**/*.tmp",
+    ])
+    assert scan.is_ignored("a.log", False, rules)
+    assert scan.is_ignored("deep/b.log", False, rules)
+    assert not scan.is_ignored("deep/keep.log", False, rules)
+    assert scan.is_ignored("src/build", True, rules)
+    assert not scan.is_ignored("src/build", False, rules)
+    assert scan.is_ignored("top.txt", False, rules)
+    assert not scan.is_ignored("sub/top.txt", False, rules)
+    assert scan.is_ignored("docs/a/b/c.tmp", False, rules)
+    assert scan.is_ignored("docs/c.tmp", False, rules)
+    assert not scan.is_ignored("other/c.tmp", False, rules)
+
+
+def test_ignored_paths_do_not_affect_the_fingerprint(tmp_path):
+    root, idx = tmp_path / "root", tmp_path / "idx"
+    ignore = tmp_path / "ignore"
+    ignore.write_text("*.log\ncache/\n")
+    write(str(root / "a.txt"), "a")
+    write(str(root / "cache" / "blob"), "1")
+    first, state, _ = scan_once(root, idx, str(ignore))
+    assert "cache" not in state.new[""]["d"]
+
+    write(str(root / "debug.log"), "noise")
+    write(str(root / "cache" / "blob"), "22")
+    second, state, _ = scan_once(root, idx, str(ignore))
+    assert second == first
+    assert state.changed_paths() == set()
+
+
+def test_write_deltas_skips_first_scans_and_large_deltas(tmp_path):
+    root, idx, out = tmp_path / "root", tmp_path / "idx", tmp_path / "deltas"
+    write(str(root / "a.txt"), "a")
+    fresh = scan_once(root, idx, mark=True)
+    write(str(root / "b.txt"), "b")
+    write(str(root / "c.txt"), "c")
+    changed = scan_once(root, idx, mark=True)
+
+    os.makedirs(out)
+    write(str(out / "7"), "stale")
+    scan.write_deltas(str(out), [fresh, None, changed], limit=10)
+    assert sorted(os.listdir(out)) == ["2"]
+    assert (out / "2").read_bytes() == b"b.txt\0c.txt\0"
+
+    scan.write_deltas(str(out), [changed], limit=1)
+    assert os.listdir(out) == []
+
+
+def test_deltas_include_changes_seen_by_other_scanners(tmp_path):
+    root, idx = tmp_path / "root", tmp_path / "idx"
+    write(str(root / "a.txt"), "a")
+    assert scan_once(root, idx, mark=True)[1].delta is None
+
+    write(str(root / "x.txt"), "x")
+    assert scan_once(root, idx)[1].changed_paths() == {"x.txt"}   # e.g. the fsmonitor hook
+    write(str(root / "y.txt"), "y")
+    assert scan_once(root, idx, mark=True)[1].delta == {"x.txt", "y.txt"}
+    assert scan_once(root, idx, mark=True)[1].delta == set()
+
+
+def test_deltas_are_unknown_once_the_mark_falls_off_the_journal(tmp_path, monkeypatch):
+    monkeypatch.setattr(scan, "JOURNAL_MAX", 2)
+    root, idx = tmp_path / "root", tmp_path / "idx"
+    write(str(root / "a.txt"), "a")
+    scan_once(root, idx, mark=True)
+    for name in ("x", "y", "z"):
+        write(str(root / f"{name}.txt"), name)
+        scan_once(root, idx)
+    assert scan_once(root, idx, mark=True)[1].delta is None
+
+
+def test_fingerprint_many_matches_single_scans_in_order(tmp_path):
+    roots = []
+    for i in range(4):
+        root = tmp_path / f"r{i}"
+        write(str(root / "f.txt"), str(i) * (i + 1))
+        roots.append(str(root))
+    missing = str(tmp_path / "missing")
+    expected = [scan_once(r, tmp_path / "solo")[0] for r in roots]
+
+    results = scan.fingerprint_many(roots + [missing], str(tmp_path / "idx"), None, workers=3)
+    assert [r[0] for r in results[:4]] == expected
+    assert results[4] is not None and results[4][1].dirs_seen == 0
+    assert all(r[2] >= 0 for r in results)
+
+
+def test_watch_labels_keep_tags_and_skip_missing_roots(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    watch = tmp_path / "watch.txt"
+    watch.write_text(f"# comment\n{tmp_path}/a - [ 0000000000000001 ]\n\n"
+                     f"{tmp_path}/b::work,docs - [ ]\n{tmp_path}/gone - [ ]\n")
+    assert scan.watch_labels(str(watch)) == [f"{tmp_path}/a", f"{tmp_path}/b::work,docs"]
+    assert scan.watch_labels(str(tmp_path / "nope")) == []
+
+
+def test_cli_prints_labelled_lines_for_a_watch_file(tmp_path, capsys):
+    write(str(tmp_path / "a" / "f.txt"), "a")
+    write(str(tmp_path / "b" / "f.txt"), "b")
+    watch = tmp_path / "watch.txt"
+    watch.write_text(f"{tmp_path}/a - [ ]\n{tmp_path}/b::tag - [ ]\n")
+
+    assert scan.main(["fingerprint", "--watch-file", str(watch), "--workers", "2",
+                      "--index-dir", str(tmp_path / "idx"), "--stats"]) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 2
+    assert lines[0].startswith(f"{tmp_path}/a - [ {scan_once(tmp_path / 'a', tmp_path / 'i2')[0]} ] ")
+    assert lines[1].startswith(f"{tmp_path}/b::tag - [ ")
+    assert len(lines[1].split("] ", 1)[1].split()) == 4
+
+
+def test_nested_roots_are_derived_from_the_outer_scan(tmp_path):
+    outer, inner = tmp_path / "outer", tmp_path / "outer" / "proj"
+    write(str(outer / "top.txt"), "t")
+    write(str(inner / "src" / "main.c"), "int main;")
+    idx = str(tmp_path / "idx")
+    solo = scan_once(inner, tmp_path / "solo")[0]
+
+    results = scan.fingerprint_many([str(inner), str(outer)], idx, None)
+    assert results[0][0] == solo
+    assert results[0][1].dirs_read == 0
+    assert results[1][1].dirs_read == 3
+
+    write(str(inner / "src" / "util.c"), "int util;")
+    results = scan.fingerprint_many([str(inner), str(outer)], idx, None)
+    assert results[0][1].changed_paths() == {"src/util.c"}
+    assert results[1][1].changed_paths() == {"proj/src/util.c"}
+    assert results[0][1].journal["seq"] == 1
+    assert results[0][0] == scan_once(inner, tmp_path / "solo")[0]
+
+
+def test_nested_roots_are_scanned_alone_when_rules_are_anchored(tmp_path):
+    outer, inner = tmp_path / "outer", tmp_path / "outer" / "proj"
+    write(str(inner / "keep.txt"), "k")
+    write(str(inner / "build" / "out.o"), "o")
+    ignore = tmp_path / "ignore"
+    ignore.write_text("/build\n")
+    idx = str(tmp_path / "idx")
+
+    results = scan.fingerprint_many([str(inner), str(outer)], idx, str(ignore))
+    assert results[0][1].dirs_read == 1
+    assert "build" not in results[0][1].new[""]["d"]
+    assert "build" in results[1][1].new["proj"]["d"]
+
+
+def test_nested_roots_under_ignored_dirs_fall_back_to_their_own_scan(tmp_path):
+    outer, inner = tmp_path / "outer", tmp_path / "outer" / "vendor" / "lib"
+    write(str(inner / "lib.py"), "x")
+    ignore = tmp_path / "ignore"
+    ignore.write_text("vendor/\n")
+
+    results = scan.fingerprint_many([str(outer), str(inner)], str(tmp_path / "idx"), str(ignore))
+    assert "vendor" not in results[0][1].new[""]["d"]
+    assert results[1][1].dirs_read == 1
+    assert results[1][0] == scan_once(inner, tmp_path / "solo", str(ignore))[0]
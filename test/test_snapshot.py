@@ -0,0 +1,112 @@
+import concurrent.futures
+import os
+import time
+
+import pytest
+
+import autogit_scan as scan
+import autogit_snapshot as snap
+from conftest import write
+
+
+@pytest.fixture
+def env(tmp_path):
+    root = tmp_path / "root"
+    write(str(root / "a.txt"), "alpha", mtime=1_000_000)
+    write(str(root / "sub" / "b.txt"), "beta")
+    return root, str(tmp_path / "store"), str(tmp_path / "idx")
+
+
+def take(root, store, idx):
+    _, state, journal = scan.scan_root(str(root), idx, None)
+    return snap.snapshot_root(store, str(root), state.new, journal, bool(state.changed_paths()))
+
+
+def read_all(base):
+    out = {}
+    for dirpath, _dirs, names in os.walk(base):
+        for name in names:
+            path = os.path.join(dirpath, name)
+            with open(path, encoding="utf-8") as fh:
+                out[os.path.relpath(path, base)] = fh.read()
+    return out
+
+
+def test_snapshot_and_restore_round_trip(env, tmp_path):
+    root, store, idx = env
+    first = take(root, store, idx)
+    assert first["full"] and first["parent"] is None
+    assert first["files"] == 2
+    assert take(root, store, idx) is None
+
+    write(str(root / "sub" / "b.txt"), "beta two")
+    write(str(root / "c.txt"), "gamma")
+    second = take(root, store, idx)
+    assert not second["full"] and second["parent"] == first["id"]
+    assert snap.list_records(store, str(root)) == [first["id"], second["id"]]
+    assert snap.head_record(store, str(root))["id"] == second["id"]
+
+    assert snap.restore(store, str(root), first["id"], str(tmp_path / "old")) == 2
+    assert read_all(tmp_path / "old") == {"a.txt": "alpha", os.path.join("sub", "b.txt"): "beta"}
+    assert os.stat(tmp_path / "old" / "a.txt").st_mtime == 1_000_000
+    assert snap.restore(store, str(root), None, str(tmp_path / "new")) == 3
+    assert read_all(tmp_path / "new") == read_all(root)
+
+
+def test_restore_a_single_path(env, tmp_path):
+    root, store, idx = env
+    record = take(root, store, idx)
+    dest = tmp_path / "out" / "b.txt"
+    assert snap.restore(store, str(root), record["id"], str(dest), "sub/b.txt") == 1
+    assert dest.read_text() == "beta"
+    assert snap.restore(store, str(root), None, str(tmp_path / "d"), "sub") == 1
+    assert (tmp_path / "d" / "b.txt").read_text() == "beta"
+    with pytest.raises(ValueError):
+        snap.restore(store, str(root), None, str(tmp_path / "x"), "sub/missing")
+
+
+def test_unchanged_chunks_are_not_stored_again(env, tmp_path):
+    root, store, idx = env
+    with open(root / "big.bin", "wb") as fh:
+        fh.write(os.urandom(snap.CHUNK_SIZE * 2 + 10))
+    first = take(root, store, idx)
+    assert first["new_bytes"] >= snap.CHUNK_SIZE * 2
+
+    write(str(root / "a.txt"), "alpha!")
+    second = take(root, store, idx)
+    assert second["new_bytes"] < 1024
+    assert second["bytes"] == first["bytes"] + 1
+
+
+def test_concurrent_snapshots_of_one_root_chain(env):
+    root, store, idx = env
+    _, state, journal = scan.scan_root(str(root), idx, None)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=6) as pool:
+        records = list(pool.map(lambda _: snap.snapshot_root(store, str(root), state.new,
+                                                             journal, True), range(6)))
+    assert sum(r is not None for r in records) == 1
+    assert len(snap.list_records(store, str(root))) == 1
+
+
+def test_prune_keeps_the_newest_and_sweeps_unreferenced_data(env, tmp_path):
+    root, store, idx = env
+    take(root, store, idx)
+    for i in range(2):
+        write(str(root / "sub" / "b.txt"), f"beta {i}")
+        take(root, store, idx)
+    head = snap.head_record(store, str(root))
+
+    dropped, trees, chunks, freed = snap.prune(store, [(60, 1)], now=time.time() + 3600)
+    assert dropped == 2
+    assert trees >= 2 and chunks == 2 and freed == len("beta") + len("beta 0")
+    assert snap.list_records(store, str(root)) == [head["id"]]
+    assert snap.restore(store, str(root), None, str(tmp_path / "out")) == 2
+    assert read_all(tmp_path / "out") == read_all(root)
+    assert snap.prune(store, [(60, 1)], now=time.time() + 3600) == (0, 0, 0, 0)
+
+
+def test_parse_keep_orders_rules_and_rejects_nonsense():
+    assert snap.parse_keep("3600:86400, 60:3600") == [(60, 3600), (3600, 86400)]
+    for bad in ("", "0:60", "60:-1", "x:1"):
+        with pytest.raises(ValueError):
+            snap.parse_keep(bad)
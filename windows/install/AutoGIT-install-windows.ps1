@@ -53,6 +53,11 @@ $RepoRoot = Resolve-Path (Join-Path $PSScriptRoot "..\..")
 $AutogitScriptSrc = Join-Path $RepoRoot "autogit.sh"
 $AutogitWrapperSrc = Join-Path $RepoRoot "autogit_dirwatch.sh"
 $AutosaveWrapperSrc = Join-Path $RepoRoot "autosave_dirwatch.sh"
+$ScanHelperSrc = Join-Path $RepoRoot "autogit_scan.py"
+$MetricsHelperSrc = Join-Path $RepoRoot "autogit_metrics.py"
+$CompactHelperSrc = Join-Path $RepoRoot "autogit_compact.py"
+$SnapshotHelperSrc = Join-Path $RepoRoot "autogit_snapshot.py"
+$LogLibSrc = Join-Path $RepoRoot "autogit_log.sh"
 $ProfileRoot = Join-Path (Join-Path $RepoRoot "windows") "profiles"
 
 $HomeWin = $env:USERPROFILE
@@ -99,7 +104,7 @@ Ensure-File $AutoSaveFileWin
 Ensure-File $AutoSaveCloneFileWin
 Ensure-File $IgnoreFileWin
 
-if (-not (Test-Path $AutogitScriptSrc) -or -not (Test-Path $AutogitWrapperSrc) -or -not (Test-Path $AutosaveWrapperSrc)) {
+if (-not (Test-Path $AutogitScriptSrc) -or -not (Test-Path $AutogitWrapperSrc) -or -not (Test-Path $AutosaveWrapperSrc) -or -not (Test-Path $ScanHelperSrc) -or -not (Test-Path $MetricsHelperSrc) -or -not (Test-Path $CompactHelperSrc) -or -not (Test-Path $SnapshotHelperSrc) -or -not (Test-Path $LogLibSrc)) {
   Write-ErrMsg "Missing root scripts in repo."
   exit 1
 }
@@ -107,6 +112,11 @@ if (-not (Test-Path $AutogitScriptSrc) -or -not (Test-Path $AutogitWrapperSrc) -
 Copy-Item $AutogitScriptSrc (Join-Path $BinDirWin "autogit.sh") -Force
 Copy-Item $AutogitWrapperSrc (Join-Path $BinDirWin "autogit_dirwatch.sh") -Force
 Copy-Item $AutosaveWrapperSrc (Join-Path $BinDirWin "autosave_dirwatch.sh") -Force
+Copy-Item $ScanHelperSrc (Join-Path $BinDirWin "autogit_scan.py") -Force
+Copy-Item $MetricsHelperSrc (Join-Path $BinDirWin "autogit_metrics.py") -Force
+Copy-Item $CompactHelperSrc (Join-Path $BinDirWin "autogit_compact.py") -Force
+Copy-Item $SnapshotHelperSrc (Join-Path $BinDirWin "autogit_snapshot.py") -Force
+Copy-Item $LogLibSrc (Join-Path $BinDirWin "autogit_log.sh") -Force
 Write-Info "Installed scripts to $BinDirWin"
 
 if ($Profile -eq "gnosis") {